@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_links.py
+
+Microbenchmark for extracting internal links from content.
+
+Generates large HTML pages (paragraphs of text with a sprinkling of static,
+courseware, jump_to_id and external links and images), and times scan_links,
+which looks at each element once, against the previous implementation, which
+searched the page once for each attribute that can hold a link.
+
+Usage: python benchmarks/bench_links.py [elements]
+"""
+import os
+import sys
+import random
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lxml import etree
+from olxcleaner.utils import scan_links
+
+def attribute_scan_links(node):
+    """The previous implementation of scan_links, with a search of the page for each attribute"""
+    links = []
+    url_attributes = ['link', 'src', 'href', 'img', 'icon', 'preprocessorSrc']
+    internal_links = ['/static/', '/course/', '/jump_to_id/']
+    for attrib in url_attributes:
+        for tag in node.findall(f".//*[@{attrib}]"):
+            link = tag.get(attrib)
+            if link:
+                for special in internal_links:
+                    if link.startswith(special):
+                        links.append(link)
+    return links
+
+def build_page(elements, seed=0):
+    """Builds an HTML page with the given number of paragraphs"""
+    rng = random.Random(seed)
+    parts = ["<html><body>\n"]
+    for i in range(elements):
+        r = rng.random()
+        if r < 0.05:
+            parts.append(f'<p>See <a href="/static/figure{i}.png">the figure</a> or '
+                         f'<a href="https://example.com/{i}">elsewhere</a>.</p>\n')
+        elif r < 0.08:
+            parts.append(f'<p><img src="/static/image{i}.png" alt="Image {i}"/></p>\n')
+        elif r < 0.10:
+            parts.append(f'<p><a href="/course/courseware/chapter/sequential{i}/">Go back</a> or '
+                         f'<a href="/jump_to_id/problem{i}">try this</a>.</p>\n')
+        else:
+            parts.append(f'<p class="text{i % 7}">Some <b>bold</b> and <i>italic</i> text, paragraph {i}.</p>\n')
+    parts.append("</body></html>\n")
+    return "".join(parts)
+
+def main():
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for size in (elements // 10, elements):
+        node = etree.fromstring(build_page(size), etree.HTMLParser(recover=False))
+        links = scan_links(node)
+        assert sorted(links) == sorted(attribute_scan_links(node))
+        assert all(line is not None for _, line in scan_links(node, lines=True))
+
+        number = 10
+        old = min(timeit.repeat(lambda: attribute_scan_links(node), number=number, repeat=3)) / number
+        new = min(timeit.repeat(lambda: scan_links(node), number=number, repeat=3)) / number
+        lines = min(timeit.repeat(lambda: scan_links(node, lines=True), number=number, repeat=3)) / number
+        print(f"Page with {size} paragraphs, {len(links)} internal links:")
+        print(f"  search per attribute:         {old * 1000:8.2f} ms")
+        print(f"  single pass:                  {new * 1000:8.2f} ms ({old / new:.2f}x)")
+        print(f"  single pass with lines:       {lines * 1000:8.2f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_parse_cache.py
+
+Benchmark for the persistent parse cache.
+
+Generates a course in which every component lives in its own file, with HTML
+files of a range of sizes, and times how long load_course takes without a
+cache, with an empty cache, and with every file already cached. The time
+spent on each kind of file when it is read through the cache (from a warm
+cache) is compared to the time spent parsing it directly.
+
+Usage: python benchmarks/bench_parse_cache.py [chapters]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from olxcleaner.errorstore import ErrorStore
+from olxcleaner.loader import load_course
+from olxcleaner.loader.cache import ParseCache
+from olxcleaner.loader.source import FileSystemSource
+from olxcleaner.loader.xml import parse_data
+
+from bench_watch import build_course, write
+
+PARAGRAPH = '<p>Some <b>text</b> with a <a href="/static/handout.pdf">link</a> and <img src="/static/a.png"/></p>\n'
+
+def add_html(directory):
+    """Replaces the HTML files of the course with files of between 100 bytes and 50 KB"""
+    filenames = sorted(name for name in os.listdir(os.path.join(directory, "html")) if name.endswith(".html"))
+    for number, filename in enumerate(filenames):
+        repeats = (1, 10, 50, 500)[number % 4]
+        write(directory, f"html/{filename}", "<div>\n" + PARAGRAPH * repeats + "</div>\n")
+
+def time_load(directory, cache):
+    """Time loading the course, returning the best of three runs"""
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        load_course(directory, "course.xml", ErrorStore(), cache=cache)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def time_files(source, filenames, kind, cache):
+    """Time reading the given files directly or through the cache, returning the best of three runs"""
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        for filename in filenames:
+            if cache is None:
+                parse_data(source.read_bytes(filename), kind)
+            else:
+                cache.parse(source, filename, kind)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    chapters = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = os.path.join(tmp, "course")
+        build_course(directory, chapters)
+        add_html(directory)
+        cache_dir = os.path.join(tmp, "cache")
+
+        print(f"load_course() without a cache:    {time_load(directory, None):8.3f} s")
+        start = time.perf_counter()
+        load_course(directory, "course.xml", ErrorStore(), cache=ParseCache(cache_dir))
+        print(f"load_course() with an empty cache: {time.perf_counter() - start:8.3f} s")
+        print(f"load_course() with a warm cache:   {time_load(directory, ParseCache(cache_dir)):8.3f} s")
+
+        source = FileSystemSource(directory)
+        groups = {}
+        for folder in ("html", "problem", "vertical"):
+            for filename in os.listdir(os.path.join(directory, folder)):
+                path = f"{folder}/{filename}"
+                if filename.endswith(".html"):
+                    label = f"HTML files of {source.size(path) / 1024:4.1f} KB"
+                    groups.setdefault(("html", label), []).append(path)
+                else:
+                    groups.setdefault(("xml", "XML files"), []).append(path)
+        cache = ParseCache(cache_dir)
+        for (kind, label), filenames in sorted(groups.items()):
+            direct = time_files(source, filenames, kind, None)
+            cached = time_files(source, filenames, kind, cache)
+            print(f"{label:<18} ({len(filenames):5} files): parsed {direct * 1e6 / len(filenames):7.1f} us, "
+                  f"through the cache {cached * 1e6 / len(filenames):7.1f} us per file")
+
+if __name__ == "__main__":
+    main()
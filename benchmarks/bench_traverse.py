@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_traverse.py
+
+Microbenchmark for course loading and traversal.
+
+Scales up testcourse8 by repeating its chapter, then times load_course and
+traverse, comparing traverse against the previous recursive implementation.
+Also builds an artificially deep object tree, which the recursive version
+cannot traverse.
+
+Usage: python benchmarks/bench_traverse.py [repeats]
+"""
+import os
+import sys
+import shutil
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from olxcleaner.errorstore import ErrorStore
+from olxcleaner.loader import load_course
+from olxcleaner.objects import EdxObject
+from olxcleaner.utils import traverse
+
+SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "testcourses", "testcourse8")
+
+def recursive_traverse(edxobj):
+    """The nested-generator implementation of traverse, for comparison"""
+    if edxobj.broken:
+        return
+    yield edxobj
+    for child in edxobj.children:
+        for entry in recursive_traverse(child):
+            yield entry
+
+def build_course(directory, repeats):
+    """Copy testcourse8 into directory, repeating its chapter the given number of times"""
+    shutil.copytree(SOURCE, directory)
+    with open(os.path.join(directory, "course", "mycourseurl.xml"), "w") as f:
+        f.write("<course>\n")
+        f.write('  <chapter url_name="chapter"/>\n' * repeats)
+        f.write("</course>\n")
+
+def build_deep_tree(depth):
+    """Construct a chain of verticals of the given depth"""
+    root = EdxObject.get_object("vertical")
+    current = root
+    for _ in range(depth):
+        child = EdxObject.get_object("vertical")
+        current.add_child(child)
+        current = child
+    return root
+
+def per_object(seconds, count):
+    """Format a time per object in microseconds"""
+    return f"{seconds / count * 1e6:8.3f} us/object"
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    tmpdir = tempfile.mkdtemp()
+    try:
+        directory = os.path.join(tmpdir, "course")
+        build_course(directory, repeats)
+
+        start = timeit.default_timer()
+        course = load_course(directory, "course.xml", ErrorStore())
+        load_time = timeit.default_timer() - start
+        count = sum(1 for _ in traverse(course))
+        print(f"Course with {count} objects")
+        print(f"load_course:          {per_object(load_time, count)}")
+
+        number = 10
+        old = min(timeit.repeat(lambda: sum(1 for _ in recursive_traverse(course)), number=number, repeat=3))
+        new = min(timeit.repeat(lambda: sum(1 for _ in traverse(course)), number=number, repeat=3))
+        print(f"recursive traverse:   {per_object(old / number, count)}")
+        print(f"iterative traverse:   {per_object(new / number, count)}")
+        print(f"speedup:              {old / new:8.2f}x")
+
+        depth = 5 * sys.getrecursionlimit()
+        deep = build_deep_tree(depth)
+        print(f"Deep tree of {depth + 1} objects: iterative traverse visits {sum(1 for _ in traverse(deep))}")
+        try:
+            sum(1 for _ in recursive_traverse(deep))
+        except RecursionError:
+            print("Deep tree: recursive traverse raises RecursionError")
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_validators.py
+
+Benchmark for validation steps 6-8.
+
+Generates a course (see bench_watch.py), loads it, and times running object
+validation and the global validators one after another, each walking the course
+separately, against running them through run_validators, which walks the course
+once for all visitors. As the validators themselves dominate that comparison, the
+traversal cost alone is measured with visitors that do nothing.
+
+Usage: python benchmarks/bench_validators.py [chapters]
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_watch import build_course
+from olxcleaner import validate
+from olxcleaner.errorstore import ErrorStore
+from olxcleaner.parser.validators import GlobalValidator
+from olxcleaner.parser.slowvalidators import SlowValidator
+from olxcleaner.parser.visitor import ObjectValidator, Visitor, visit
+from olxcleaner.utils import traverse
+from olxcleaner.validate import run_validators
+
+def stages():
+    """The validators for steps 6-8"""
+    return [ObjectValidator()] + list(GlobalValidator.validators()) + list(SlowValidator.validators())
+
+def separate(course, url_names):
+    """Each validator walks the course on its own"""
+    errorstore = ErrorStore()
+    for validator in stages():
+        validator(course, errorstore, url_names)
+    return errorstore
+
+def fused(course, url_names):
+    """All validators share a single walk"""
+    errorstore = ErrorStore()
+    run_validators(course, stages(), errorstore, url_names)
+    return errorstore
+
+class NullVisitor(Visitor):
+    """A visitor that does nothing"""
+
+    def on_any(self, edxobj, errorstore):
+        pass
+
+def main():
+    chapters = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = os.path.join(tmp, "course")
+        build_course(directory, chapters)
+        course, _, url_names = validate(directory, steps=5, lazy=False)
+        count = sum(1 for _ in traverse(course))
+        print(f"Objects in course:                {count}")
+        print(f"Validators in steps 6-8:          {len(stages())}")
+
+        assert [str(e) for e in separate(course, url_names).errors] == [str(e) for e in fused(course, url_names).errors]
+
+        number = 3
+        walk = min(timeit.repeat(lambda: sum(1 for _ in traverse(course)), number=number, repeat=3)) / number
+        old = min(timeit.repeat(lambda: separate(course, url_names), number=number, repeat=3)) / number
+        new = min(timeit.repeat(lambda: fused(course, url_names), number=number, repeat=3)) / number
+        print(f"steps 6-8, separate walks:        {old:8.4f} s")
+        print(f"steps 6-8, single shared walk:    {new:8.4f} s")
+
+        visitors = [NullVisitor() for _ in range(5)]
+        old = min(timeit.repeat(lambda: [visit(course, [(v, ErrorStore())], url_names) for v in visitors],
+                                number=number, repeat=3)) / number
+        new = min(timeit.repeat(lambda: visit(course, [(v, ErrorStore()) for v in visitors], url_names),
+                                number=number, repeat=3)) / number
+        print(f"bare traverse:                    {walk:8.4f} s")
+        print(f"5 null visitors, separate walks:  {old:8.4f} s")
+        print(f"5 null visitors, shared walk:     {new:8.4f} s ({old / new:.2f}x)")
+
+if __name__ == '__main__':
+    main()
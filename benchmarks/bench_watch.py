@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bench_watch.py
+
+Benchmark for incremental re-validation in watch mode.
+
+Generates a course in which every object lives in its own file, validates it
+with a CourseWatcher, and then times how long poll() takes to re-validate the
+course after a single problem file has been edited, compared to validating
+the whole course from scratch.
+
+Usage: python benchmarks/bench_watch.py [chapters]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from olxcleaner import validate
+from olxcleaner.watch import CourseWatcher
+
+def write(directory, filename, text):
+    """Write a file in the course"""
+    path = os.path.join(directory, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+def build_course(directory, chapters):
+    """Generate a course with 10 sequentials per chapter, 5 verticals per sequential and 4 components per vertical"""
+    write(directory, "course.xml", '<course url_name="course" org="org" course="bench"/>\n')
+    course = ['<course display_name="Benchmark">']
+    for c in range(chapters):
+        course.append(f'  <chapter url_name="c{c}"/>')
+        chapter = [f'<chapter display_name="Chapter {c}">']
+        for s in range(10):
+            chapter.append(f'  <sequential url_name="c{c}s{s}"/>')
+            sequential = [f'<sequential display_name="Sequential {s}">']
+            for v in range(5):
+                name = f"c{c}s{s}v{v}"
+                sequential.append(f'  <vertical url_name="{name}"/>')
+                write(directory, f"vertical/{name}.xml",
+                      f'<vertical display_name="Vertical {v}">\n'
+                      f'  <html url_name="{name}h"/>\n'
+                      f'  <problem url_name="{name}p1"/>\n'
+                      f'  <problem url_name="{name}p2"/>\n'
+                      f'  <problem url_name="{name}p3"/>\n'
+                      f'</vertical>\n')
+                write(directory, f"html/{name}h.xml", f'<html filename="{name}h" display_name="Text"/>\n')
+                write(directory, f"html/{name}h.html", f'<p>Some text with a <a href="/jump_to_id/{name}p1">link</a></p>\n')
+                for p in range(1, 4):
+                    write(directory, f"problem/{name}p{p}.xml",
+                          f'<problem display_name="Problem {p}" max_attempts="2">\n'
+                          f'  <multiplechoiceresponse>\n'
+                          f'    <choicegroup type="MultipleChoice">\n'
+                          f'      <choice correct="true">Yes</choice>\n'
+                          f'      <choice correct="false">No</choice>\n'
+                          f'    </choicegroup>\n'
+                          f'  </multiplechoiceresponse>\n'
+                          f'</problem>\n')
+            sequential.append('</sequential>')
+            write(directory, f"sequential/c{c}s{s}.xml", "\n".join(sequential) + "\n")
+        chapter.append('</chapter>')
+        write(directory, f"chapter/c{c}.xml", "\n".join(chapter) + "\n")
+    course.append('</course>')
+    write(directory, "course/course.xml", "\n".join(course) + "\n")
+
+def main():
+    chapters = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = os.path.join(tmp, "course")
+        build_course(directory, chapters)
+
+        start = time.perf_counter()
+        course, errorstore, url_names = validate(directory)
+        full = time.perf_counter() - start
+        print(f"Objects in course:                {len(url_names)}")
+        print(f"validate() from scratch:          {full:8.3f} s")
+
+        watcher = CourseWatcher(directory)
+        start = time.perf_counter()
+        watcher.validate()
+        print(f"Initial CourseWatcher.validate(): {time.perf_counter() - start:8.3f} s")
+
+        start = time.perf_counter()
+        watcher.poll()
+        print(f"poll() with no changes:           {time.perf_counter() - start:8.3f} s")
+
+        path = os.path.join(directory, "problem", "c0s0v0p1.xml")
+        for label, text in (("poll() after breaking a problem:", "<problem>"),
+                            ("poll() after fixing the problem:", "<problem display_name='Fixed'>\n<p/>\n</problem>")):
+            with open(path, "w") as f:
+                f.write(text)
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+            start = time.perf_counter()
+            new_errors, fixed_errors, changed = watcher.poll()
+            elapsed = time.perf_counter() - start
+            print(f"{label}  {elapsed:8.3f} s ({len(new_errors)} new, {len(fixed_errors)} fixed errors)")
+
+if __name__ == "__main__":
+    main()
@@ -19,4 +19,5 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 from olxcleaner.validate import validate
+from olxcleaner.avalidate import avalidate
 from olxcleaner.__version__ import version
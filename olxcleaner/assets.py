@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+assets.py
+
+Reports on the static files of a course
+"""
+import os
+import mmap
+import pickle
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from olxcleaner.parser.slowvalidators import object_links
+from olxcleaner.loader.source import FileSystemSource
+
+def static_references(course):
+    """
+    Finds the static files that a course refers to: through internal /static/ links in content and
+    drag and drop data, and as the course image.
+
+    :param course: EdxCourse object with a loaded course
+    :return: Set of filenames, relative to the static directory
+    """
+    references = set()
+    image = course.attributes.get('course_image')
+    if image:
+        references.add(image)
+    for edxobj in course.preorder():
+        for link in object_links(edxobj):
+            if link.startswith('/static/'):
+                references.add(link[len('/static/'):])
+    return references
+
+def audit_static_assets(course, references=None):
+    """
+    Compares the static files of a course against the files that it refers to, finding:
+
+      * Unused files: static files that nothing in the course refers to. These may still be used by
+        other static files (e.g., stylesheets), or by settings that aren't in the course export.
+      * Case collisions: groups of static files and references whose names differ only in case, which
+        refer to the same file on case-insensitive storage and to different files elsewhere
+
+    :param course: EdxCourse object with a loaded course
+    :param references: Set of static files that the course refers to (default: static_references(course))
+    :return: Sorted list of unused files, sorted list of collisions (each a sorted list of names)
+    """
+    files = course.static_index().files
+    if references is None:
+        references = static_references(course)
+    unused = sorted(files - references)
+    names = {}
+    for name in files | references:
+        names.setdefault(name.lower(), []).append(name)
+    collisions = sorted(sorted(group) for group in names.values() if len(group) > 1)
+    return unused, collisions
+
+class DigestCache(object):
+    """
+    A persistent record of the digests of static files, so that files that haven't changed since they
+    were last hashed need not be read again. Each file is identified by its absolute path, and its digest
+    is used while its size and modification time are unchanged. The record is kept in a single file
+    in the cache directory, and is written back by save().
+    """
+
+    filename = "digests"
+
+    def __init__(self, directory):
+        """
+        :param directory: Directory to keep the record in (created if necessary)
+        """
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.digests = self._read()  # {path: (size, mtime_ns, digest)}
+        self.changed = False
+
+    def get(self, path, size, mtime_ns):
+        """Returns the digest of a file, or None if it hasn't been recorded since the file last changed"""
+        entry = self.digests.get(path)
+        if entry is not None and entry[0] == size and entry[1] == mtime_ns:
+            self.hits += 1
+            return entry[2]
+        self.misses += 1
+        return None
+
+    def put(self, path, size, mtime_ns, digest):
+        """Records the digest of a file"""
+        self.digests[path] = (size, mtime_ns, digest)
+        self.changed = True
+
+    def save(self):
+        """Atomically write the record back to the cache directory, if it has changed"""
+        if not self.changed:
+            return
+        try:
+            fd, tmppath = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(self.digests, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmppath, os.path.join(self.directory, self.filename))
+            self.changed = False
+        except OSError:  # pragma: no cover
+            pass
+
+    def _read(self):
+        """Read the record from the cache directory. Returns an empty record if not present or unreadable."""
+        try:
+            with open(os.path.join(self.directory, self.filename), 'rb') as f:
+                digests = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError, ImportError):
+            return {}
+        return digests if isinstance(digests, dict) else {}
+
+def hash_file(path, chunk_size=1 << 20):
+    """
+    Computes the SHA-256 digest of a file, reading it through a memory map a chunk at a time.
+    hashlib releases the GIL while hashing each chunk, so files can be hashed in parallel threads.
+
+    :param path: Path of the file (must not be empty)
+    :param chunk_size: Number of bytes to hash at a time
+    :return: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped) as view:
+            for offset in range(0, len(view), chunk_size):
+                digest.update(view[offset:offset + chunk_size])
+    return digest.hexdigest()
+
+def hash_stream(f, chunk_size=1 << 20):
+    """
+    Computes the SHA-256 digest of the contents of a binary file object, reading it a chunk at a time.
+
+    :param f: File object
+    :param chunk_size: Number of bytes to hash at a time
+    :return: Hex digest
+    """
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(chunk_size), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def find_duplicate_assets(course, workers=None, cache=None, chunk_size=1 << 20):
+    """
+    Finds groups of static files with identical contents. Files are first grouped by size, and only
+    files that share their size with another are hashed, in a pool of threads. Empty files are ignored.
+
+    For a course read from a directory, files are hashed through memory maps, and the digests are
+    recorded in the cache (if given) so that unchanged files aren't read again on later runs. For
+    other sources (e.g., archives), the sizes come from the source, and the files to hash are read
+    through the source in a single pass (see CourseSource.open_files) and hashed as they are read,
+    without threads or the cache.
+
+    :param course: EdxCourse object with a loaded course
+    :param workers: Number of threads to hash files with (None = the ThreadPoolExecutor default)
+    :param cache: DigestCache object (None = no cache)
+    :param chunk_size: Number of bytes to hash at a time
+    :return: List of (size, names) pairs, one for each group of identical files, with the names (relative
+             to the static directory) sorted, largest saving first
+    """
+    source = course.source
+    names = course.static_index().files
+    if source is not None and not isinstance(source, FileSystemSource):
+        by_size = {}
+        for name in names:
+            size = source.size("static/" + name)
+            if size:
+                by_size.setdefault(size, []).append(name)
+        candidates = {"static/" + name: (size, name)
+                      for size, group in by_size.items() if len(group) > 1 for name in group}
+        files = []
+        for filename, f in source.open_files(sorted(candidates)):
+            size, name = candidates[filename]
+            files.append((size, name, hash_stream(f, chunk_size)))
+        return group_duplicates(files)
+
+    # Group the files by size
+    static = os.path.join(source.directory if source is not None else course.directory or ".", "static")
+    by_size = {}
+    for name in names:
+        path = os.path.abspath(os.path.join(static, name))
+        try:
+            stat = os.stat(path)
+        except OSError:  # pragma: no cover
+            continue
+        if stat.st_size:
+            by_size.setdefault(stat.st_size, []).append((name, path, stat.st_size, stat.st_mtime_ns))
+
+    # Hash the files that share their size with another, unless the cache knows their digest
+    files = []
+    needed = []
+    for entries in by_size.values():
+        if len(entries) < 2:
+            continue
+        for entry in entries:
+            name, path, size, mtime_ns = entry
+            digest = cache.get(path, size, mtime_ns) if cache is not None else None
+            if digest is None:
+                needed.append(entry)
+            else:
+                files.append((size, name, digest))
+    with ThreadPoolExecutor(workers) as executor:
+        digests = executor.map(lambda entry: hash_file(entry[1], chunk_size), needed)
+        for (name, path, size, mtime_ns), digest in zip(needed, digests):
+            files.append((size, name, digest))
+            if cache is not None:
+                cache.put(path, size, mtime_ns, digest)
+    if cache is not None:
+        cache.save()
+
+    return group_duplicates(files)
+
+def group_duplicates(files):
+    """
+    Groups files with the same size and digest.
+
+    :param files: Iterable of (size, name, digest) triples
+    :return: List of (size, names) pairs for the groups with more than one file, with the names sorted,
+             largest saving first
+    """
+    groups = {}
+    for size, name, digest in files:
+        groups.setdefault((size, digest), []).append(name)
+    duplicates = [(size, sorted(group)) for (size, _), group in groups.items() if len(group) > 1]
+    duplicates.sort(key=lambda entry: (-entry[0] * (len(entry[1]) - 1), entry[1]))
+    return duplicates
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+avalidate.py
+
+Validates an OLX course from an asyncio event loop, without blocking it
+"""
+import asyncio
+from olxcleaner.validate import start_validation
+
+def avalidate(filename, steps=8, ignore=None, workers=None, cache_dir=None, cache_strict=False,
+              cache_size=256 * 1024 * 1024, lazy=None, low_memory=False, processes=None, profile=False,
+              only=None, skip=None, fail_fast=None, result_cache=None, executor=None, chunk=200):
+    """
+    Validate an OLX course from an asyncio event loop. Takes the same arguments as validate, along with:
+
+    :param executor: concurrent.futures Executor in which to read and parse files and run validators that
+                     aren't visitors (None = the default executor of the event loop)
+    :param chunk: Number of objects to validate at a time in steps 6-8, before yielding to the event loop
+    :return: AsyncValidation object, to be awaited for (course, errorstore, url_names)
+    """
+    pipeline, errorstore = start_validation(filename, steps, ignore, workers, cache_dir, cache_strict, cache_size,
+                                            lazy, low_memory, processes, profile, only, skip, fail_fast, chunk,
+                                            result_cache)
+    return AsyncValidation(pipeline, errorstore, executor)
+
+class AsyncValidation(object):
+    """
+    A validation run on an event loop, started when it is first awaited or iterated over.
+
+    Awaiting it returns course, errorstore, url_names, as from validate. Iterating over it with async for
+    yields a Progress object (olxcleaner.validate.Progress) after each validation step, and after each chunk
+    of objects in steps 6-8, finishing when the validation does. Cancelling it (or cancelling the task that
+    awaits it) stops validation at the next point where it yields to the event loop. Any file reads that are
+    already running in the executor finish in the background, and their results are discarded.
+    """
+
+    def __init__(self, pipeline, errorstore, executor=None):
+        """
+        :param pipeline: Validation pipeline (see olxcleaner.validate.validation_pipeline)
+        :param errorstore: ErrorStore object that the pipeline reports errors to
+        :param executor: Executor in which to run blocking work (None = the default executor of the event loop)
+        """
+        self.pipeline = pipeline
+        self.errorstore = errorstore
+        self.executor = executor
+        self.task = None
+        self.updates = None
+
+    def start(self):
+        """Start the validation on the running event loop (if it hasn't started yet), returning its task"""
+        if self.task is None:
+            self.updates = asyncio.Queue()
+            self.task = asyncio.ensure_future(self.run())
+        return self.task
+
+    def cancel(self):
+        """Cancel the validation"""
+        return self.start().cancel()
+
+    def done(self):
+        """Returns True if the validation has finished (or been cancelled)"""
+        return self.task is not None and self.task.done()
+
+    def __await__(self):
+        return self.start().__await__()
+
+    def __aiter__(self):
+        self.start()
+        return self
+
+    async def __anext__(self):
+        update = await self.updates.get()
+        if update is None:
+            raise StopAsyncIteration
+        return update
+
+    async def run(self):
+        """Drive the validation pipeline, running blocking work in the executor and yielding to the event loop"""
+        # Inside a coroutine, this is the running loop (asyncio.get_running_loop requires Python 3.7)
+        loop = asyncio.get_event_loop()
+        pipeline = self.pipeline
+        send, value = pipeline.send, None
+        try:
+            while True:
+                try:
+                    item = send(value)
+                except StopIteration as stop:
+                    course, url_names = stop.value
+                    return course, self.errorstore, url_names
+                send, value = pipeline.send, None
+                if callable(item):
+                    try:
+                        value = await loop.run_in_executor(self.executor, item)
+                    except Exception as e:
+                        # Raise the exception inside the pipeline
+                        send, value = pipeline.throw, e
+                else:
+                    self.updates.put_nowait(item)
+                    await asyncio.sleep(0)
+        finally:
+            pipeline.close()
+            self.updates.put_nowait(None)
@@ -6,22 +6,49 @@ edX XML code validator, based on a very light wrapper around
 the olxcleaner library. Despite the light touch, it
 exposes all of the capabilities of the library.
 """
+import os
 import sys
+import json
+import time
 import argparse
 
 from olxcleaner import validate
 from olxcleaner.__version__ import version
-from olxcleaner.reporting import construct_tree, report_errors, report_error_summary, report_statistics
+from olxcleaner.reporting import (construct_tree, report_errors, report_error_summary, report_statistics,
+                                  report_cache_summary, report_error_diff, report_profile, report_static_assets,
+                                  report_duplicate_assets)
+from olxcleaner.assets import audit_static_assets, find_duplicate_assets, DigestCache
+from olxcleaner.watch import CourseWatcher
+from olxcleaner.fleet import find_courses, validate_many, summarize_fleet
+from olxcleaner.server import ValidationService, make_server
+from olxcleaner.loader.archive import is_archive
 from olxcleaner.loader.xml_exceptions import CourseXMLDoesNotExist
+from olxcleaner.parser.schedule import plan
+from olxcleaner.exceptions import ErrorLevel
 
 
+def fail_fast_level(args):
+    """Returns the error level at which to stop validating (None to validate everything)"""
+    if args.fail_fast and args.failure < 4:
+        return ErrorLevel(args.failure)
+    return None
+
+def names_list(text):
+    """Splits a comma-separated list of names"""
+    return [name.strip() for name in text.split(",") if name.strip()]
+
 def handle_arguments():
     """Look after all command-line arguments"""
     parser = argparse.ArgumentParser(description="edX XML cleaner -- A validator for XML edX courses")
 
+    # Command
+    parser.add_argument("command", nargs="?", choices=["serve"],
+                        help="serve: run a validation server, which keeps recently validated courses in memory")
+
     # Required arguments
     # Location of course.xml
-    parser.add_argument("-c", "--course", help="Location of course.xml (default=./course.xml)", default="course.xml")
+    parser.add_argument("-c", "--course", help="Location of course.xml, or a .tar.gz/.zip course export "
+                                               "(default=./course.xml)", default="course.xml")
 
     # Optional arguments
     # Output file for structure
@@ -43,11 +70,21 @@ def handle_arguments():
     # Error summary
     parser.add_argument("-S", "--stats", help="Output course statistics", action="store_true")
 
+    # Static file report
+    parser.add_argument("--assets", help="Report static files that nothing in the course refers to, and names "
+                                         "that differ only in case", action="store_true")
+    parser.add_argument("--asset-dedupe", help="Report static files with identical contents, and the space that "
+                                               "removing the copies would save", action="store_true")
+
     # Failure level
     parser.add_argument("-f", "--failure", default=3, choices=[0, 1, 2, 3, 4], type=int,
                         help="Level of errors at which to declare failure: 0=DEBUG, 1=INFO, "
                              "2=WARNING, 3=ERROR (default), 4=NEVER")
 
+    # Fail fast
+    parser.add_argument("--fail-fast", help="Stop as soon as an error at the failure level (-f) is found",
+                        action="store_true")
+
     # Steps to run
     parser.add_argument("-p", "--steps", default=8, choices=[1, 2, 3, 4, 5, 6, 7, 8], type=int,
                         help="Validation steps to take: 1=load course, 2=load policies, 3=check url_names, "
@@ -57,6 +94,61 @@ def handle_arguments():
     # Ignore list
     parser.add_argument('-i', '--ignore', nargs='+', help='List of errors to ignore')
 
+    # Validator selection
+    parser.add_argument("--only", type=names_list,
+                        help="Comma-separated list of validation steps and validators to run (together with those "
+                             "they depend on), instead of the steps given by -p")
+    parser.add_argument("--skip", type=names_list,
+                        help="Comma-separated list of validation steps and validators not to run")
+
+    # Parallel loading
+    parser.add_argument("-j", "--jobs", default=1, type=int,
+                        help="Number of threads to use when loading the course, or the number of courses to "
+                             "validate at once in fleet mode (default=1)")
+
+    # Parallel validation
+    parser.add_argument("--processes", default=1, type=int,
+                        help="Number of processes to use when validating the course (default=1)")
+
+    # Parse cache
+    parser.add_argument("--cache", help="Directory in which to cache parsed course files")
+    parser.add_argument("--cache-strict", help="Identify unchanged files in the caches by their contents",
+                        action="store_true")
+    parser.add_argument("--cache-size", default=256, type=int,
+                        help="Maximum size of the parse cache in MB (default=256)")
+    parser.add_argument("--result-cache", help="Directory in which to cache validation results, so that courses "
+                                               "that haven't changed aren't validated again")
+
+    # Low memory mode
+    parser.add_argument("--low-memory", help="Summarize component content as it is loaded, rather than keeping it "
+                                             "in memory", action="store_true")
+
+    # Profiling
+    parser.add_argument("--profile", nargs="?", const="table", choices=["table", "json"],
+                        help="Output the time taken by each validation step and validator, as a table (default) "
+                             "or as JSON")
+
+    # Watch mode
+    parser.add_argument("-w", "--watch", help="Keep running, and re-validate the course whenever files change",
+                        action="store_true")
+    parser.add_argument("--interval", default=1.0, type=float,
+                        help="Number of seconds between checks for changed files in watch mode (default=1)")
+
+    # Fleet mode
+    parser.add_argument("--courses", help="Validate many courses: a glob pattern, or a file listing one course "
+                                          "per line. Results are output as JSON lines")
+    parser.add_argument("--max-tasks", type=int,
+                        help="Number of courses each worker validates before it is replaced in fleet mode")
+    parser.add_argument("--max-rss", type=int,
+                        help="Memory (in MB) above which a worker is replaced in fleet mode")
+
+    # Server mode
+    parser.add_argument("--port", default=8765, type=int,
+                        help="Port on which the server listens for HTTP requests on localhost (default=8765)")
+    parser.add_argument("--socket", help="Path of a Unix socket for the server to listen on, instead of a port")
+    parser.add_argument("--max-courses", default=8, type=int,
+                        help="Number of courses the server keeps in memory (default=8)")
+
     # Parse the command line
     return parser.parse_args()
 
@@ -66,12 +158,35 @@ def main():
     # Read the command line arguments
     args = handle_arguments()
 
+    # Check the validators to run
+    try:
+        plan(args.steps, args.only, args.skip)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.command == "serve":
+        serve(args)
+
+    if args.courses:
+        fleet(args)
+
     if not args.quiet:
         print(f'edX XML cleaner {version} -- A validator for XML edX courses')
         print(f'Loading...')
 
+    if args.watch:
+        watch(args)
+
     # Validate the course
-    course, errorstore, url_names = validate(args.course, args.steps, args.ignore)
+    course, errorstore, url_names = validate(args.course, args.steps, args.ignore, workers=args.jobs,
+                                             cache_dir=args.cache, cache_strict=args.cache_strict,
+                                             cache_size=args.cache_size * 1024 * 1024,
+                                             low_memory=args.low_memory, processes=args.processes,
+                                             profile=bool(args.profile), only=args.only, skip=args.skip,
+                                             fail_fast=fail_fast_level(args),
+                                             result_cache=None if args.tree or args.assets or args.asset_dedupe
+                                                           else args.result_cache)
     
     # Check that the course exists
     if len(errorstore.errors) > 0 and isinstance(errorstore.errors[0], CourseXMLDoesNotExist):
@@ -80,7 +195,10 @@ def main():
 
     # Output reports
     if not args.quiet:
-        print(f'Loaded from {course.fullpath}')
+        if errorstore.cached:
+            print(f'Course unchanged; results restored from {args.result_cache}')
+        else:
+            print(f'Loaded from {course.fullpath}')
 
         if not args.noerrors:
             error_report = report_errors(errorstore)
@@ -90,13 +208,37 @@ def main():
                     print(line)
         if not args.nosummary:
             print()
+            if errorstore.truncated:
+                print(f"Validation stopped at the first error at level {ErrorLevel(args.failure).name} or above")
             for line in report_error_summary(errorstore):
                 print(line)
+            if course is not None and course.parse_cache:
+                for line in report_cache_summary(course.parse_cache):
+                    print(line)
         if args.stats:
             print()
-            for line in report_statistics(course):
+            for line in report_statistics(course, errorstore.statistics):
+                print(line)
+        if args.assets and course is not None:
+            print()
+            for line in report_static_assets(*audit_static_assets(course)):
+                print(line)
+        if args.asset_dedupe and course is not None:
+            print()
+            digest_cache = DigestCache(os.path.join(args.cache, "assets")) if args.cache else None
+            duplicates = find_duplicate_assets(course, workers=args.jobs if args.jobs > 1 else None,
+                                               cache=digest_cache)
+            for line in report_duplicate_assets(duplicates):
                 print(line)
 
+    # Output the profile
+    if args.profile == "json":
+        print(json.dumps(errorstore.profile.as_dict()))
+    elif args.profile and not args.quiet:
+        print()
+        for line in report_profile(errorstore.profile):
+            print(line)
+
     # Output the structure to file
     if args.tree and course is not None:
         if not args.quiet:
@@ -118,5 +260,100 @@ def main():
             print(f"Done! Exiting with code 0")
         sys.exit(0)
 
+def watch(args):
+    """Validate the course, and then re-validate it whenever files change, until interrupted"""
+    if is_archive(args.course):
+        print("Error: watch mode requires a course directory, not an archive")
+        sys.exit(1)
+    if args.only or args.skip or args.fail_fast:
+        print("Error: watch mode runs the steps given by -p, and can't be used with --only, --skip or --fail-fast")
+        sys.exit(1)
+
+    watcher = CourseWatcher(args.course, args.steps, args.ignore, workers=args.jobs)
+    watcher.validate()
+
+    # Check that the course exists
+    errorstore = watcher.errorstore
+    if len(errorstore.errors) > 0 and isinstance(errorstore.errors[0], CourseXMLDoesNotExist):
+        print(f"Error: {errorstore.errors[0].description}")
+        sys.exit(1)
+
+    if not args.quiet:
+        if not args.noerrors:
+            error_report = report_errors(errorstore)
+            if error_report:
+                print()
+                for line in error_report:
+                    print(line)
+        if not args.nosummary:
+            print()
+            for line in report_error_summary(errorstore):
+                print(line)
+        print()
+        print(f"Watching {watcher.directory or '.'} for changes (press Ctrl-C to stop)...")
+
+    try:
+        while True:
+            time.sleep(args.interval)
+            start = time.perf_counter()
+            result = watcher.poll()
+            if result is None or args.quiet:
+                continue
+            new_errors, fixed_errors, changed = result
+            elapsed = time.perf_counter() - start
+            print()
+            print(f"Changed: {', '.join(changed)}")
+            if not args.noerrors:
+                for line in report_error_diff(new_errors, fixed_errors):
+                    print(line)
+            print(f"{len(new_errors)} new errors, {len(fixed_errors)} fixed errors, "
+                  f"{len(watcher.errors)} errors in total (revalidated in {elapsed:.3f}s)")
+    except KeyboardInterrupt:
+        pass
+
+    # Exit with the appropriate error level
+    sys.exit(1 if watcher.errorstore.return_error(args.failure) else 0)
+
+def fleet(args):
+    """Validate many courses, outputting the results for each course and a summary as JSON lines"""
+    courses = find_courses(args.courses)
+    results = []
+    for result in validate_many(courses, jobs=args.jobs, max_tasks=args.max_tasks,
+                                max_rss=args.max_rss * 1024 * 1024 if args.max_rss else None,
+                                steps=args.steps, ignore=args.ignore, cache_dir=args.cache,
+                                cache_strict=args.cache_strict, cache_size=args.cache_size * 1024 * 1024,
+                                low_memory=args.low_memory, processes=args.processes,
+                                profile=bool(args.profile), only=args.only, skip=args.skip,
+                                fail_fast=fail_fast_level(args), result_cache=args.result_cache):
+        results.append(result)
+        if not args.quiet:
+            if args.noerrors:
+                result = {key: value for key, value in result.items() if key != "errors"}
+            print(json.dumps(dict(type="course", **result)), flush=True)
+
+    summary = summarize_fleet(results, args.failure)
+    if not args.quiet and not args.nosummary:
+        print(json.dumps(dict(type="summary", **summary)), flush=True)
+
+    # Exit with the appropriate error level
+    sys.exit(1 if summary["failed"] else 0)
+
+def serve(args):
+    """Run a validation server until interrupted"""
+    service = ValidationService(args.max_courses, workers=args.jobs, cache_dir=args.cache)
+    server = make_server(service, port=args.port, socket_path=args.socket, verbose=not args.quiet)
+    if not args.quiet:
+        address = args.socket or "http://{}:{}".format(*server.server_address[:2])
+        print(f'edX XML cleaner {version} -- Validation server listening on {address}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket:
+            os.remove(args.socket)
+    sys.exit(0)
+
 if __name__ == '__main__':
     main()
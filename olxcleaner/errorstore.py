@@ -5,18 +5,39 @@ errorstore.py
 Structures to accumulate and track errors in a course
 """
 from collections import Counter
+from olxcleaner.exceptions import ErrorLevel
+
+class ValidationAborted(Exception):
+    """Raised when an error is reported at or above the fail-fast level of an ErrorStore"""
 
 class ErrorStore(object):
     """Class to store all errors in an import"""
 
-    def __init__(self, ignorelist=None):
+    def __init__(self, ignorelist=None, fail_fast=None):
+        """
+        :param ignorelist: List of names of errors to ignore
+        :param fail_fast: ErrorLevel (or its value) at which to abort, by raising ValidationAborted as soon as
+                          an error at or above that level is added (None = never abort)
+        """
         self.errors = []
         self.ignorelist = ignorelist if ignorelist else []
+        self.fail_fast = fail_fast.value if isinstance(fail_fast, ErrorLevel) else fail_fast
+        # Whether validation was aborted by an error at the fail-fast level
+        self.truncated = False
+        # ValidationProfile of the validation run, if it was profiled
+        self.profile = None
+        # Whether the errors were restored from the result cache, rather than found by validating the course
+        self.cached = False
+        # Course statistics (see olxcleaner.reporting.compute_statistics), when the result cache is used
+        self.statistics = None
 
     def add_error(self, error):
         """Add an error to the list (but only if not ignored)"""
         if error.name not in self.ignorelist:
             self.errors.append(error)
+            if self.fail_fast is not None and error.level_val >= self.fail_fast:
+                self.truncated = True
+                raise ValidationAborted(error)
 
     def return_error(self, error_level):
         """Returns True if the highest level error is at least error_level"""
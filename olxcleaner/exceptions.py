@@ -23,6 +23,7 @@ class CourseError(ABC):
     _level = ErrorLevel.DEBUG
     _filename = ""        # To be set in init
     _description = ""     # To be set in init
+    _line = None          # Line in the file where the error was found, if known (may be set in init)
 
     def __repr__(self):  # pragma: no cover
         return f"<{self.__class__.__name__} error in {self.filename}>"
@@ -40,6 +41,10 @@ class CourseError(ABC):
     def filename(self):
         return self._filename
 
+    @property
+    def line(self):
+        return self._line
+
     @property
     def description(self):
         return self._description
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+fleet.py
+
+Validates many courses in a pool of worker processes
+"""
+import os
+import glob
+import time
+import weakref
+import multiprocessing
+from collections import Counter, deque
+from multiprocessing.connection import wait
+
+from olxcleaner.validate import validate
+from olxcleaner.exceptions import ErrorLevel
+from olxcleaner.reporting import describe_errors
+from olxcleaner.loader.archive import is_archive, CONTENT_EXTENSIONS
+
+def find_courses(spec):
+    """
+    Find the courses described by a glob pattern or a manifest file.
+
+    A manifest file lists one course per line (a course directory, course.xml file or course archive).
+    Blank lines and lines starting with # are ignored, and relative paths are relative to the manifest.
+
+    :param spec: Glob pattern, or path of a manifest file
+    :return: List of course paths
+    """
+    if os.path.isfile(spec) and not is_archive(spec) and not spec.endswith(".xml"):
+        base = os.path.dirname(spec)
+        with open(spec) as f:
+            lines = [line.strip() for line in f]
+        return [os.path.join(base, line) for line in lines if line and not line.startswith("#")]
+    return sorted(glob.glob(spec))
+
+def course_size(path):
+    """
+    Estimate the amount of work needed to validate a course, as the number of bytes of course files.
+
+    :param path: Course directory, course.xml file or course archive
+    :return: Size in bytes (0 if the course can't be found)
+    """
+    if os.path.isfile(path):
+        if is_archive(path):
+            return os.path.getsize(path)
+        path = os.path.dirname(path) or "."
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        # Skip hidden directories and static files
+        dirnames[:] = [name for name in dirnames if not name.startswith(".") and name != "static"]
+        for name in filenames:
+            if name.lower().endswith(CONTENT_EXTENSIONS):
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+    return total
+
+def current_rss():
+    """Returns the resident set size of this process in bytes (or its peak, where that's all that's available)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):  # pragma: no cover
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def validate_course(path, options):
+    """
+    Validate a single course, describing the results in a JSON-serializable dictionary.
+
+    :param path: Course directory, course.xml file or course archive
+    :param options: Dictionary of keyword arguments for validate
+    :return: Dictionary of results
+    """
+    start = time.perf_counter()
+    result = {"course": path, "loaded": False, "errors": [], "summary": {}, "exception": None}
+    try:
+        course, errorstore, _ = validate(path, **options)
+    except Exception as e:
+        result["exception"] = f"{type(e).__name__}: {e}"
+    else:
+        result["loaded"] = course is not None or errorstore.cached
+        result["cached"] = errorstore.cached
+        result["truncated"] = errorstore.truncated
+        result["errors"] = describe_errors(errorstore.errors)
+        result["summary"] = {level: dict(counter) for level, counter in errorstore.summary().items()}
+        if errorstore.profile:
+            result["profile"] = errorstore.profile.as_dict()
+    result["seconds"] = round(time.perf_counter() - start, 4)
+    result["pid"] = os.getpid()
+    result["rss"] = current_rss()
+    return result
+
+def worker_main(conn, options):
+    """Validate the courses sent down a connection until told to stop (or until the parent goes away)"""
+    while True:
+        try:
+            path = conn.recv()
+        except EOFError:
+            break
+        if path is None:
+            break
+        conn.send(validate_course(path, options))
+    conn.close()
+
+class Worker(object):
+    """
+    A worker process, with the connection to it and the task it's working on.
+
+    Workers aren't daemonic, so that they can validate courses in a pool of processes of their own
+    (the processes option of validate). Any worker still running when the interpreter exits is terminated.
+    """
+
+    def __init__(self, context, options):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn, options))
+        self.process.start()
+        child_conn.close()
+        self.task = None
+        self.tasks_done = 0
+        weakref.finalize(self, terminate, self.process)
+
+    def send(self, task):
+        """Send a course to the worker to validate"""
+        self.task = task
+        self.conn.send(task)
+
+    def stop(self):
+        """Ask the worker to exit once it's done"""
+        try:
+            self.conn.send(None)
+        except OSError:  # pragma: no cover
+            pass
+        self.process.join()
+        self.conn.close()
+
+def terminate(process):
+    """Terminate a worker process if it's still running"""
+    if process.is_alive():
+        process.terminate()
+        process.join()
+
+def validate_many(courses, jobs=None, max_tasks=None, max_rss=None, **options):
+    """
+    Validate many courses, using a pool of worker processes. Courses are validated largest first,
+    so that a large course doesn't hold up the end of the run. Results are generated as each course
+    finishes (so not in the order given). A worker that dies while validating a course is replaced,
+    and the course is reported with an exception.
+
+    :param courses: List of course paths (course directories, course.xml files or course archives)
+    :param jobs: Number of worker processes (default: number of CPUs; 1 = validate in this process)
+    :param max_tasks: Replace each worker after it has validated this many courses (None = never)
+    :param max_rss: Replace a worker once its resident memory exceeds this many bytes (None = never)
+    :param options: Further keyword arguments for validate (e.g., steps, ignore)
+    :return: Generator of result dictionaries (see validate_course)
+    """
+    tasks = deque(sorted(courses, key=course_size, reverse=True))
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    if jobs <= 1:
+        while tasks:
+            yield validate_course(tasks.popleft(), options)
+        return
+
+    context = multiprocessing.get_context()
+    workers = []
+    try:
+        for _ in range(min(jobs, len(tasks))):
+            worker = Worker(context, options)
+            worker.send(tasks.popleft())
+            workers.append(worker)
+
+        while workers:
+            ready = wait([worker.conn for worker in workers] + [worker.process.sentinel for worker in workers])
+            for worker in list(workers):
+                if worker.conn not in ready and worker.process.sentinel not in ready:
+                    continue
+                try:
+                    result = worker.conn.recv() if worker.conn.poll() else None
+                except EOFError:
+                    result = None
+                if result is None:
+                    # The worker died while validating its course
+                    workers.remove(worker)
+                    worker.process.join()
+                    worker.conn.close()
+                    yield {"course": worker.task, "loaded": False, "errors": [], "summary": {},
+                           "exception": f"Worker process exited with code {worker.process.exitcode}"}
+                    if tasks:
+                        worker = Worker(context, options)
+                        worker.send(tasks.popleft())
+                        workers.append(worker)
+                    continue
+
+                worker.tasks_done += 1
+                yield result
+
+                if (max_tasks and worker.tasks_done >= max_tasks) or (max_rss and result["rss"] > max_rss) \
+                        or not tasks:
+                    # Recycle (or retire) the worker
+                    workers.remove(worker)
+                    worker.stop()
+                    if not tasks:
+                        continue
+                    worker = Worker(context, options)
+                    workers.append(worker)
+                worker.send(tasks.popleft())
+    finally:
+        for worker in workers:
+            worker.process.terminate()
+            worker.process.join()
+
+def summarize_fleet(results, failure=ErrorLevel.ERROR.value):
+    """
+    Combine the results of validating many courses.
+
+    :param results: List of result dictionaries from validate_many
+    :param failure: Error level at which a course is considered to have failed
+    :return: Dictionary summarizing the results
+    """
+    levels = Counter()
+    names = Counter()
+    failed = []
+    for result in results:
+        course_failed = result["exception"] is not None or not result["loaded"]
+        for level, counter in result["summary"].items():
+            levels[level] += sum(counter.values())
+            names.update(counter)
+            if ErrorLevel[level].value >= failure:
+                course_failed = True
+        if course_failed:
+            failed.append(result["course"])
+    slowest = max(results, key=lambda result: result.get("seconds", 0), default=None)
+    return {
+        "courses": len(results),
+        "loaded": sum(1 for result in results if result["loaded"]),
+        "exceptions": sum(1 for result in results if result["exception"] is not None),
+        "failed": sorted(failed),
+        "errors": {level.name: levels[level.name] for level in ErrorLevel if level.name in levels},
+        "error_names": dict(sorted(names.items())),
+        "seconds": round(sum(result.get("seconds", 0) for result in results), 4),
+        "slowest": None if slowest is None else {"course": slowest["course"], "seconds": slowest.get("seconds")},
+    }
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+index.py
+
+A flat, columnar view of a course's object tree, for fast whole-course queries
+"""
+from array import array
+from collections import Counter
+
+def readonly(values):
+    """Returns a read-only memoryview of an array"""
+    view = memoryview(values)
+    return view.toreadonly() if hasattr(view, 'toreadonly') else view
+
+class CourseIndex(object):
+    """
+    Read-only columnar view of the objects in a course, in preorder (the order of traverse, so that
+    broken objects and their children are omitted). Object i is described by:
+
+      * objects[i]: The EdxObject itself
+      * type_codes[i]: Index of its tag in types
+      * parents[i]: Index of its parent (-1 for the root)
+      * depths[i]: Its depth in the tree (0 for the root)
+      * ends[i]: One past the index of its last descendant, so that its subtree is range(i, ends[i])
+      * url_name_ids[i], display_name_ids[i]: Index of its url_name and display_name in
+        url_name_table and display_name_table (-1 if it has none)
+
+    The integer columns are memoryviews of arrays, and can be passed to numpy.asarray without copying.
+    Subtree queries are slices of these columns rather than walks over the tree.
+    """
+
+    __slots__ = ('objects', 'types', 'type_codes', 'parents', 'depths', 'ends',
+                 'url_name_table', 'url_name_ids', 'display_name_table', 'display_name_ids', '_url_names')
+
+    def __init__(self, root):
+        """
+        Builds the index in a single pass over the tree.
+
+        :param root: The EdxObject at the root of the tree (usually the course)
+        """
+        objects = []
+        types, type_lookup = [], {}
+        type_codes, parents, depths = array('i'), array('i'), array('i')
+        url_name_table, url_name_lookup, url_name_ids = [], {}, array('i')
+        display_name_table, display_name_lookup, display_name_ids = [], {}, array('i')
+        first = {}
+
+        stack = [] if root.broken else [(root, -1, 0)]
+        while stack:
+            edxobj, parent, depth = stack.pop()
+            index = len(objects)
+            objects.append(edxobj)
+
+            code = type_lookup.get(edxobj.type)
+            if code is None:
+                code = type_lookup[edxobj.type] = len(types)
+                types.append(edxobj.type)
+            type_codes.append(code)
+            parents.append(parent)
+            depths.append(depth)
+            url_name = edxobj.attributes.get('url_name')
+            url_name_ids.append(intern_string(url_name, url_name_table, url_name_lookup))
+            if url_name is not None and url_name not in first:
+                first[url_name] = index
+            display_name_ids.append(intern_string(edxobj.attributes.get('display_name'),
+                                                  display_name_table, display_name_lookup))
+
+            stack.extend((child, index, depth + 1) for child in reversed(edxobj.children) if not child.broken)
+
+        # Each subtree ends where the subtree of its last descendant ends
+        ends = array('i', range(1, len(objects) + 1))
+        for index in range(len(objects) - 1, 0, -1):
+            parent = parents[index]
+            if ends[index] > ends[parent]:
+                ends[parent] = ends[index]
+
+        self.objects = tuple(objects)
+        self.types = tuple(types)
+        self.type_codes = readonly(type_codes)
+        self.parents = readonly(parents)
+        self.depths = readonly(depths)
+        self.ends = readonly(ends)
+        self.url_name_table = tuple(url_name_table)
+        self.url_name_ids = readonly(url_name_ids)
+        self.display_name_table = tuple(display_name_table)
+        self.display_name_ids = readonly(display_name_ids)
+        self._url_names = first
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __repr__(self):
+        return f"<CourseIndex of {len(self)} objects>"
+
+    def type_code(self, tag):
+        """Returns the code for the given tag, or -1 if there are no objects with that tag"""
+        try:
+            return self.types.index(tag)
+        except ValueError:
+            return -1
+
+    def url_name(self, index):
+        """Returns the url_name of object index (or None)"""
+        entry = self.url_name_ids[index]
+        return None if entry < 0 else self.url_name_table[entry]
+
+    def display_name(self, index):
+        """Returns the display_name of object index (or None)"""
+        entry = self.display_name_ids[index]
+        return None if entry < 0 else self.display_name_table[entry]
+
+    def lookup(self, url_name):
+        """Returns the index of the first object with the given url_name (or -1)"""
+        return self._url_names.get(url_name, -1)
+
+    def subtree(self, index):
+        """Returns the range of indices of an object and its descendants"""
+        return range(index, self.ends[index])
+
+    def children(self, index):
+        """Returns the indices of the children of an object"""
+        result = []
+        child = index + 1
+        end = self.ends[index]
+        while child < end:
+            result.append(child)
+            child = self.ends[child]
+        return result
+
+    def find(self, tag, within=0):
+        """
+        Returns the indices of all objects with the given tag in the subtree of an object
+
+        :param tag: Tag to search for
+        :param within: Index of the object to search under (default: the root)
+        :return: List of indices
+        """
+        code = self.type_code(tag)
+        if code < 0 or not self.objects:
+            return []
+        start, end = within, self.ends[within]
+        codes = self.type_codes[start:end]
+        return [start + offset for offset, value in enumerate(codes) if value == code]
+
+    def count_types(self, within=0):
+        """
+        Counts the objects of each type in the subtree of an object
+
+        :param within: Index of the object to count under (default: the root)
+        :return: Counter of {tag: count}
+        """
+        if not self.objects:
+            return Counter()
+        counts = Counter(self.type_codes[within:self.ends[within]])
+        return Counter({self.types[code]: count for code, count in counts.items()})
+
+def intern_string(value, table, lookup):
+    """Returns the index of a string in a string table, adding it if necessary (-1 for None)"""
+    if value is None:
+        return -1
+    entry = lookup.get(value)
+    if entry is None:
+        entry = lookup[value] = len(table)
+        table.append(value)
+    return entry
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+archive.py
+
+Reads a course directly from a .tar.gz or .zip export, without extracting it
+"""
+import io
+import posixpath
+import tarfile
+import zipfile
+import threading
+from olxcleaner.loader.source import IndexedSource
+
+# Extensions of archives that courses can be loaded from
+ARCHIVE_EXTENSIONS = ('.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz', '.tar', '.zip')
+
+# Files with these extensions are read into memory when the archive is indexed
+CONTENT_EXTENSIONS = ('.xml', '.html', '.json')
+
+def is_archive(filename):
+    """Returns True if the filename looks like a course archive"""
+    return isinstance(filename, str) and filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+class ArchiveSource(IndexedSource):
+    """
+    Reads a course from an archive, indexed by a single pass through the archive.
+
+    Studio exports wrap the course in a top-level directory; the course root is taken to be
+    the shallowest directory containing a course.xml file. The contents of XML, HTML and JSON
+    files outside the static directory are held in memory, so that the course can be loaded
+    without touching the disk again. Other files (e.g., static assets) are only listed, and
+    are read from the archive on demand. The size of every file is recorded in the index.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Path of the .tar.gz, .tar or .zip archive
+        """
+        super().__init__()
+        self.path = path
+        self.root = ""
+        self.members = {}
+        self.sizes = {}
+        self.contents = {}
+        self.lock = threading.Lock()
+        self._scan()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _scan(self):
+        """Index the members of the archive, reading the contents of course files"""
+        members, sizes, contents = {}, {}, {}
+        for name, size, data in self._members():
+            path = self.normalize(name.lstrip("/"))
+            if path is None or path == ".":
+                continue
+            members[path] = name
+            sizes[path] = size
+            if data is not None:
+                contents[path] = data
+
+        # Locate the course root
+        roots = [posixpath.dirname(path) for path in members if posixpath.basename(path) == "course.xml"]
+        if roots:
+            self.root = min(roots, key=lambda root: (root.count("/") if root else -1, root))
+        prefix = self.root + "/" if self.root else ""
+
+        # Index everything relative to the course root
+        for path, name in members.items():
+            if not path.startswith(prefix):
+                continue
+            relpath = path[len(prefix):]
+            if any(part.startswith(".") for part in relpath.split("/")[:-1]):
+                # Hidden directories are not part of the course
+                continue
+            self.members[relpath] = name
+            self.sizes[relpath] = sizes[path]
+            if path in contents:
+                self.contents[relpath] = contents[path]
+            self.add_file(relpath)
+
+    def _members(self):
+        """Generates (name, size, contents) for each regular file in the archive, in a single pass"""
+        if zipfile.is_zipfile(self.path):
+            with zipfile.ZipFile(self.path) as archive:
+                for info in archive.infolist():
+                    if info.is_dir():
+                        continue
+                    yield (info.filename, info.file_size,
+                           archive.read(info) if self._wanted(info.filename) else None)
+        else:
+            # Stream through the archive, as compressed tar files can't be read out of order efficiently
+            with tarfile.open(self.path, 'r|*') as archive:
+                for info in archive:
+                    if not info.isfile():
+                        continue
+                    yield info.name, info.size, archive.extractfile(info).read() if self._wanted(info.name) else None
+
+    @staticmethod
+    def _wanted(name):
+        """Returns True if a member should be read into memory when indexing"""
+        return name.lower().endswith(CONTENT_EXTENSIONS) and "static" not in name.split("/")[:-1]
+
+    def read_bytes(self, filename):
+        """
+        Returns the contents of a file in the course.
+
+        :param filename: Path relative to the course root
+        :return: Contents of the file (bytes)
+        :raises FileNotFoundError: If the file is not in the course
+        """
+        path = self.normalize(filename)
+        if path in self.contents:
+            return self.contents[path]
+        if path not in self.members:
+            raise FileNotFoundError(f"{filename} not found in {self.path}")
+        name = self.members[path]
+        with self.lock:
+            if zipfile.is_zipfile(self.path):
+                with zipfile.ZipFile(self.path) as archive:
+                    return archive.read(name)
+            with tarfile.open(self.path, 'r:*') as archive:
+                return archive.extractfile(name).read()
+
+    def size(self, filename):
+        """
+        Returns the size of a file in the course, in bytes, from the index.
+
+        :param filename: Path relative to the course root
+        :return: Size of the file
+        :raises FileNotFoundError: If the file is not in the course
+        """
+        path = self.normalize(filename)
+        if path not in self.sizes:
+            raise FileNotFoundError(f"{filename} not found in {self.path}")
+        return self.sizes[path]
+
+    def open_files(self, filenames):
+        """
+        Opens each of the given files in turn, in a single pass through the archive (in the order
+        of the archive, rather than of filenames). Files that aren't in the course are skipped.
+
+        :param filenames: Iterable of paths relative to the course root
+        :return: Generator of (filename, binary file object) pairs
+        """
+        wanted = {}
+        for filename in filenames:
+            path = self.normalize(filename)
+            if path in self.contents:
+                yield filename, io.BytesIO(self.contents[path])
+            elif path in self.members:
+                wanted[self.members[path]] = filename
+        if not wanted:
+            return
+        if zipfile.is_zipfile(self.path):
+            with zipfile.ZipFile(self.path) as archive:
+                for info in archive.infolist():
+                    if info.filename in wanted:
+                        with archive.open(info) as f:
+                            yield wanted.pop(info.filename), f
+                        if not wanted:
+                            break
+        else:
+            with tarfile.open(self.path, 'r|*') as archive:
+                for info in archive:
+                    if info.name in wanted:
+                        yield wanted.pop(info.name), archive.extractfile(info)
+                        if not wanted:
+                            break
+
+    def fullpath(self, filename):
+        """Returns a path describing the location of a file in the archive"""
+        return posixpath.join(self.path, self.root, filename) if self.root else posixpath.join(self.path, filename)
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+cache.py
+
+A persistent on-disk cache of file parsing results
+"""
+import os
+import pickle
+import hashlib
+import tempfile
+import threading
+from lxml import etree
+from lxml.etree import XMLSyntaxError
+from olxcleaner.loader.xml import parse_data
+
+class ParseCache(object):
+    """
+    Stores the result of parsing each course HTML file in a cache directory.
+
+    Only HTML files of at least min_size bytes are cached. A cached file is restored using
+    the XML parser, which is several times faster than the HTML parser, and this saving only
+    outweighs the cost of looking up and reading the entry for files of a few KB or more.
+    XML files are always parsed directly, as restoring them would take as long as parsing them.
+
+    Entries are keyed by the signature that the CourseSource gives for the file (for files
+    on disk, their absolute path, size and modification time), or (in strict mode, or if the
+    source gives no signature) by a hash of the file contents. Each entry holds either the
+    XML for the parsed file, or the syntax error that parsing the file produced, so that
+    broken files need not be parsed again.
+
+    The cache is kept below max_size bytes by evicting the least recently used entries.
+    """
+
+    def __init__(self, directory, strict=False, max_size=256 * 1024 * 1024, min_size=4096):
+        """
+        :param directory: Directory to store cache entries in (created if necessary)
+        :param strict: Key entries by file contents rather than by file size and modification time
+        :param max_size: Maximum total size of the cache entries, in bytes
+        :param min_size: Size of the smallest HTML file to cache, in bytes
+        """
+        self.directory = directory
+        self.strict = strict
+        self.max_size = max_size
+        self.min_size = min_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def parse(self, source, filename, kind):
+        """
+        Parse a file, using the cached result if there is one.
+
+        :param source: CourseSource to read the file from
+        :param filename: Name of the file to parse
+        :param kind: 'xml' or 'html'
+        :return: The root lxml element of the file
+        :raises XMLSyntaxError: If the file could not be parsed
+        """
+        if kind != 'html' or source.size(filename) < self.min_size:
+            return parse_data(source.read_bytes(filename), kind)
+
+        data = None
+        signature = None if self.strict else source.signature(filename)
+        if signature is None:
+            data = source.read_bytes(filename)
+            key = f"{kind}:{hashlib.sha256(data).hexdigest()}"
+        else:
+            key = f"{kind}:{signature}"
+        entry_path = os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+        entry = self._read_entry(entry_path)
+        if entry is not None:
+            self._count('hits')
+            status, payload = entry
+            if status == 'error':
+                raise XMLSyntaxError(*payload)
+            if status == 'parse':
+                return parse_data(source.read_bytes(filename), kind)
+            return etree.fromstring(payload)
+
+        self._count('misses')
+        if data is None:
+            data = source.read_bytes(filename)
+        try:
+            node = parse_data(data, kind)
+        except XMLSyntaxError as e:
+            self._write_entry(entry_path, ('error', (e.args[0], e.code) + tuple(e.position)))
+            raise
+        self._write_entry(entry_path, self._serialize(node))
+        return node
+
+    @staticmethod
+    def _serialize(node):
+        """Construct the cache entry for a successfully parsed HTML file"""
+        # Store the file as XML, provided that the XML parser will reconstruct the same tree
+        # (namespace declarations and prefixes can change its meaning)
+        serialized = etree.tostring(node)
+        if b'xmlns' not in serialized:
+            try:
+                etree.fromstring(serialized)
+                return 'ok', serialized
+            except XMLSyntaxError:
+                pass
+        # Otherwise, record that the file must be parsed as usual
+        return 'parse', None
+
+    def _count(self, name):
+        """Increment a statistics counter"""
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @staticmethod
+    def _read_entry(entry_path):
+        """Read an entry from the cache, marking it as recently used. Returns None if not present."""
+        try:
+            with open(entry_path, 'rb') as f:
+                entry = pickle.load(f)
+            os.utime(entry_path)
+            return entry
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+
+    def _write_entry(self, entry_path, entry):
+        """Atomically write an entry to the cache"""
+        try:
+            fd, tmppath = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmppath, entry_path)
+        except OSError:  # pragma: no cover
+            pass
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits within max_size"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:  # pragma: no cover
+                continue
+            total -= size
+            self.evictions += 1
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+features.py
+
+Summaries of the content of content objects, so that the content itself need not be kept in memory
+"""
+from lxml import etree
+
+from olxcleaner.utils import scan_links, script_types
+
+class ContentFeatures(object):
+    """
+    The facts about the content of an object that are used after the course has been loaded:
+
+      * links: Internal links in the content, in the order that find_links reports them
+      * link_lines: Line number of the element containing each link (see find_links)
+      * tags: Set of tags used inside the content (not including the tag itself)
+      * scripts: List of script languages used in the content
+      * has_solution: Whether the content contains a <solution> tag
+      * size: Size of the content when serialized, in bytes
+    """
+
+    __slots__ = ('links', 'link_lines', 'tags', 'scripts', 'size')
+
+    def __init__(self, links, tags, scripts, size, link_lines=None):
+        self.links = links
+        self.link_lines = link_lines if link_lines is not None else [None] * len(links)
+        self.tags = tags
+        self.scripts = scripts
+        self.size = size
+
+    @property
+    def has_solution(self):
+        """Returns True if the content contains a solution"""
+        return 'solution' in self.tags
+
+    @classmethod
+    def extract(cls, node):
+        """
+        Scan an lxml element once for its features.
+
+        :param node: The content element
+        :return: ContentFeatures object
+        """
+        tags = frozenset(element.tag for element in node.iterdescendants() if isinstance(element.tag, str))
+        scripts = script_types(node) if 'script' in tags else []
+        links = scan_links(node, lines=True)
+        return cls([link for link, _ in links], tags, scripts, len(etree.tostring(node)),
+                   [line for _, line in links])
+
+    def __repr__(self):
+        return f"<ContentFeatures {len(self.tags)} tags, {len(self.links)} links, {self.size} bytes>"
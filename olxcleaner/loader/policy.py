@@ -5,8 +5,8 @@ policyloader.py
 Routines to load the policy files of an edX course
 """
 import os
-from os.path import isfile
 import json
+from olxcleaner.loader.source import FileSystemSource
 from olxcleaner.loader.policy_exceptions import (
     NoRunName,
     PolicyNotFound,
@@ -33,7 +33,7 @@ def load_policy(directory, course, errorstore):
     Loads the policy file for a course. If loading fails, empty
     dictionaries are returned.
 
-    :param directory: Path for course.xml (or equivalent)
+    :param directory: Path for course.xml (or equivalent). Ignored if the course has a source.
     :param course: EdxCourse object from parsed course
     :param errorstore: ErrorStore object to store errors
     :return: policy, grading_policy objects
@@ -49,32 +49,30 @@ def load_policy(directory, course, errorstore):
     gradingfile = os.path.join("policies", runname, "grading_policy.json")
 
     # Load the policy files
-    policy = load_json(directory, policyfile, errorstore)
-    grading_policy = load_json(directory, gradingfile, errorstore)
+    source = course.source if course.source is not None else FileSystemSource(directory)
+    policy = load_json(source, policyfile, errorstore)
+    grading_policy = load_json(source, gradingfile, errorstore)
     if not grading_policy:
         grading_policy = default_grading_policy
 
     # Return the results
     return policy, grading_policy
 
-def load_json(directory, filename, errorstore):
+def load_json(source, filename, errorstore):
     """
     Load json from a file, storing any loading errors in the errorstore
 
-    :param directory: Course directory
+    :param source: CourseSource to read the file from
     :param filename: File to load
     :param errorstore: ErrorStore object to store errors
     :return: Contents of json file
     """
-    fullfile = os.path.join(directory, filename)
-
-    if not isfile(fullfile):
+    if not source.exists(filename):
         errorstore.add_error(PolicyNotFound(filename))
         return {}
 
     try:
-        with open(fullfile) as f:
-            return json.load(f)
+        return json.loads(source.read_bytes(filename).decode())
     except json.decoder.JSONDecodeError as err:
         errorstore.add_error(BadPolicy(filename, msg=str(err)))
         return {}
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+prefetch.py
+
+A bounded thread pool that loads course files ahead of the loader
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class Prefetcher(object):
+    """
+    Loads files on a pool of worker threads ahead of when they are needed.
+
+    Files are identified by keys. The load function is called as load(key, prefetcher),
+    and may submit further keys (e.g., the targets of pointer tags it has found).
+    Results (and exceptions) are handed back to the caller of get() exactly as if
+    load had been called directly, so the order in which files are consumed is
+    unchanged. Each key is loaded in the background at most once; asking for a
+    key a second time loads it again in the calling thread.
+    """
+
+    def __init__(self, load, workers):
+        """
+        :param load: Function to load a key, called as load(key, prefetcher)
+        :param workers: Number of worker threads
+        """
+        self.load = load
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = {}
+        self.submitted = set()
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def submit(self, key):
+        """Queue a key to be loaded in the background"""
+        with self.lock:
+            if self.closed or key in self.submitted:
+                return
+            self.submitted.add(key)
+            self.futures[key] = self.executor.submit(self.load, key, self)
+
+    def get(self, key):
+        """Return the result of loading a key, waiting on the background load if there is one"""
+        with self.lock:
+            future = self.futures.pop(key, None)
+            if future is None:
+                # Make sure we don't start a background load that will never be collected
+                self.submitted.add(key)
+        if future is None:
+            return self.load(key, self)
+        return future.result()
+
+    def close(self):
+        """Cancel any outstanding loads and shut down the worker threads"""
+        with self.lock:
+            self.closed = True
+            futures = list(self.futures.values())
+            self.futures.clear()
+        for future in futures:
+            future.cancel()
+        self.executor.shutdown(wait=True)
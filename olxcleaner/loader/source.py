@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+source.py
+
+Sources that course files are read from (a directory on disk, or files held in memory)
+"""
+import io
+import os
+import posixpath
+from abc import ABC, abstractmethod
+
+class CourseSource(ABC):
+    """
+    Abstract base class for the location of a course's files. All reading of course files goes through a source.
+
+    Filenames are relative to the root of the course and use '/' as a separator.
+    """
+
+    @abstractmethod
+    def exists(self, filename):  # pragma: no cover
+        """
+        Returns True if the given file exists in the course.
+
+        :param filename: Path relative to the course root
+        :return: True/False
+        """
+
+    @abstractmethod
+    def read_bytes(self, filename):  # pragma: no cover
+        """
+        Returns the contents of a file in the course.
+
+        :param filename: Path relative to the course root
+        :return: Contents of the file (bytes)
+        :raises OSError: If the file cannot be read
+        """
+
+    @abstractmethod
+    def listdir(self, dirname=""):  # pragma: no cover
+        """
+        Lists the files and subdirectories of a directory in the course.
+
+        :param dirname: Path of the directory relative to the course root ("" for the root)
+        :return: Sorted list of names in the directory (empty if the directory does not exist)
+        """
+
+    def isfile(self, filename):
+        """Synonym for exists"""
+        return self.exists(filename)
+
+    def size(self, filename):
+        """
+        Returns the size of a file in the course, in bytes.
+
+        :param filename: Path relative to the course root
+        :return: Size of the file
+        :raises OSError: If the file cannot be read
+        """
+        return len(self.read_bytes(filename))
+
+    def open_files(self, filenames):
+        """
+        Opens each of the given files in turn, in whichever order they can be read most efficiently.
+        Each file must be read before moving on to the next.
+
+        :param filenames: Iterable of paths relative to the course root
+        :return: Generator of (filename, binary file object) pairs
+        """
+        for filename in filenames:
+            yield filename, io.BytesIO(self.read_bytes(filename))
+
+    def fullpath(self, filename):
+        """Returns a description of the location of a file, for reporting"""
+        return filename
+
+    def signature(self, filename):
+        """
+        Returns a string that changes whenever the given file changes, for use when caching
+        the results of parsing the file, or None if the file contents must be compared instead.
+        """
+        return None
+
+    @staticmethod
+    def normalize(filename):
+        """
+        Normalize a path relative to the course root.
+        Returns None if the path does not lie inside the course.
+        """
+        if os.sep != "/":  # pragma: no cover
+            filename = filename.replace(os.sep, "/")
+        if filename.startswith("/"):
+            return None
+        path = posixpath.normpath(filename)
+        if path == ".." or path.startswith("../"):
+            return None
+        return path
+
+class IndexedSource(CourseSource):
+    """
+    A source whose files and directories are listed in sets, so that existence checks and
+    directory listings are set lookups. Subclasses fill in the files and directories.
+    """
+
+    def __init__(self):
+        self.files = set()
+        self.directories = set()
+
+    def add_file(self, path):
+        """Record a (normalized) file, along with the directories containing it"""
+        self.files.add(path)
+        parts = path.split("/")
+        for i in range(1, len(parts)):
+            self.directories.add("/".join(parts[:i]))
+
+    def exists(self, filename):
+        """
+        Returns True if the given file exists in the course.
+
+        :param filename: Path relative to the course root
+        :return: True/False
+        """
+        return self.normalize(filename) in self.files
+
+    def listdir(self, dirname=""):
+        """
+        Lists the files and subdirectories of a directory in the course.
+
+        :param dirname: Path of the directory relative to the course root ("" for the root)
+        :return: Sorted list of names in the directory (empty if the directory does not exist)
+        """
+        path = self.normalize(dirname) if dirname else "."
+        if path is None:
+            return []
+        prefix = "" if path == "." else path + "/"
+        names = set()
+        for entry in self.files | self.directories:
+            if entry.startswith(prefix) and "/" not in entry[len(prefix):]:
+                names.add(entry[len(prefix):])
+        return sorted(names)
+
+class FileSystemSource(IndexedSource):
+    """
+    Reads a course from a directory on disk.
+
+    The directory is scanned once when the source is constructed, so that existence checks
+    and directory listings don't touch the filesystem. Hidden directories (e.g., .git)
+    are not scanned.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: The course directory
+        """
+        super().__init__()
+        self.directory = directory
+        self._scan()
+
+    def _scan(self):
+        """Walk the course directory, recording all files and directories"""
+        visited = {os.path.realpath(self.directory)}
+        work = [(self.directory, "")]
+        while work:
+            path, prefix = work.pop()
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                continue
+            for entry in entries:
+                relpath = prefix + entry.name
+                try:
+                    if entry.is_dir():
+                        if entry.name.startswith("."):
+                            continue
+                        if entry.is_symlink():
+                            # Guard against symlink loops
+                            realpath = os.path.realpath(entry.path)
+                            if realpath in visited:
+                                continue
+                            visited.add(realpath)
+                        self.directories.add(relpath)
+                        work.append((entry.path, relpath + "/"))
+                    elif entry.is_file():
+                        self.files.add(relpath)
+                except OSError:
+                    continue
+
+    def exists(self, filename):
+        """
+        Returns True if the given file exists in the course directory.
+
+        :param filename: Path relative to the course directory
+        :return: True/False
+        """
+        path = self.normalize(filename)
+        if path is None:
+            # Not something we've scanned; ask the filesystem
+            return os.path.isfile(os.path.join(self.directory, filename))
+        return path in self.files
+
+    def read_bytes(self, filename):
+        """
+        Returns the contents of a file in the course directory.
+
+        :param filename: Path relative to the course directory
+        :return: Contents of the file (bytes)
+        """
+        with open(os.path.join(self.directory, filename), 'rb') as f:
+            return f.read()
+
+    def size(self, filename):
+        """Returns the size of a file in the course directory, in bytes"""
+        return os.path.getsize(os.path.join(self.directory, filename))
+
+    def open_files(self, filenames):
+        """Opens each of the given files in the course directory in turn"""
+        for filename in filenames:
+            with open(os.path.join(self.directory, filename), 'rb') as f:
+                yield filename, f
+
+    def fullpath(self, filename):
+        """Returns the path of a file in the course directory"""
+        return os.path.join(self.directory, filename)
+
+    def signature(self, filename):
+        """Identifies a version of a file by its absolute path, size and modification time"""
+        fullpath = os.path.join(self.directory, filename)
+        stat = os.stat(fullpath)
+        return f"{os.path.abspath(fullpath)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+class MemorySource(IndexedSource):
+    """
+    Reads a course from a dictionary of {filename: contents} held in memory.
+    Contents may be bytes or str (which is encoded as UTF-8). Reading the course
+    makes no filesystem calls.
+    """
+
+    def __init__(self, files):
+        """
+        :param files: Dictionary of {filename: contents}, with filenames relative to the course root
+        """
+        super().__init__()
+        self.contents = {}
+        for filename, contents in files.items():
+            path = self.normalize(filename)
+            if path is None or path == ".":
+                raise ValueError(f"Invalid filename for course file: {filename}")
+            if isinstance(contents, str):
+                contents = contents.encode()
+            self.contents[path] = contents
+            self.add_file(path)
+
+    def read_bytes(self, filename):
+        """
+        Returns the contents of a file in the course.
+
+        :param filename: Path relative to the course root
+        :return: Contents of the file (bytes)
+        :raises FileNotFoundError: If the file is not in the course
+        """
+        path = self.normalize(filename)
+        if path not in self.contents:
+            raise FileNotFoundError(f"{filename} not found in course")
+        return self.contents[path]
@@ -4,12 +4,16 @@ xml.py
 
 Routines to load the XML of an edX course into a structure
 """
-import os
-from os.path import isfile
+from sys import intern
 from lxml import etree
 from lxml.etree import XMLSyntaxError
 
 from olxcleaner.objects import EdxObject
+from olxcleaner.exceptions import CourseError
+from olxcleaner.errorstore import ValidationAborted
+from olxcleaner.loader.prefetch import Prefetcher
+from olxcleaner.loader.features import ContentFeatures
+from olxcleaner.loader.source import FileSystemSource
 from olxcleaner.loader.xml_exceptions import (
     CourseXMLDoesNotExist,
     InvalidXML,
@@ -30,18 +34,28 @@ from olxcleaner.loader.xml_exceptions import (
     DuplicateHTMLName
 )
 
-def load_course(directory, filename, errorstore):
+def load_course(directory, filename, errorstore, workers=None, cache=None, source=None, lazy=False,
+                features=False):
     """
     Loads a course, given a filename for the appropriate course.xml file.
 
-    :param directory: Path for course.xml (or equivalent)
+    :param directory: Path for course.xml (or equivalent). Ignored if source is given.
     :param filename: Filename for course.xml (or equivalent)
     :param errorstore: ErrorStore object to store errors
+    :param workers: Number of threads to use to read and parse files ahead of time (None or 1 = serial)
+    :param cache: ParseCache object to obtain parsed files from (optional)
+    :param source: CourseSource object to read the course from (optional; defaults to a FileSystemSource for directory)
+    :param lazy: If True, the content of content objects is not kept, but is parsed again when first accessed
+    :param features: If True, the features of the content of content objects are extracted as it is read
     :return: EdxCourse object, or None on failure
     """
+    # Scan the course directory once, so that we don't need to check for files individually
+    if source is None:
+        source = FileSystemSource(directory)
+
     # Ensure the file exists
-    fullpath = os.path.join(directory, filename)
-    if not isfile(fullpath):
+    fullpath = source.fullpath(filename)
+    if not source.exists(filename):
         errorstore.add_error(CourseXMLDoesNotExist(fullpath))
         return
 
@@ -51,7 +65,7 @@ def load_course(directory, filename, errorstore):
 
     # Obtain the XML for the course.xml file
     try:
-        tree = etree.parse(fullpath)
+        root = parse_data(source.read_bytes(filename), 'xml')
     except XMLSyntaxError as e:
         errorstore.add_error(InvalidXML(filename, error=e.args[0]))
         return
@@ -60,35 +74,202 @@ def load_course(directory, filename, errorstore):
     course = EdxObject.get_object('course')
 
     # Load the course!
-    read_course(course, tree.getroot(), directory, filename, errorstore, {})
+    try:
+        if workers and workers > 1:
+            prefetcher = Prefetcher(lambda key, pf: read_file(source, key, pf, cache), workers)
+            try:
+                for key in find_pointer_targets(root):
+                    prefetcher.submit(key)
+                read_course(course, root, source, filename, errorstore, {}, prefetcher=prefetcher, cache=cache,
+                            lazy=lazy, features=features)
+            finally:
+                prefetcher.close()
+        else:
+            read_course(course, root, source, filename, errorstore, {}, cache=cache, lazy=lazy, features=features)
+    except ValidationAborted:
+        # Stop loading, but keep the part of the course that has been loaded (errorstore.truncated is set)
+        pass
 
-    # Save the course directory and full path in the course object
-    course.savedir(directory, fullpath)
+    # Save the course directory, full path and source in the course object
+    course.savedir(directory, fullpath, source)
+    course.parse_cache = cache
 
     return course
 
-def read_course(edxobj, node, directory, filename, errorstore, htmlfiles, pointer=False):
+def read_file(source, key, prefetcher=None, cache=None):
+    """
+    Reads and parses a file that is the target of a pointer.
+
+    :param source: The CourseSource to read the file from
+    :param key: Tuple (kind, filename), where kind is 'xml' or 'html'
+    :param prefetcher: If present, the targets of any pointers in the file are submitted to this Prefetcher
+    :param cache: If present, the ParseCache to obtain the parsed file from
+    :return: The root lxml element of the file
+    """
+    kind, filename = key
+    if cache is not None:
+        node = cache.parse(source, filename, kind)
+    else:
+        node = parse_data(source.read_bytes(filename), kind)
+
+    if prefetcher is not None and kind == 'xml':
+        for target in find_pointer_targets(node, pointer=True):
+            prefetcher.submit(target)
+    return node
+
+def parse_data(data, kind):
+    """
+    Parses the contents of an XML or HTML file.
+
+    :param data: Contents of the file (bytes)
+    :param kind: 'xml' or 'html'
+    :return: The root lxml element of the file
+    """
+    if kind == 'html':
+        return etree.fromstring(data.decode(), etree.HTMLParser(recover=False))
+    return etree.fromstring(data)
+
+class ContentReference(object):
+    """
+    Records where the content of a content object was found, so that it can be parsed
+    again on demand rather than being held in memory.
+    """
+
+    __slots__ = ('source', 'filename', 'kind', 'path')
+
+    def __init__(self, source, filename, kind, path=None):
+        """
+        :param source: The CourseSource that the course was read from
+        :param filename: The file containing the content
+        :param kind: 'xml' or 'html'
+        :param path: XPath of the content element within the file (None for the root element)
+        """
+        self.source = source
+        self.filename = filename
+        self.kind = kind
+        self.path = path
+
+    def load(self):
+        """Parses the file and returns the content element"""
+        node = parse_data(self.source.read_bytes(self.filename), self.kind)
+        if self.path is None:
+            return node
+        return node.getroottree().xpath(self.path)[0]
+
+    def __repr__(self):
+        path = "" if self.path is None else f" {self.path}"
+        return f"<ContentReference {self.kind}:{self.filename}{path}>"
+
+def fetch_file(source, key, prefetcher, cache):
+    """Reads a file, using the prefetched version if available"""
+    if prefetcher is None:
+        return read_file(source, key, cache=cache)
+    return prefetcher.get(key)
+
+def find_pointer_targets(node, pointer=False):
+    """
+    Finds the files that read_course will need to read when it processes the given node.
+    This mirrors the pointer-following logic of read_course, but reports no errors.
+
+    :param node: An lxml element
+    :param pointer: True if the element was the target of a pointer tag
+    :return: List of (kind, filename) tuples, in document order
+    """
+    targets = []
+    stack = [(node, pointer)]
+    while stack:
+        node, pointer = stack.pop()
+        try:
+            edxobj = EdxObject.get_object(node.tag)
+        except ValueError:
+            continue
+        empty = is_empty(node)
+        if empty and edxobj.is_pointer(node.attrib):
+            if not pointer:
+                url_name = node.attrib['url_name'].replace(":", "/")
+                targets.append(('xml', edxobj.type + "/" + url_name + ".xml"))
+        elif empty and node.tag == "html" and "filename" in node.attrib:
+            targets.append(('html', "html/" + node.attrib['filename'].replace(":", "/") + ".html"))
+        elif not edxobj.content_store:
+            allowed = edxobj.allowed_children
+            stack.extend((child, False) for child in reversed(node) if child.tag in allowed)
+    return targets
+
+def is_empty(node):
+    """Returns True if the lxml element contains only attributes and comments"""
+    for child in node:
+        if child.tag is not etree.Comment:
+            return False
+    # Check for text
+    if node.text is not None and node.text.strip() != '':
+        return False
+    # No text, but make sure that the comment children also have no text!
+    for child in node:
+        if child.tail and child.tail.strip():
+            return False
+    return True
+
+def read_course(edxobj, node, source, filename, errorstore, htmlfiles, pointer=False, prefetcher=None, cache=None,
+                lazy=False, features=False):
     """
     Takes in the current EdxObject, the current lxml element, and the
     current filename. Reads from the element into the object, creating
-    any children for that object, and recursing into them.
+    any children for that object, and reading into them.
+
+    Nodes are processed in document order using an explicit stack, rather than recursion.
 
     :param edxobj: The current EdxObject
     :param node: The current lxml element
-    :param directory: The course directory
+    :param source: The CourseSource that the course is being read from
     :param filename: The current filename
     :param errorstore: An ErrorStore object that is collecting errors
     :param htmlfiles: A dictionary of XML filenames (value) that reference a given HTML filename (key)
     :param pointer: True if we've arrived at this node due to a pointer tag
+    :param prefetcher: Prefetcher object that is loading files in the background (or None)
+    :param cache: ParseCache object to obtain parsed files from (or None)
+    :param lazy: If True, store references to the content of content objects rather than the content itself
+    :param features: If True, extract the features of the content of content objects
     :return: None
     """
+    stack = [(edxobj, node, filename, pointer)]
+    while stack:
+        entry = stack.pop()
+        if isinstance(entry, CourseError):
+            # An error that had to wait until the preceding children were read
+            errorstore.add_error(entry)
+            continue
+        edxobj, node, filename, pointer = entry
+        work = read_node(edxobj, node, source, filename, errorstore, htmlfiles, pointer, prefetcher, cache,
+                         lazy, features)
+        stack.extend(reversed(work))
+
+def read_node(edxobj, node, source, filename, errorstore, htmlfiles, pointer, prefetcher, cache, lazy=False,
+              features=False):
+    """
+    Reads from the current lxml element into the current EdxObject, creating
+    any children for that object. Does not read into the children, but instead
+    returns a list of further work to do, which must be performed in order.
+
+    :param edxobj: The current EdxObject
+    :param node: The current lxml element
+    :param source: The CourseSource that the course is being read from
+    :param filename: The current filename
+    :param errorstore: An ErrorStore object that is collecting errors
+    :param htmlfiles: A dictionary of XML filenames (value) that reference a given HTML filename (key)
+    :param pointer: True if we've arrived at this node due to a pointer tag
+    :param prefetcher: Prefetcher object that is loading files in the background (or None)
+    :param cache: ParseCache object to obtain parsed files from (or None)
+    :param lazy: If True, store references to the content of content objects rather than the content itself
+    :param features: If True, extract the features of the content of content objects
+    :return: List of (edxobj, node, filename, pointer) tuples to read, and CourseErrors to report
+    """
     # Make sure that the node matches the edxobj type
     if edxobj.type != node.tag:
         errorstore.add_error(TagMismatch(filename,
                                          tag1=edxobj.type,
                                          tag2=node.tag))
         edxobj.broken = True
-        return
+        return []
 
     # Start by copying the attributes from the node into the object
     edxobj.add_attribs(node.attrib)
@@ -96,20 +277,7 @@ def read_course(edxobj, node, directory, filename, errorstore, htmlfiles, pointe
     edxobj.add_filename(filename)
 
     # Is the tag an empty tag? (contains only attributes and comments)
-    nodelen = len(node)
-    for child in node:
-        if child.tag is etree.Comment:
-            # We need to remove comment nodes from the length count
-            nodelen -= 1
-    empty = False
-    if nodelen == 0:
-        # Check for text
-        if node.text is None or node.text.strip() == '':
-            empty = True
-            # No text, but make sure that the comment children also have no text!
-            for child in node:
-                if child.tail and child.tail.strip():
-                    empty = False
+    empty = is_empty(node)
 
     # Check for a pointer tag
     if empty and edxobj.is_pointer(node.attrib):
@@ -119,7 +287,7 @@ def read_course(edxobj, node, directory, filename, errorstore, htmlfiles, pointe
             errorstore.add_error(SelfPointer(filename,
                                              edxobj=edxobj))
             edxobj.broken = True
-            return
+            return []
 
         # We have a valid pointer tag
         url_name = edxobj.attributes['url_name']
@@ -129,22 +297,22 @@ def read_course(edxobj, node, directory, filename, errorstore, htmlfiles, pointe
         new_file = edxobj.type + "/" + url_name + ".xml"
 
         # Ensure the file exists
-        if not isfile(os.path.join(directory, new_file)):
+        if not source.exists(new_file):
             errorstore.add_error(FileDoesNotExist(filename,
                                                   edxobj=edxobj,
                                                   new_file=new_file))
             edxobj.broken = True
-            return
+            return []
 
         try:
-            new_node = etree.parse(os.path.join(directory, new_file)).getroot()
+            new_node = fetch_file(source, ('xml', new_file), prefetcher, cache)
         except XMLSyntaxError as e:
             errorstore.add_error(InvalidXML(new_file, error=e.args[0]))
             edxobj.broken = True
-            return
+            return []
         else:
-            read_course(edxobj, new_node, directory, new_file, errorstore, htmlfiles, pointer=True)
-            return
+            # Read the target of the pointer into this same object
+            return [(edxobj, new_node, new_file, True)]
 
     # Special case: HTML files can point to an actual HTML file with their 'filename' attribute
     if node.tag == "html" and "filename" in edxobj.attributes:
@@ -158,28 +326,25 @@ def read_course(edxobj, node, directory, filename, errorstore, htmlfiles, pointe
 
         # If not empty, then it could be a PossibleHTMLPointer error
         if not empty:
-            if isfile(os.path.join(directory, new_file)):
+            if source.exists(new_file):
                 errorstore.add_error(PossibleHTMLPointer(filename,
                                                          edxobj=edxobj,
                                                          new_file=new_file))
         else:
             # We are empty, so this is a good pointer
             # Ensure the file exists
-            if not isfile(os.path.join(directory, new_file)):
+            if not source.exists(new_file):
                 errorstore.add_error(FileDoesNotExist(filename,
                                                       edxobj=edxobj,
                                                       new_file=new_file))
-                return
+                return []
 
             try:
-                with open(os.path.join(directory, new_file)) as f:
-                    html = f.read()
-                parser = etree.HTMLParser(recover=False)
-                content = etree.fromstring(html, parser)
+                content = fetch_file(source, ('html', new_file), prefetcher, cache)
             except Exception as e:
                 errorstore.add_error(InvalidHTML(new_file, error=e.args[0]))
                 edxobj.broken = True
-                return
+                return []
             else:
                 if new_filename in htmlfiles:
                     errorstore.add_error(DuplicateHTMLName(filename,
@@ -187,9 +352,14 @@ def read_course(edxobj, node, directory, filename, errorstore, htmlfiles, pointe
                                                            htmlfilename=new_file))
                 else:
                     htmlfiles[new_filename] = filename
-                edxobj.content = content
+                if features:
+                    edxobj.features = ContentFeatures.extract(content)
+                if lazy:
+                    edxobj.content_ref = ContentReference(source, new_file, 'html')
+                else:
+                    edxobj.content = content
                 edxobj.html_content = True
-                return
+                return []
 
     # Next, check if the tag shouldn't be empty, and hence should be a pointer
     # but for some reason was an invalid pointer
@@ -197,7 +367,7 @@ def read_course(edxobj, node, directory, filename, errorstore, htmlfiles, pointe
         # Likely to be an invalid pointer tag due to too many attributes
         errorstore.add_error(InvalidPointer(filename, edxobj=edxobj))
         edxobj.broken = True
-        return
+        return []
 
     # At this stage, we've checked for pointer tags and associated errors
 
@@ -208,21 +378,28 @@ def read_course(edxobj, node, directory, filename, errorstore, htmlfiles, pointe
     # Is the tag unexpectedly empty?
     if empty and not edxobj.can_be_empty:
         errorstore.add_error(EmptyTag(filename, edxobj=edxobj))
-        return
+        return []
 
     # If we get here, we have a non-empty tag
 
     # Check to see if there is a pointer target file that is not being used
     if not pointer and 'url_name' in edxobj.attributes and edxobj.can_be_pointer:
         new_file = edxobj.type + "/" + edxobj.attributes['url_name'] + ".xml"
-        if isfile(os.path.join(directory, new_file)):
+        if source.exists(new_file):
             errorstore.add_error(PossiblePointer(filename,
                                                  edxobj=edxobj,
                                                  new_file=new_file))
 
     if edxobj.content_store:
         # Store content from content tags
-        edxobj.content = node  # Can convert to text with etree.tostring(node, pretty_print=True)
+        if features:
+            edxobj.features = ContentFeatures.extract(node)
+        if lazy:
+            # Just record where to find it; it is parsed again if needed
+            path = None if node.getparent() is None else intern(node.getroottree().getpath(node))
+            edxobj.content_ref = ContentReference(source, filename, 'xml', path)
+        else:
+            edxobj.content = node  # Can convert to text with etree.tostring(node, pretty_print=True)
     else:
         # Check for content in non-content tag
         if node.text and node.text.strip():
@@ -237,17 +414,21 @@ def read_course(edxobj, node, directory, filename, errorstore, htmlfiles, pointe
                                                            text=child.tail))
                     break
 
-        # Recurse into each child
+        # Queue up each child
+        work = []
         for child in node:
             if child.tag is etree.Comment:
                 # Ignore comments
                 pass
             elif child.tag in edxobj.allowed_children:
-                # Recurse on that node
+                # Read into that node
                 newobj = EdxObject.get_object(child.tag)
                 edxobj.add_child(newobj)
-                read_course(newobj, child, directory, filename, errorstore, htmlfiles)
+                work.append((newobj, child, filename, False))
             else:
-                errorstore.add_error(UnexpectedTag(filename,
-                                                   tag=child.tag,
-                                                   edxobj=edxobj))
+                work.append(UnexpectedTag(filename,
+                                          tag=child.tag,
+                                          edxobj=edxobj))
+        return work
+
+    return []
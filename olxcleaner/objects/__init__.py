@@ -6,7 +6,9 @@ Contains classes to describe various edX objects
 
 Note that each edX object has its own file
 
-Use the EdxCourse.get_object method to create objects of appropriate tags
+Use the EdxObject.get_object method to create objects of appropriate tags. Each class is registered
+under its tag when it is defined; plugins may register further tags through the 'olxcleaner.objects'
+entry point group.
 """
 from olxcleaner.objects.common import EdxObject
 from olxcleaner.objects.chapter import EdxChapter
@@ -8,6 +8,7 @@ from olxcleaner.objects.common import EdxObject, show_answer_list, randomize_lis
 
 class EdxChapter(EdxObject):
     """edX chapter object"""
+    __slots__ = ()
     type = 'chapter'
     depth = 1
     display_name = True
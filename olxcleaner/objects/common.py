@@ -5,12 +5,55 @@ common.py
 Contains abstract base classes to describe various edX objects
 """
 from abc import ABC, ABCMeta, abstractmethod
+from sys import intern
+import threading
 import dateutil.parser
+from lxml import etree
 import pytz
 from olxcleaner.parser.parser_exceptions import InvalidSetting, DateOrdering
 
+# Entry point group through which plugins can provide further object types
+PLUGIN_GROUP = 'olxcleaner.objects'
+
+# Attribute values up to this length (e.g., url_names, settings and dates) are shared between objects
+SHARED_VALUE_LENGTH = 64
+
+# Attributes whose values are rarely repeated, and so aren't shared
+UNSHARED_ATTRIBUTES = frozenset(['display_name', 'data'])
+
+def entry_points(group):
+    """Returns a list of the installed entry points in the given group"""
+    try:
+        from importlib.metadata import entry_points as installed_entry_points
+    except ImportError:  # pragma: no cover
+        # Python < 3.8
+        import pkg_resources
+        return list(pkg_resources.iter_entry_points(group))
+    entries = installed_entry_points()
+    if hasattr(entries, 'select'):
+        return list(entries.select(group=group))
+    return list(entries.get(group, []))  # pragma: no cover
+
+class TreeGeneration(object):
+    """
+    Counts the changes made to a tree of objects, so that cached views of the tree (see EdxCourse.tree_cache)
+    can tell when it may have changed. A single TreeGeneration is shared by all of the objects in a tree.
+    """
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
 class EdxObject(ABC):
-    """Abstract base class for edX structure objects"""
+    """
+    Abstract base class for edX structure objects
+
+    Objects use __slots__ to keep large courses compact: subclasses that store further
+    data on their instances should declare it in __slots__ (or __slots__ = () otherwise).
+    """
+
+    __slots__ = ('children', 'attributes', 'filenames', '_broken', 'parent', 'tree')
 
     def __init__(self):
         """Initialize storage"""
@@ -26,6 +69,36 @@ class EdxObject(ABC):
         # If not, will just contain one entry: [contentfile]
         self.filenames = []
 
+        # Is this element broken (and hence needs no further errors reported?)
+        self._broken = False
+
+        # Who is my parent?
+        self.parent = None
+
+        # TreeGeneration of the tree that this object belongs to (None until it has a parent or children)
+        self.tree = None
+
+    @property
+    def broken(self):
+        """Is this element broken (and hence needs no further errors reported?)"""
+        return self._broken
+
+    @broken.setter
+    def broken(self, value):
+        self._broken = value
+        self.changed()
+
+    @property
+    def generation(self):
+        """The number of changes that have been made to the tree that this object belongs to"""
+        return self.tree.value if self.tree is not None else 0
+
+    def changed(self):
+        """Records a change to the tree that this object belongs to"""
+        if self.tree is None:
+            self.tree = TreeGeneration()
+        self.tree.value += 1
+
     # Default settings
 
     # Can this object store content?
@@ -51,12 +124,6 @@ class EdxObject(ABC):
     # Does this tag need a url_name attribute?
     needs_url_name = True
 
-    # Is this element broken (and hence needs no further errors reported?)
-    broken = False
-
-    # Who is my parent?
-    parent = None
-
     @property
     def allowed_children(self):  # pragma: no cover
         """
@@ -65,19 +132,82 @@ class EdxObject(ABC):
         """
         return []
 
+    # Instance data (besides attributes) that validate() sets, which must be copied back when
+    # objects validate themselves in another process
+    validation_results = ()
+
+    def validation_state(self):
+        """Returns the data that validate() may have changed"""
+        state = {name: getattr(self, name) for name in self.validation_results}
+        state['attributes'] = self.attributes
+        return state
+
+    def restore_validation_state(self, state):
+        """Copies in the data that validate() changed in another copy of this object"""
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __getstate__(self):
+        """Returns the instance data of this object, for pickling"""
+        state = dict(getattr(self, '__dict__', {}))
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        """Restores the instance data of this object when unpickling"""
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    # The children of an object should only be changed through add_child, replace_child and remove_child,
+    # which record the change in the tree's generation
+
     def add_child(self, node):
         """Adds a child to this object"""
         self.children.append(node)
         # Mark the node's parent so that we can go up and down the chain of objects
         node.parent = self
+        self._adopt(node)
+
+    def replace_child(self, old, new):
+        """Replaces a child of this object with a new object"""
+        self.children[self.children.index(old)] = new
+        new.parent = self
+        self._adopt(new)
+
+    def remove_child(self, node):
+        """Removes a child from this object"""
+        self.children.remove(node)
+        node.parent = None
+        self.changed()
+
+    def _adopt(self, node):
+        """Brings a new child (and its descendants) into the tree of this object, recording the change"""
+        if self.tree is None:
+            self.tree = TreeGeneration()
+        tree = self.tree
+        if node.tree is not tree:
+            stack = [node]
+            while stack:
+                edxobj = stack.pop()
+                edxobj.tree = tree
+                stack.extend(edxobj.children)
+        tree.value += 1
 
     def add_attribs(self, attribs):
         """Adds to the attributes for this object"""
-        self.attributes.update(attribs)
+        # Attribute names and short values are repeated across many objects, so share a single copy of each
+        self.attributes.update((intern(key), value if key in UNSHARED_ATTRIBUTES or len(value) > SHARED_VALUE_LENGTH
+                                             else intern(value))
+                               for key, value in attribs.items())
+        self.changed()
 
     def add_filename(self, value):
         """Adds a filename to the filename list for this object"""
-        self.filenames.append(value)
+        self.filenames.append(intern(value))
+        self.changed()
 
     def __repr__(self):
         """Produce a string representation of this object"""
@@ -119,8 +249,39 @@ class EdxObject(ABC):
         """
         pass
 
-    # List of subclasses of EdxObject
-    _subclasses = []
+    # Registry of EdxObject classes by tag, filled in as the classes are defined
+    _registry = {}
+
+    # Entry points for plugin classes by tag, read when first needed
+    _plugins = None
+
+    # Lock for loading plugins
+    _plugin_lock = threading.Lock()
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Register each class in olxcleaner that defines a tag type. Classes defined elsewhere (e.g., by plugins)
+        are only registered once load_plugin has checked them.
+        """
+        super().__init_subclass__(**kwargs)
+        if cls.__dict__.get('type') is not None and cls.__module__.split('.')[0] == 'olxcleaner':
+            EdxObject.register(cls)
+
+    @staticmethod
+    def register(edxclass):
+        """
+        Registers a class as the class for its tag
+
+        :param edxclass: Subclass of EdxObject with a type
+        :return: None
+        :raises ValueError: If a different class is already registered for the tag
+        """
+        existing = EdxObject._registry.get(edxclass.type)
+        if existing is not None and (existing.__module__, existing.__qualname__) != (edxclass.__module__,
+                                                                                   edxclass.__qualname__):
+            raise ValueError(f"Cannot register {edxclass.__qualname__} for <{edxclass.type}>, "
+                             f"which is already provided by {existing.__qualname__}")
+        EdxObject._registry[edxclass.type] = edxclass
 
     @staticmethod
     def get_object(object_type):
@@ -130,22 +291,56 @@ class EdxObject(ABC):
         :param object_type: type parameter for the desired class
         :return: Class with type object_type
         """
-        # If it doesn't already exist, construct the list of subclasses
-        if not EdxObject._subclasses:
-            subclasses = set()
-            work = [EdxObject]
-            while work:
-                parent = work.pop()
-                for child in parent.__subclasses__():
-                    if child not in subclasses:
-                        subclasses.add(child)
-                        work.append(child)
-            EdxObject._subclasses = list(subclasses)
-
-        for cls in EdxObject._subclasses:
-            if cls.type == object_type:
-                return cls()
-        raise ValueError(f"Cannot instantiate object of unknown type <{object_type}>")  # pragma: no cover
+        cls = EdxObject._registry.get(object_type)
+        if cls is None:
+            cls = EdxObject.load_plugin(object_type)
+        return cls()
+
+    @staticmethod
+    def plugin_tags():
+        """
+        Returns the tags of the object types provided by plugins through the 'olxcleaner.objects'
+        entry point group (the name of each entry point is the tag). Plugins are not imported.
+        """
+        if EdxObject._plugins is None:
+            with EdxObject._plugin_lock:
+                if EdxObject._plugins is None:
+                    EdxObject._plugins = {entry.name: entry for entry in entry_points(PLUGIN_GROUP)
+                                          if entry.name not in EdxObject._registry}
+        return list(EdxObject._plugins)
+
+    @staticmethod
+    def plugin_entry_points():
+        """
+        Describes the plugins that provide object types, for identifying the set of installed plugins.
+
+        :return: Sorted list of (tag, entry point value, version of the plugin's distribution or None)
+        """
+        EdxObject.plugin_tags()
+        plugins = []
+        for name, entry in EdxObject._plugins.items():
+            value = getattr(entry, 'value', None) or str(entry)
+            version = getattr(getattr(entry, 'dist', None), 'version', None)
+            plugins.append((name, value, version))
+        return sorted(plugins)
+
+    @staticmethod
+    def load_plugin(object_type):
+        """
+        Imports the plugin class for the given tag, registering it
+
+        :param object_type: type parameter for the desired class
+        :return: Class with type object_type
+        """
+        if object_type not in EdxObject.plugin_tags():
+            raise ValueError(f"Cannot instantiate object of unknown type <{object_type}>")
+        with EdxObject._plugin_lock:
+            if object_type not in EdxObject._registry:
+                cls = EdxObject._plugins[object_type].load()
+                if not (isinstance(cls, type) and issubclass(cls, EdxObject) and cls.type == object_type):
+                    raise ValueError(f"Plugin for <{object_type}> is not an EdxObject with type '{object_type}'")
+                EdxObject.register(cls)
+        return EdxObject._registry[object_type]
 
     def validate_entry_from_allowed(self, setting_name, allowed_list, errorstore, missing_ok=True):
         """
@@ -276,8 +471,69 @@ class EdxContent(EdxObject, metaclass=ABCMeta):
     # What depth does this object typically appear at? (used for reporting)
     depth = 4
 
-    # Contains the content of the tag, including the tag itself (except for HTML tags that reference an html file)
-    content = None
+    __slots__ = ('_content', 'content_ref', 'features')
+
+    def __init__(self):
+        super().__init__()
+        # Storage for the content
+        self._content = None
+
+        # Where to find the content of the tag, if the course was loaded lazily (a ContentReference)
+        self.content_ref = None
+
+        # Summary of the content, if it was extracted when the course was loaded (a ContentFeatures)
+        self.features = None
+
+    @property
+    def content(self):
+        """
+        The content of the tag, including the tag itself (except for HTML tags that reference an html file).
+        If the course was loaded lazily, the content is parsed when it is first accessed.
+        """
+        if self._content is None and self.content_ref is not None:
+            self._content = self.content_ref.load()
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+
+    def release_content(self):
+        """Discard the parsed content of a lazily-loaded tag, to free memory. It will be parsed again if needed."""
+        if self.content_ref is not None:
+            self._content = None
+
+    def __getstate__(self):
+        """
+        lxml trees can't be pickled, so the content is pickled as serialized text, along with the
+        line number of each element in the original file (which serializing loses)
+        """
+        state = super().__getstate__()
+        if self._content is not None:
+            if self.content_ref is not None:
+                # No need to send the content; it can be parsed again
+                state['_content'] = None
+            else:
+                method = 'html' if getattr(self, 'html_content', False) else 'xml'
+                lines = [element.sourceline for element in self._content.iter()]
+                state['_content'] = (method, etree.tostring(self._content, method=method, with_tail=False), lines)
+        return state
+
+    def __setstate__(self, state):
+        """Parse any serialized content when unpickling, restoring the original line numbers"""
+        content = state.get('_content')
+        if content is not None:
+            method, data, lines = content
+            parser = etree.HTMLParser() if method == 'html' else None
+            node = etree.fromstring(data, parser)
+            elements = list(node.iter())
+            if len(elements) == len(lines):
+                # The HTML parser may add elements, in which case the lines can't be matched up
+                for element, line in zip(elements, lines):
+                    if line is not None:
+                        element.sourceline = line
+            state = dict(state, _content=node)
+        super().__setstate__(state)
 
 
 # Collections of constants
@@ -6,7 +6,7 @@ Object description for an OLX course tag
 """
 from olxcleaner.objects.common import EdxObject, show_answer_list, randomize_list, show_correctness_list
 from olxcleaner.parser.parser_exceptions import MissingFile, InvalidSetting
-from olxcleaner.utils import check_static_file_exists, validate_graceperiod
+from olxcleaner.utils import check_static_file_exists, validate_graceperiod, TreeCache, StaticIndex
 
 class EdxCourse(EdxObject):
     """edX course object"""
@@ -21,13 +21,86 @@ class EdxCourse(EdxObject):
     def allowed_children(self):
         return ["chapter"]
 
-    directory = None
-    fullpath = None
+    __slots__ = ('directory', 'fullpath', 'source', 'parse_cache', '_tree_cache', '_static_index')
 
-    def savedir(self, directory, fullpath):
-        """Saves the course directory and full path for future use"""
+    def __init__(self):
+        super().__init__()
+        self.directory = None
+        self.fullpath = None
+        # CourseSource that the course was read from
+        self.source = None
+        # ParseCache used to load the course (if any)
+        self.parse_cache = None
+        # TreeCache of the course, built when first needed
+        self._tree_cache = None
+        # StaticIndex of the course, built when first needed
+        self._static_index = None
+
+    def savedir(self, directory, fullpath, source=None):
+        """Saves the course directory, full path and source for future use"""
         self.directory = directory
         self.fullpath = fullpath
+        self.source = source
+
+    def __getstate__(self):
+        """The parse cache, tree cache and static index stay behind when the course is pickled"""
+        state = super().__getstate__()
+        state['parse_cache'] = None
+        state['_tree_cache'] = None
+        state['_static_index'] = None
+        return state
+
+    def static_index(self):
+        """
+        Returns the index of the static files of the course (see olxcleaner.utils.StaticIndex), which is
+        built when first needed, and again if the source of the course is replaced.
+        """
+        index = self._static_index
+        if index is None or index.source is not self.source:
+            index = self._static_index = StaticIndex(self.source, self.directory)
+        return index
+
+    def tree_cache(self):
+        """
+        Returns the views of the course tree (see olxcleaner.utils.TreeCache), building them in a single walk
+        over the course the first time they are needed. They are rebuilt when next needed after the course
+        changes: objects added, replaced or removed (through add_child, replace_child or remove_child), objects
+        marked as broken, or attributes or filenames added.
+        """
+        cache = self._tree_cache
+        generation = self.generation
+        if cache is None or cache.generation != generation:
+            cache = self._tree_cache = TreeCache(self, generation)
+        return cache
+
+    def discard_tree_cache(self):
+        """Discards the cached views of the course tree (needed only after changing children lists directly)"""
+        self._tree_cache = None
+
+    def preorder(self):
+        """Returns a list of the objects in the course, in the order of traverse (don't modify it)"""
+        return self.tree_cache().objects
+
+    def objects_of_type(self, tag):
+        """Returns a list of the objects in the course with the given tag (e.g., 'problem'), in preorder"""
+        return self.tree_cache().of_types([tag])
+
+    def objects_in_file(self, filename):
+        """Returns a list of the objects in the course read from the given file (e.g., 'problem/p1.xml'), in preorder"""
+        cache = self.tree_cache()
+        return [cache.objects[position] for position in cache.by_filename.get(filename, ())]
+
+    def find_url_name(self, url_name):
+        """Returns the first object in the course (in preorder) with the given url_name, or None"""
+        return self.tree_cache().url_names.get(url_name)
+
+    def build_index(self):
+        """
+        Builds a flat, columnar view of the objects in the course (see olxcleaner.index.CourseIndex).
+        The index is not updated if the course changes afterwards.
+        """
+        from olxcleaner.index import CourseIndex
+        return CourseIndex(self)
 
     def validate(self, course, errorstore):
         """
@@ -9,6 +9,7 @@ from olxcleaner.parser.parser_exceptions import Obsolete
 
 class EdxDiscussion(EdxObject):
     """edX discussion object"""
+    __slots__ = ()
     type = "discussion"
     depth = 4
     can_be_empty = True
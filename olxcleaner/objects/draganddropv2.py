@@ -16,6 +16,9 @@ class EdxDragAndDropV2(EdxObject):
     can_be_empty = True
     depth = 4
 
+    __slots__ = ('parsed_data',)
+    validation_results = __slots__
+
     def __init__(self):
         # Do standard initialization
         super().__init__()
@@ -9,10 +9,15 @@ from olxcleaner.objects.common import EdxContent
 class EdxHtml(EdxContent):
     """edX html object"""
     type = "html"
-    html_content = False  # Was the content set by slurping up an HTML file directly?
-    # If True, content does not contain the wrapping html tag
     display_name = True
 
+    __slots__ = ('html_content',)
+
+    def __init__(self):
+        super().__init__()
+        self.html_content = False  # Was the content set by slurping up an HTML file directly?
+        # If True, content does not contain the wrapping html tag
+
     def validate(self, course, errorstore):
         """
         Perform validation on this object.
@@ -9,6 +9,7 @@ from olxcleaner.parser.parser_exceptions import Obsolete, LTIError
 
 class EdxLti(EdxObject):
     """edX lti object (obsolete)"""
+    __slots__ = ()
     type = "lti"
     depth = 4
     can_be_empty = True
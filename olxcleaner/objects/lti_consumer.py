@@ -9,6 +9,7 @@ from olxcleaner.parser.parser_exceptions import LTIError
 
 class EdxLtiConsumer(EdxObject):
     """edX lti_consumer object"""
+    __slots__ = ()
     can_be_pointer = False
     type = "lti_consumer"
     depth = 4
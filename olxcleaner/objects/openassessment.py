@@ -8,6 +8,7 @@ from olxcleaner.objects.common import EdxContent
 
 class EdxORA(EdxContent):
     """edX openassessment object"""
+    __slots__ = ()
     type = "openassessment"
     display_name = False
     can_be_pointer = False
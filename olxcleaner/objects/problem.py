@@ -6,6 +6,7 @@ Object description for an OLX problem tag
 """
 from olxcleaner.objects.common import EdxContent, show_answer_list, randomize_list, show_correctness_list
 from olxcleaner.parser.parser_exceptions import InvalidSetting
+from olxcleaner.utils import script_types
 
 response_types = ['coderesponse', 'numericalresponse', 'formularesponse', 'customresponse', 'schematicresponse',
                   'externalresponse', 'imageresponse', 'optionresponse', 'symbolicresponse', 'stringresponse',
@@ -22,6 +23,9 @@ class EdxProblem(EdxContent):
     type = "problem"
     display_name = True
 
+    __slots__ = ('scripts', 'response_types', 'input_types', 'has_solution')
+    validation_results = __slots__
+
     def __init__(self):
         # Do standard initialization
         super().__init__()
@@ -98,6 +102,8 @@ class EdxProblem(EdxContent):
 
         :return: True/False
         """
+        if self.features is not None:
+            return self.features.has_solution
         # Does there exist at least one <solution> tag?
         if self.content.find('.//solution') is not None:
             return True
@@ -109,10 +115,13 @@ class EdxProblem(EdxContent):
 
         :return: List of response types used
         """
+        if self.features is not None:
+            return [rtype for rtype in response_types if rtype in self.features.tags]
         tags = []
+        content = self.content
         for rtype in response_types:
             # Does there exist at least one of these tags?
-            if self.content.find('.//' + rtype) is not None:
+            if content.find('.//' + rtype) is not None:
                 tags.append(rtype)
         return tags
 
@@ -122,10 +131,13 @@ class EdxProblem(EdxContent):
 
         :return: List of input types used
         """
+        if self.features is not None:
+            return [itype for itype in input_types if itype in self.features.tags]
         tags = []
+        content = self.content
         for itype in input_types:
             # Does there exist at least one of these tags?
-            if self.content.find('.//' + itype) is not None:
+            if content.find('.//' + itype) is not None:
                 tags.append(itype)
         return tags
 
@@ -135,19 +147,6 @@ class EdxProblem(EdxContent):
 
         :return: List of script languages used
         """
-        # This code is modified from the edx-platform repository
-        codetypes = set()
-        for script in self.content.findall('.//script'):
-            stype = script.get('type')
-            # Code is contained in script.text
-            if stype:
-                if 'javascript' in stype:
-                    codetypes.add('javascript')
-                    continue
-                elif 'perl' in stype:
-                    codetypes.add('perl')
-                    continue
-            # If not javascript or perl, we assume python (even if not present)
-            codetypes.add('python')
-
-        return list(codetypes)
+        if self.features is not None:
+            return list(self.features.scripts)
+        return script_types(self.content)
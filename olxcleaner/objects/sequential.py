@@ -9,6 +9,7 @@ from olxcleaner.parser.parser_exceptions import InvalidSetting
 
 class EdxSequential(EdxObject):
     """edX sequential object"""
+    __slots__ = ()
     type = "sequential"
     depth = 2
     display_name = True
@@ -8,6 +8,7 @@ from olxcleaner.objects.common import EdxObject, show_answer_list, randomize_lis
 
 class EdxVertical(EdxObject):
     """edX vertical object"""
+    __slots__ = ()
     type = "vertical"
     depth = 3
     display_name = True
@@ -21,7 +22,7 @@ class EdxVertical(EdxObject):
                 'lti',
                 'lti_consumer',
                 'drag-and-drop-v2',
-                'openassessment']
+                'openassessment'] + EdxObject.plugin_tags()
 
     def validate(self, course, errorstore):
         """
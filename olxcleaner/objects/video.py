@@ -8,6 +8,7 @@ from olxcleaner.objects.common import EdxContent
 
 class EdxVideo(EdxContent):
     """edX video object"""
+    __slots__ = ()
     type = "video"
     can_be_empty = True
     display_name = True
@@ -126,6 +126,7 @@ class MissingFile(CourseError):
     def __init__(self, filename, **kwargs):
         super().__init__(filename)
         self._description = f"The {kwargs['edxobj']} tag contains a reference to a missing static file: {kwargs['missing_file']}"
+        self._line = kwargs.get('line')
 
 class BadJumpToLink(CourseError):
     """An internal jump_to_id link points to a url_name that doesn't exist."""
@@ -134,6 +135,7 @@ class BadJumpToLink(CourseError):
     def __init__(self, filename, **kwargs):
         super().__init__(filename)
         self._description = f"The {kwargs['edxobj']} tag contains a link to a url_name that doesn't exist: {kwargs['link']}"
+        self._line = kwargs.get('line')
 
 class BadCourseLink(CourseError):
     """An internal /course/ link points to a location that doesn't exist."""
@@ -142,6 +144,7 @@ class BadCourseLink(CourseError):
     def __init__(self, filename, **kwargs):
         super().__init__(filename)
         self._description = f"The {kwargs['edxobj']} tag contains a link to a location that doesn't exist: {kwargs['link']}"
+        self._line = kwargs.get('line')
 
 class DuplicateID(CourseError):
     """A discussion ID is duplicated. This leads to the discussion forums randomly telling students that threads have been deleted."""
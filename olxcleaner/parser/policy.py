@@ -4,7 +4,6 @@ policy.py
 
 Validation routines related to the policy file
 """
-from olxcleaner.utils import traverse
 from olxcleaner.parser.parser_exceptions import (
     MissingURLName,
     DuplicateURLName,
@@ -27,7 +26,7 @@ def find_url_names(course, errorstore):
     results = {}
 
     # Traverse the tree
-    for edxobj in traverse(course):
+    for edxobj in course.preorder():
         url_name = edxobj.attributes.get('url_name')
 
         if url_name is None:
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+schedule.py
+
+Works out which validation steps and validators need to run to perform the validation requested
+"""
+from olxcleaner.parser.validators import GlobalValidator
+from olxcleaner.parser.slowvalidators import SlowValidator
+from olxcleaner.parser.visitor import ObjectValidator
+
+# Validation steps 1-5, as (name, step number, resources required, resources provided)
+STEPS = (
+    ("LoadCourse", 1, (), ("course",)),
+    ("LoadPolicy", 2, ("course",), ("policy",)),
+    ("FindURLNames", 3, ("course",), ("url_names",)),
+    ("MergePolicy", 4, ("policy", "url_names"), ("merged_policy",)),
+    ("ValidateGradingPolicy", 5, ("policy",), ()),
+)
+
+class ParseDragAndDrop(ObjectValidator):
+    """
+    Has drag and drop objects validate themselves, parsing their data. This is used in place of
+    object validation (step 6) when a validator only needs the data of drag and drop objects.
+    """
+
+    requires = ("merged_policy",)
+    provides = ("dnd_data",)
+
+    on_any = None
+
+    def on_drag_and_drop_v2(self, edxobj, errorstore):
+        ObjectValidator.on_any(self, edxobj, errorstore)
+
+class Task(object):
+    """A validation step or validator, with the resources it requires and provides"""
+
+    __slots__ = ('name', 'step', 'requires', 'provides', 'validator')
+
+    def __init__(self, name, step, requires, provides, validator=None):
+        """
+        :param name: Name of the task (the name of the validator class for validators)
+        :param step: Validation step that the task belongs to
+        :param requires: Resources that must be available before the task runs
+        :param provides: Resources that are available once the task has run
+        :param validator: Validator instance (None for steps 1-5)
+        """
+        self.name = name
+        self.step = step
+        self.requires = requires
+        self.provides = provides
+        self.validator = validator
+
+    def __repr__(self):
+        return f"<Task {self.name} (step {self.step})>"
+
+def all_tasks(low_memory=False):
+    """
+    Returns all of the tasks that validation can perform, in the order that they run.
+
+    :param low_memory: Whether object validation should release the content of objects once they're validated
+    :return: List of Tasks
+    """
+    tasks = [Task(*step) for step in STEPS]
+    tasks.append(Task("ParseDragAndDrop", 6, ParseDragAndDrop.requires, ParseDragAndDrop.provides,
+                      ParseDragAndDrop(release_content=low_memory)))
+    tasks.append(Task("ObjectValidator", 6, ObjectValidator.requires, ObjectValidator.provides,
+                      ObjectValidator(release_content=low_memory)))
+    for step, cls in ((7, GlobalValidator), (8, SlowValidator)):
+        for validator in cls.validators():
+            tasks.append(Task(type(validator).__name__, step, validator.requires, validator.provides, validator))
+    return tasks
+
+def plan(steps=8, only=None, skip=None, low_memory=False):
+    """
+    Works out the tasks to run. The tasks requested are those in the first few steps (or the tasks named
+    in only), less any named in skip. Tasks that provide the resources required by the requested tasks
+    are then added, preferring tasks that are already going to run. Skipped tasks are still run if they
+    are needed by another task.
+
+    :param steps: Number of validation steps to take (1 = first only, 8 = all)
+    :param only: List of names of tasks to run (None = all tasks in the given steps)
+    :param skip: List of names of tasks not to run
+    :param low_memory: Whether object validation should release the content of objects once they're validated
+    :return: List of Tasks to run, in order
+    """
+    tasks = all_tasks(low_memory)
+    by_name = {task.name: task for task in tasks}
+    for name in (only or []) + (skip or []):
+        if name not in by_name:
+            raise ValueError(f"Unknown validation step or validator: {name}")
+
+    if only is not None:
+        selected = [task for task in tasks if task.name in only]
+    else:
+        selected = [task for task in tasks if task.step <= steps and task.name != "ParseDragAndDrop"]
+    selected = {task.name for task in selected if task.name not in (skip or [])}
+    selected.add("LoadCourse")
+
+    # Add providers for the resources that are required, until nothing more is needed
+    pending = list(selected)
+    while pending:
+        task = by_name[pending.pop()]
+        for resource in task.requires:
+            providers = [provider for provider in tasks if resource in provider.provides]
+            if not providers:
+                raise ValueError(f"Nothing provides {resource}, which is required by {task.name}")
+            if not any(provider.name in selected for provider in providers):
+                selected.add(providers[0].name)
+                pending.append(providers[0].name)
+
+    if "ObjectValidator" in selected:
+        # Object validation parses drag and drop data too
+        selected.discard("ParseDragAndDrop")
+
+    return [task for task in tasks if task.name in selected]
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+shards.py
+
+Runs visitors over a course in a pool of worker processes, one shard of the course at a time
+"""
+import multiprocessing
+from olxcleaner.errorstore import ErrorStore, ValidationAborted
+from olxcleaner.index import CourseIndex
+from olxcleaner.profiling import Timing
+from olxcleaner.parser.visitor import visit, ObjectValidator
+
+def find_shards(index, processes):
+    """
+    Split the preorder sequence of objects in a course into contiguous shards, one for each chapter
+    (or for each sequential, if there are fewer chapters than processes). The course object, and any
+    chapter objects when sharding by sequential, are included in the shard before them.
+
+    :param index: CourseIndex of the course
+    :param processes: Number of processes that will validate the shards
+    :return: List of (start, end) index ranges, in order
+    """
+    units = index.find('chapter')
+    if len(units) < processes:
+        units = index.find('sequential') or units
+    starts = [0] + units[1:]
+    ends = units[1:] + [len(index)]
+    return list(zip(starts, ends))
+
+def run_sharded(course, visitors, errorstores, url_names, processes, timings=None):
+    """
+    Run shardable visitors over a course using a pool of processes.
+
+    The course object is visited in this process before the others are sent to the workers. The errors
+    for each visitor are merged in shard order, so that they are identical to the errors found by walking
+    the course in a single process. Changes that objects make to themselves when
+    validating themselves are copied back into the course.
+    If a shard is abandoned at an error at the fail-fast level of the ErrorStores, the errors up to
+    the end of that shard are kept, and ValidationAborted is raised.
+
+    :param course: EdxCourse object with a loaded course
+    :param visitors: List of shardable Visitors
+    :param errorstores: ErrorStore for each visitor
+    :param url_names: Dictionary of url_name to objects
+    :param processes: Number of worker processes
+    :param timings: Timing for each visitor, to which the time spent in its hooks in all of the workers
+                    is added (None = don't time the visitors)
+    :return: None
+    """
+    index = CourseIndex(course)
+    shards = find_shards(index, processes)
+    if len(index):
+        # Visit the course object here first, so that the workers are sent its validated settings
+        # (e.g., its start and end dates, which objects in every shard compare their own dates against)
+        visit(course, list(zip(visitors, errorstores)), url_names, objects=index.objects[:1], timings=timings)
+        shards = [(max(start, 1), end) for start, end in shards if end > 1]
+    ignore = errorstores[0].ignorelist if errorstores else []
+    fail_fast = errorstores[0].fail_fast if errorstores else None
+    with multiprocessing.Pool(processes, initializer=start_worker,
+                              initargs=(course, visitors, url_names, ignore, timings is not None, fail_fast)) as pool:
+        for (start, end), (errors, states, shard_timings, aborted) in zip(shards, pool.imap(run_shard, shards)):
+            for errorstore, shard_errors in zip(errorstores, errors):
+                errorstore.errors.extend(shard_errors)
+            if timings is not None:
+                for timing, shard_timing in zip(timings, shard_timings):
+                    timing.add(shard_timing)
+            if states is not None:
+                for edxobj, state in zip(index.objects[start:end], states):
+                    edxobj.restore_validation_state(state)
+            if aborted:
+                # Stop at the first shard with an error at the fail-fast level (the pool is terminated)
+                raise ValidationAborted()
+
+# The course, visitors and index that a worker process is validating
+worker = None
+
+def start_worker(course, visitors, url_names, ignore, timed=False, fail_fast=None):
+    """Initialize a worker process"""
+    global worker
+    worker = (course, visitors, url_names, ignore, timed, fail_fast, CourseIndex(course))
+
+def run_shard(shard):
+    """
+    Run the visitors over one shard of the course in a worker process
+
+    :param shard: (start, end) index range of the shard
+    :return: List of errors found by each visitor, list of the validation states of the objects in the shard
+             (None if the objects didn't validate themselves), Timing for each visitor (None if not timed),
+             whether the shard was abandoned at an error at the fail-fast level
+    """
+    course, visitors, url_names, ignore, timed, fail_fast, index = worker
+    start, end = shard
+    objects = index.objects[start:end]
+    errorstores = [ErrorStore(ignore, fail_fast) for _ in visitors]
+    timings = [Timing(type(visitor).__name__) for visitor in visitors] if timed else None
+    aborted = False
+    try:
+        visit(course, list(zip(visitors, errorstores)), url_names, objects=objects, timings=timings)
+    except ValidationAborted:
+        aborted = True
+    states = None
+    if any(isinstance(visitor, ObjectValidator) for visitor in visitors):
+        states = [edxobj.validation_state() for edxobj in objects]
+    return [errorstore.errors for errorstore in errorstores], states, timings, aborted
@@ -7,52 +7,70 @@ but may require significant time to carry out
 """
 from olxcleaner.objects import EdxDragAndDropV2, EdxVertical
 from olxcleaner.parser.validators import GlobalValidator
-from olxcleaner.utils import traverse, find_links, check_static_file_exists
+from olxcleaner.parser.visitor import Visitor
+from olxcleaner.utils import find_links, check_static_file_exists
 from olxcleaner.parser.parser_exceptions import BadJumpToLink, BadCourseLink, MissingFile
 
 class SlowValidator(GlobalValidator):
     """Abstract base class for time-consuming validators"""
 
-class CheckLinks(SlowValidator):
+class CheckLinks(Visitor, SlowValidator):
     """Searches the course for broken internal links (including static links)"""
 
-    def __call__(self, course, errorstore, url_names):
-        for edxobj in traverse(course):
-            if edxobj.content_store:
-                # Find all of the special links in the object
-                links = find_links(edxobj)
-                # Make sure that each link has an endpoint!
-                validate_links(course, url_names, links, edxobj, errorstore)
-            elif isinstance(edxobj, EdxDragAndDropV2):
-                # Look inside the data structure of dndv2 objects
-                data = edxobj.parsed_data
-                links = []
-                if 'targetImg' in data:
-                    links.append(data['targetImg'])
-                if 'items' in data:
-                    for entry in data['items']:
-                        if 'imageURL' in entry:
-                            links.append(entry['imageURL'])
-                # Make sure that each link has an endpoint!
-                validate_links(course, url_names, links, edxobj, errorstore)
+    static_files = True
+    shardable = True
+    requires = ("url_names", "dnd_data")
+
+    def on_any(self, edxobj, errorstore):
+        if edxobj.content_store or isinstance(edxobj, EdxDragAndDropV2):
+            # Find all of the special links in the object, with their line numbers
+            links = object_links(edxobj, lines=True)
+            if getattr(edxobj, 'html_content', False):
+                # The lines are in the HTML file, rather than in the file that errors are reported against
+                links = [(link, None) for link, _ in links]
+            # Make sure that each link has an endpoint!
+            validate_links(self.course, self.url_names, links, edxobj, errorstore)
+
+def object_links(edxobj, lines=False):
+    """
+    Returns the links in an object: the internal links in the content of content objects, and the
+    images in the data of drag and drop v2 objects.
+
+    :param edxobj: EdxObject to search
+    :param lines: Return (link, line) pairs, as for find_links (drag and drop links have no line)
+    :return: List of links, or of (link, line) pairs
+    """
+    if edxobj.content_store:
+        return find_links(edxobj, lines)
+    links = []
+    if isinstance(edxobj, EdxDragAndDropV2):
+        # Look inside the data structure of dndv2 objects
+        data = edxobj.parsed_data
+        if 'targetImg' in data:
+            links.append(data['targetImg'])
+        if 'items' in data:
+            for entry in data['items']:
+                if 'imageURL' in entry:
+                    links.append(entry['imageURL'])
+    return [(link, None) for link in links] if lines else links
 
 def validate_links(course, url_names, links, edxobj, errorstore):
-    """Takes in the links for an edxobj, and processes all links"""
-    for link in links:
+    """Takes in the links for an edxobj as (link, line) pairs (line may be None), and processes all links"""
+    for link, line in links:
         if link.startswith('/jump_to_id/'):
             url_name = link[len('/jump_to_id/'):]
             if url_name not in url_names:
-                errorstore.add_error(BadJumpToLink(edxobj.filenames[-1], edxobj=edxobj, link=link))
+                errorstore.add_error(BadJumpToLink(edxobj.filenames[-1], edxobj=edxobj, link=link, line=line))
 
         elif link.startswith('/course/'):
             # Call a routine to handle this one
-            follow_course_link(course, link, edxobj, errorstore)
+            follow_course_link(course, link, edxobj, errorstore, line)
 
         elif link.startswith('/static/'):
             # Call a routine to handle this one
-            follow_static_link(course, link, edxobj, errorstore)
+            follow_static_link(course, link, edxobj, errorstore, line)
 
-def follow_course_link(course, link, edxobj, errorstore):
+def follow_course_link(course, link, edxobj, errorstore, line=None):
     """
     Follow a course link, reporting an error if it's invalid.
 
@@ -60,6 +78,7 @@ def follow_course_link(course, link, edxobj, errorstore):
     :param link: Link to chase
     :param edxobj: Object with the link (for reporting purposes)
     :param errorstore: ErrorStore object (for reporting purposes)
+    :param line: Line number of the link (for reporting purposes)
     :return: None
     """
     # We need to split the link into pieces
@@ -101,12 +120,12 @@ def follow_course_link(course, link, edxobj, errorstore):
                 link_idx = int(link_parts[idx])
             except ValueError:
                 # Can't convert the entry to an index; link is bad
-                errorstore.add_error(BadCourseLink(edxobj.filenames[-1], edxobj=edxobj, link=link))
+                errorstore.add_error(BadCourseLink(edxobj.filenames[-1], edxobj=edxobj, link=link, line=line))
                 return
 
             if link_idx < 1 or link_idx > len(current_obj.children):
                 # Link doesn't seem to point to somewhere that exists; link is bad
-                errorstore.add_error(BadCourseLink(edxobj.filenames[-1], edxobj=edxobj, link=link))
+                errorstore.add_error(BadCourseLink(edxobj.filenames[-1], edxobj=edxobj, link=link, line=line))
 
             # Regardless of what happened, we're now done
             return
@@ -121,10 +140,10 @@ def follow_course_link(course, link, edxobj, errorstore):
                     break
             else:
                 # Didn't find something to follow, link is bad
-                errorstore.add_error(BadCourseLink(edxobj.filenames[-1], edxobj=edxobj, link=link))
+                errorstore.add_error(BadCourseLink(edxobj.filenames[-1], edxobj=edxobj, link=link, line=line))
                 return
 
-def follow_static_link(course, link, edxobj, errorstore):
+def follow_static_link(course, link, edxobj, errorstore, line=None):
     """
     Check to see if a static file exists, reporting an error if it's invalid.
 
@@ -132,10 +151,12 @@ def follow_static_link(course, link, edxobj, errorstore):
     :param link: Link to chase
     :param edxobj: Object with the link (for reporting purposes)
     :param errorstore: ErrorStore object (for reporting purposes)
+    :param line: Line number of the link (for reporting purposes)
     :return: None
     """
     file_name = link[len('/static/'):]
     if not check_static_file_exists(course, file_name):
         errorstore.add_error(MissingFile(edxobj.filenames[-1],
                                          edxobj=edxobj,
-                                         missing_file=link))
+                                         missing_file=link,
+                                         line=line))
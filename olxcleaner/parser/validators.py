@@ -6,8 +6,7 @@ Validation routines that act on the course as a whole
 """
 import inspect
 from abc import ABC, abstractmethod
-from olxcleaner.objects import EdxDiscussion
-from olxcleaner.utils import traverse
+from olxcleaner.parser.visitor import Visitor
 from olxcleaner.parser.parser_exceptions import (
     MissingDisplayName,
     ExtraDisplayName,
@@ -17,9 +16,26 @@ from olxcleaner.parser.parser_exceptions import (
 class GlobalValidator(ABC):
     """
     Abstract base class describing global validation routines.
-    Only the __call__ method needs to be implemented.
+    Only the __call__ method needs to be implemented. Alternatively, validators that inspect
+    objects one at a time can inherit from Visitor as well, and implement its hooks instead,
+    so that they share a single walk over the course with other visitors.
     """
 
+    # Does this validator check for the existence of static files?
+    static_files = False
+
+    # Resources that this validator needs before it can run, and that it provides for later validators:
+    #   course: The loaded course tree (step 1)
+    #   policy: The policy and grading policy (step 2)
+    #   url_names: The dictionary of url_names (step 3)
+    #   merged_policy: Policy settings merged into object attributes (step 4)
+    #   objects: Objects that have validated themselves (step 6)
+    #   dates: Cleaned dates (step 6)
+    #   dnd_data: The parsed data of drag and drop objects (step 6)
+    # Resources provided by object validation are available object by object during the walk over the course.
+    requires = ("merged_policy",)
+    provides = ()
+
     @abstractmethod
     def __call__(self, course, errorstore, url_names):
         """
@@ -41,30 +57,32 @@ class GlobalValidator(ABC):
             if not inspect.isabstract(child):
                 yield child()
 
-class CheckDisplayNames(GlobalValidator):
+class CheckDisplayNames(Visitor, GlobalValidator):
     """Searches the course for missing display_name attributes"""
 
-    def __call__(self, course, errorstore, url_names):
-        for edxobj in traverse(course):
-            display_name = edxobj.attributes.get('display_name')
-            if edxobj.display_name is True and (display_name is None or display_name == ""):
-                errorstore.add_error(MissingDisplayName(edxobj.filenames[-1], edxobj=edxobj))
-            elif edxobj.display_name is False and display_name is not None:
-                errorstore.add_error(ExtraDisplayName(edxobj.filenames[-1], edxobj=edxobj))
+    shardable = True
 
-class CheckDiscussionIDs(GlobalValidator):
+    def on_any(self, edxobj, errorstore):
+        display_name = edxobj.attributes.get('display_name')
+        if edxobj.display_name is True and (display_name is None or display_name == ""):
+            errorstore.add_error(MissingDisplayName(edxobj.filenames[-1], edxobj=edxobj))
+        elif edxobj.display_name is False and display_name is not None:
+            errorstore.add_error(ExtraDisplayName(edxobj.filenames[-1], edxobj=edxobj))
+
+class CheckDiscussionIDs(Visitor, GlobalValidator):
     """Searches the course for duplicate discussion_id entries in discussion blocks"""
 
-    def __call__(self, course, errorstore, url_names):
-        discussion_ids = {}
-        for edxobj in traverse(course):
-            if isinstance(edxobj, EdxDiscussion):
-                disc_id = edxobj.attributes.get('discussion_id')
-                if disc_id:
-                    if disc_id in discussion_ids:
-                        errorstore.add_error(DuplicateID(edxobj.filenames[-1],
-                                                         edxobj1=edxobj,
-                                                         edxobj2=discussion_ids[disc_id],
-                                                         disc_id=disc_id))
-                    else:
-                        discussion_ids[disc_id] = edxobj
+    def start(self, course, errorstore, url_names):
+        super().start(course, errorstore, url_names)
+        self.discussion_ids = {}
+
+    def on_discussion(self, edxobj, errorstore):
+        disc_id = edxobj.attributes.get('discussion_id')
+        if disc_id:
+            if disc_id in self.discussion_ids:
+                errorstore.add_error(DuplicateID(edxobj.filenames[-1],
+                                                 edxobj1=edxobj,
+                                                 edxobj2=self.discussion_ids[disc_id],
+                                                 disc_id=disc_id))
+            else:
+                self.discussion_ids[disc_id] = edxobj
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+visitor.py
+
+Runs validators that inspect objects one at a time in a single walk over the course
+"""
+import time
+from itertools import islice
+
+class Visitor(object):
+    """
+    Mixin for validators that inspect the objects of a course one at a time.
+
+    Rather than implementing __call__, a visitor implements hooks that are called for each object in
+    the course, in preorder: on_any(edxobj, errorstore) is called for every object, followed by
+    on_<tag>(edxobj, errorstore) for objects with that tag (e.g., on_problem, on_vertical; dashes in
+    tags become underscores, as in on_drag_and_drop_v2). start is called before the walk, and finish
+    after it. Any number of visitors can share a single walk (see visit). Calling a visitor walks the
+    course for that visitor alone.
+
+    A visitor whose hooks only depend on the object being visited (and on the course tree and url_names,
+    which don't change during validation) can set shardable = True, so that it can be run over parts
+    of the course in separate processes.
+    """
+
+    # Can this visitor be run over parts of the course separately?
+    shardable = False
+
+    def start(self, course, errorstore, url_names):
+        """
+        Called before the walk.
+
+        :param course: EdxCourse object with a loaded course
+        :param errorstore: ErrorStore object where errors are reported
+        :param url_names: Dictionary of url_name to objects
+        :return: None
+        """
+        self.course = course
+        self.url_names = url_names
+
+    def finish(self, course, errorstore, url_names):
+        """Called after the walk, with the same arguments as start"""
+
+    def hooks(self, tag):
+        """Returns the hooks to call on objects with the given tag, in order"""
+        hooks = []
+        for name in ("on_any", "on_" + tag.replace("-", "_")):
+            hook = getattr(self, name, None)
+            if hook is not None:
+                hooks.append(hook)
+        return hooks
+
+    def __call__(self, course, errorstore, url_names):
+        visit(course, [(self, errorstore)], url_names)
+
+def visit(course, visitors, url_names, objects=None, timings=None):
+    """
+    Walk the course once, calling the hooks of all visitors on each object.
+
+    Each visitor reports to its own ErrorStore, so the errors found by each visitor are in
+    the same order as if the visitors had walked the course one after another.
+
+    :param course: EdxCourse object with a loaded course
+    :param visitors: List of (Visitor, ErrorStore) pairs
+    :param url_names: Dictionary of url_name to objects
+    :param objects: The objects to visit, in order (default: the objects in the course that the visitors hook)
+    :param timings: Timing for each visitor, to which the time spent in its hooks and the number of
+                    objects it visited are added (None = don't time the visitors)
+    :return: None
+    """
+    for _ in walk(course, visitors, url_names, objects, timings):
+        pass
+
+def walk(course, visitors, url_names, objects=None, timings=None, chunk=None):
+    """
+    Walk the course as in visit, pausing every chunk objects.
+
+    :param chunk: Number of objects to visit at a time (None = visit them all at once)
+    :return: Generator that yields the number of objects visited so far after each chunk of objects
+    """
+    if not visitors:
+        return
+
+    for visitor, errorstore in visitors:
+        visitor.start(course, errorstore, url_names)
+
+    edxobjs = hooked_objects(course, visitors) if objects is None else objects
+    if chunk:
+        edxobjs = iter(edxobjs)
+        batches = iter(lambda: list(islice(edxobjs, chunk)), [])
+    else:
+        batches = [edxobjs]
+
+    # Look up the hooks for each tag once
+    dispatch = {}
+    visited = 0
+    for batch in batches:
+        if timings is not None:
+            visit_timed(visitors, batch, timings, dispatch)
+        else:
+            for edxobj in batch:
+                calls = dispatch.get(edxobj.type)
+                if calls is None:
+                    calls = dispatch[edxobj.type] = [(hook, errorstore) for visitor, errorstore in visitors
+                                                     for hook in visitor.hooks(edxobj.type)]
+                for hook, errorstore in calls:
+                    hook(edxobj, errorstore)
+        if chunk:
+            visited += len(batch)
+            yield visited
+
+    for visitor, errorstore in visitors:
+        visitor.finish(course, errorstore, url_names)
+
+def hooked_objects(course, visitors):
+    """
+    Returns the objects of a course that any of the visitors have hooks for, in preorder. Unless a visitor
+    has an on_any hook, only the objects with the tags that the visitors hook are touched.
+
+    :param course: EdxCourse object with a loaded course
+    :param visitors: List of (Visitor, ErrorStore) pairs
+    :return: List of EdxObjects
+    """
+    cache = course.tree_cache()
+    if any(getattr(visitor, 'on_any', None) is not None for visitor, _ in visitors):
+        return cache.objects
+    return cache.of_types(tag for tag in cache.by_type if any(visitor.hooks(tag) for visitor, _ in visitors))
+
+def visit_timed(visitors, objects, timings, dispatch):
+    """
+    Call the hooks of all visitors on each object, as in visit, timing the hooks of each visitor
+
+    :param dispatch: Dictionary in which to cache the hooks to call for each tag
+    """
+    for timing in timings:
+        if timing.objects is None:
+            timing.objects = 0
+    for edxobj in objects:
+        calls = dispatch.get(edxobj.type)
+        if calls is None:
+            calls = [(visitor.hooks(edxobj.type), errorstore, timing)
+                     for (visitor, errorstore), timing in zip(visitors, timings)]
+            calls = dispatch[edxobj.type] = [call for call in calls if call[0]]
+        for hooks, errorstore, timing in calls:
+            wall, cpu = time.perf_counter(), time.process_time()
+            for hook in hooks:
+                hook(edxobj, errorstore)
+            timing.wall += time.perf_counter() - wall
+            timing.cpu += time.process_time() - cpu
+            timing.objects += 1
+
+class ObjectValidator(Visitor):
+    """Has every object validate itself (validation step 6)"""
+
+    shardable = True
+
+    # Resources that object validation needs, and that it provides for later validators (see schedule.py)
+    requires = ("merged_policy",)
+    provides = ("objects", "dates", "dnd_data")
+
+    def __init__(self, release_content=False):
+        """
+        :param release_content: Release the content of content objects after they have validated themselves
+        """
+        self.release_content = release_content
+
+    def on_any(self, edxobj, errorstore):
+        edxobj.validate(self.course, errorstore)
+        if self.release_content and edxobj.content_store:
+            # Drop any content that the object needed to parse
+            edxobj.release_content()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+profiling.py
+
+Records where the time goes when validating a course
+"""
+import time
+from contextlib import contextmanager
+
+class Timing(object):
+    """Wall and CPU time spent on one validation step or validator, with the objects visited and errors found"""
+
+    __slots__ = ('name', 'step', 'wall', 'cpu', 'objects', 'errors')
+
+    def __init__(self, name, step=None):
+        self.name = name
+        self.step = step
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.objects = None
+        self.errors = 0
+
+    def __repr__(self):
+        return f"<Timing {self.name}: {self.wall:.4f}s wall, {self.cpu:.4f}s cpu>"
+
+    def add(self, other):
+        """Add the time, objects and errors of another timing to this one"""
+        self.wall += other.wall
+        self.cpu += other.cpu
+        if other.objects is not None:
+            self.objects = (self.objects or 0) + other.objects
+        self.errors += other.errors
+
+    def as_dict(self):
+        """Returns the timing as a JSON-serializable dictionary"""
+        return {'name': self.name, 'step': self.step, 'wall': round(self.wall, 6), 'cpu': round(self.cpu, 6),
+                'objects': self.objects, 'errors': self.errors}
+
+class ValidationProfile(object):
+    """
+    Timings for a validation run:
+
+      * steps: A Timing for each validation step that was run, in order. Steps 6-8 share a single walk
+        over the course, so their timings are the sums of the timings of their validators.
+      * validators: A Timing for each validator in steps 6-8 (object validation, and each GlobalValidator
+        and SlowValidator subclass), in the order they were run
+      * wall, cpu: Total time taken by the validation run
+    """
+
+    def __init__(self):
+        self.steps = []
+        self.validators = []
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def __repr__(self):
+        return f"<ValidationProfile: {self.wall:.4f}s wall, {self.cpu:.4f}s cpu>"
+
+    @contextmanager
+    def step(self, number, name, errorstore):
+        """
+        Times a validation step, counting the errors that it reports.
+
+        :param number: Number of the step
+        :param name: Name of the step
+        :param errorstore: ErrorStore object where the step reports errors
+        :return: Context manager that yields the Timing of the step
+        """
+        timing = Timing(name, number)
+        errors = len(errorstore.errors)
+        try:
+            with measure(timing):
+                yield timing
+        finally:
+            timing.errors = len(errorstore.errors) - errors
+            self.steps.append(timing)
+
+    def as_dict(self):
+        """Returns the profile as a JSON-serializable dictionary"""
+        return {'wall': round(self.wall, 6), 'cpu': round(self.cpu, 6),
+                'steps': [timing.as_dict() for timing in self.steps],
+                'validators': [timing.as_dict() for timing in self.validators]}
+
+@contextmanager
+def measure(timing):
+    """Adds the wall and CPU time spent in the context to a Timing"""
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield timing
+    finally:
+        timing.wall += time.perf_counter() - wall
+        timing.cpu += time.process_time() - cpu
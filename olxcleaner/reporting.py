@@ -5,20 +5,26 @@ reporting.py
 Contains methods used to report on an analyzed course
 """
 from collections import Counter
-from olxcleaner.utils import traverse
 from olxcleaner.objects import EdxProblem, EdxSequential
 from olxcleaner.exceptions import ErrorLevel
 
-def report_statistics(course):
-    """Report course statistics, formatted in a list."""
+def report_statistics(course, statistics=None):
+    """
+    Report course statistics, formatted in a list.
+
+    :param course: A validated course
+    :param statistics: Statistics from compute_statistics (e.g., errorstore.statistics), used instead of the course
+    """
     result = []
 
-    # If things are borked, then get out
-    if course is None or course.broken:  # pragma: no cover
-        return result
+    if statistics is None:
+        # If things are borked, then get out
+        if course is None or course.broken:  # pragma: no cover
+            return result
 
-    # Compute statistics
-    typecounter, exams, response_types, input_types, python_problems, problem_solutions = compute_statistics(course)
+        # Compute statistics
+        statistics = compute_statistics(course)
+    typecounter, exams, response_types, input_types, python_problems, problem_solutions = statistics
 
     # Now print to screen
     result.append("Number of each type of object:")
@@ -70,28 +76,36 @@ def compute_statistics(course):
     # Track the number of problems with solutions
     problem_solutions = 0
 
-    for edxobj in traverse(course):
+    # Only sequentials and problems need to be looked at individually
+    cache = course.tree_cache()
+    sequentials, problems = [], []
+    for tag, positions in cache.by_type.items():
         # Track the object type
-        typecounter[edxobj.type] += 1
-
+        typecounter[tag] = len(positions)
+        edxobj = cache.objects[positions[0]]
         if isinstance(edxobj, EdxSequential):
-            # Check for exams
-            if edxobj.is_exam:
-                exams += 1
-
+            sequentials.append(tag)
         elif isinstance(edxobj, EdxProblem):
-            # Check for the 4 problem settings
-            if edxobj.has_solution:
-                problem_solutions += 1
+            problems.append(tag)
 
-            for response_type in edxobj.response_types:
-                response_types[response_type] += 1
+    for edxobj in cache.of_types(sequentials):
+        # Check for exams
+        if edxobj.is_exam:
+            exams += 1
 
-            for input_type in edxobj.input_types:
-                input_types[input_type] += 1
+    for edxobj in cache.of_types(problems):
+        # Check for the 4 problem settings
+        if edxobj.has_solution:
+            problem_solutions += 1
 
-            if 'python' in edxobj.scripts:
-                python_problems += 1
+        for response_type in edxobj.response_types:
+            response_types[response_type] += 1
+
+        for input_type in edxobj.input_types:
+            input_types[input_type] += 1
+
+        if 'python' in edxobj.scripts:
+            python_problems += 1
 
     return typecounter, exams, response_types, input_types, python_problems, problem_solutions
 
@@ -105,6 +119,27 @@ def report_errors(errorstore):
     wanted = [report for (filename, report) in result]
     return wanted
 
+def describe_errors(errors):
+    """Describes a list of errors as a list of JSON-serializable dictionaries (including the line, if known)"""
+    result = []
+    for error in errors:
+        description = {"name": error.name, "level": error.level, "filename": error.filename,
+                       "description": error.description}
+        if error.line is not None:
+            description["line"] = error.line
+        result.append(description)
+    return result
+
+def report_error_diff(new_errors, fixed_errors):
+    """Reports errors that have appeared (+) and gone away (-) since the last validation, returned as a list"""
+    result = []
+    for sign, errors in (("+", new_errors), ("-", fixed_errors)):
+        for error in errors:
+            result.append((error.filename, sign, f"{sign} {error.level} {error.name} ({error.filename}): {error.description}"))
+    result.sort()  # Uses the filename for ordering
+    wanted = [report for (filename, sign, report) in result]
+    return wanted
+
 def report_error_summary(errorstore):
     """Reports summary statistics on the errors found, returned as a list"""
     result = ["Summary:"]
@@ -118,6 +153,44 @@ def report_error_summary(errorstore):
         result.append("No errors found!")
     return result
 
+def report_static_assets(unused, collisions):
+    """Reports unused static files and case collisions (see olxcleaner.assets.audit_static_assets), returned as a list"""
+    result = [f"Unused static files: {len(unused)}"]
+    for name in unused:
+        result.append(f"  - {name}")
+    result.append(f"Static file names that differ only in case: {len(collisions)}")
+    for names in collisions:
+        result.append(f"  - {', '.join(names)}")
+    return result
+
+def report_duplicate_assets(duplicates):
+    """Reports groups of identical static files (see olxcleaner.assets.find_duplicate_assets), returned as a list"""
+    saving = sum(size * (len(names) - 1) for size, names in duplicates)
+    result = [f"Identical static files: {len(duplicates)} groups, {saving:,} bytes could be saved"]
+    for size, names in duplicates:
+        result.append(f"  - {size:,} bytes each: {', '.join(names)}")
+    return result
+
+def report_cache_summary(cache):
+    """Reports how effective the parse cache was, returned as a list"""
+    return [f"Parse cache: {cache.hits} hits, {cache.misses} misses, {cache.evictions} entries evicted"]
+
+def report_profile(profile):
+    """Reports the time taken by each validation step and validator, formatted as a table in a list"""
+    def row(name, timing):
+        objects = "" if timing.objects is None else timing.objects
+        return f"  {name:<36} {timing.wall:10.4f} {timing.cpu:10.4f} {objects:>8} {timing.errors:>7}"
+
+    result = [f"  {'Step':<36} {'Wall (s)':>10} {'CPU (s)':>10} {'Objects':>8} {'Errors':>7}"]
+    for timing in profile.steps:
+        result.append(row(f"{timing.step}: {timing.name}", timing))
+    if profile.validators:
+        result.append("  Validator")
+        for timing in profile.validators:
+            result.append(row(f"  {timing.name}", timing))
+    result.append(f"  {'Total':<36} {profile.wall:10.4f} {profile.cpu:10.4f}")
+    return result
+
 def construct_tree(course, maxdepth=None):
     """
     Constructs a tree version of the course structure, formatted as a list.
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+resultcache.py
+
+A persistent on-disk cache of validation results, for courses that haven't changed
+"""
+import os
+import pickle
+import hashlib
+import tempfile
+from olxcleaner.__version__ import version
+from olxcleaner.loader.source import FileSystemSource
+from olxcleaner.loader.archive import is_archive
+from olxcleaner.reporting import compute_statistics
+
+class ResultCache(object):
+    """
+    Stores the results of validating each course in a cache directory, so that a course that hasn't
+    changed since it was last validated with the same options need not be loaded at all.
+
+    Each course (identified by its path, the olxcleaner version and the validation options) has one
+    entry, holding a digest of the course files along with the errors found and the course statistics.
+    The digest covers the name, size and modification time of every file in the course directory
+    (or of the course archive), or in strict mode, the name and contents of every file. When the
+    digest of the course matches its entry, the stored results are used.
+    """
+
+    def __init__(self, directory, strict=False):
+        """
+        :param directory: Directory to store cache entries in (created if necessary)
+        :param strict: Identify unchanged courses by the contents of their files rather than their sizes
+                       and modification times
+        """
+        self.directory = directory
+        self.strict = strict
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def digest(self, filename):
+        """
+        Computes a digest of the files of a course.
+
+        :param filename: Location of course xml file or directory, or a .tar.gz/.zip course export
+        :return: Hex digest (None if the course can't be found)
+        """
+        if is_archive(filename) and os.path.isfile(filename):
+            directory, files = os.path.dirname(filename), [os.path.basename(filename)]
+        else:
+            directory = filename if os.path.isdir(filename) else os.path.dirname(filename)
+            if not os.path.isdir(directory or "."):
+                return None
+            files = sorted(FileSystemSource(directory or ".").files)
+        digest = hashlib.sha256()
+        for name in files:
+            path = os.path.join(directory, name)
+            try:
+                if self.strict:
+                    with open(path, 'rb') as f:
+                        signature = hashlib.sha256(f.read()).hexdigest()
+                else:
+                    stat = os.stat(path)
+                    signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+            except OSError:  # pragma: no cover
+                continue
+            digest.update(f"{name}\0{signature}\n".encode())
+        return digest.hexdigest()
+
+    def lookup(self, filename, options):
+        """
+        Looks up the results of validating a course.
+
+        :param filename: Location of course xml file or directory, or a .tar.gz/.zip course export
+        :param options: Dictionary describing the validation options (steps, ignored errors, etc.)
+        :return: Key to store the results under (None if the course can't be cached),
+                 entry dictionary with errors, truncated and statistics (None if not found)
+        """
+        digest = self.digest(filename)
+        if digest is None:
+            return None, None
+        name = repr((os.path.abspath(filename), version, sorted(options.items())))
+        key = (hashlib.sha1(name.encode()).hexdigest(), digest)
+        entry = self._read_entry(os.path.join(self.directory, key[0]))
+        if entry is not None and entry.get("digest") == digest:
+            self.hits += 1
+            return key, entry
+        self.misses += 1
+        return key, None
+
+    def store(self, key, errorstore, course):
+        """
+        Stores the results of validating a course, setting errorstore.statistics.
+
+        :param key: Key from lookup
+        :param errorstore: ErrorStore object with the errors found
+        :param course: EdxCourse object that was validated
+        :return: None
+        """
+        errorstore.statistics = compute_statistics(course)
+        entry = {"digest": key[1], "errors": errorstore.errors, "truncated": errorstore.truncated,
+                 "statistics": errorstore.statistics}
+        self._write_entry(os.path.join(self.directory, key[0]), entry)
+
+    @staticmethod
+    def restore(entry, errorstore):
+        """Restores stored results into an ErrorStore object"""
+        errorstore.errors = list(entry["errors"])
+        errorstore.truncated = entry["truncated"]
+        errorstore.statistics = entry["statistics"]
+        errorstore.cached = True
+
+    @staticmethod
+    def _read_entry(entry_path):
+        """Read an entry from the cache. Returns None if not present or unreadable."""
+        try:
+            with open(entry_path, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError, ImportError):
+            # A missing or corrupt entry, or one holding errors that no longer exist
+            return None
+
+    def _write_entry(self, entry_path, entry):
+        """Atomically write an entry to the cache"""
+        try:
+            fd, tmppath = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmppath, entry_path)
+        except OSError:  # pragma: no cover
+            pass
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+server.py
+
+A long-running validation service, which keeps recently validated courses in memory
+"""
+import os
+import json
+import stat
+import time
+import threading
+import socketserver
+from collections import OrderedDict
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from olxcleaner.validate import validate
+from olxcleaner.watch import CourseWatcher
+from olxcleaner.errorstore import ErrorStore
+from olxcleaner.reporting import describe_errors
+from olxcleaner.loader.archive import is_archive
+
+class ValidationService(object):
+    """
+    Validates courses on request. The most recently validated course directories are kept in memory
+    (as CourseWatchers), so that validating one again only reparses the files whose size or modification
+    time has changed, and only re-validates the parts of the course that depend on them. Course archives
+    are validated from scratch, using the parse cache if one is given.
+    """
+
+    def __init__(self, max_courses=8, workers=None, cache_dir=None):
+        """
+        :param max_courses: Number of courses to keep in memory
+        :param workers: Number of threads to use when loading a course (None or 1 = serial)
+        :param cache_dir: Directory in which to cache the results of parsing course archives (None = no cache)
+        """
+        self.max_courses = max_courses
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.watchers = OrderedDict()  # {(path, steps, ignore): CourseWatcher}, least recently used first
+        self.lock = threading.Lock()
+
+    def validate(self, request):
+        """
+        Validate a course.
+
+        :param request: Dictionary with the path of the course, and optionally steps (default 8) and ignore
+                        (a list of errors to ignore)
+        :return: JSON-serializable dictionary of results, or of an error message if the request was invalid
+        """
+        if not isinstance(request, dict) or not isinstance(request.get("path"), str):
+            return {"error": "A request must be an object with the path of a course"}
+        path = request["path"]
+        steps = request.get("steps", 8)
+        ignore = request.get("ignore")
+        if ignore is None:
+            ignore = []
+        if not isinstance(steps, int) or isinstance(steps, bool) or not 1 <= steps <= 8:
+            return {"error": "steps must be an integer between 1 and 8"}
+        if not isinstance(ignore, list) or not all(isinstance(name, str) for name in ignore):
+            return {"error": "ignore must be a list of error names"}
+
+        start = time.perf_counter()
+        with self.lock:
+            warm = False
+            if is_archive(path):
+                course, errorstore, _ = validate(path, steps, ignore, workers=self.workers, cache_dir=self.cache_dir)
+            else:
+                key = (os.path.realpath(path), steps, tuple(sorted(ignore)))
+                watcher = self.watchers.pop(key, None)
+                if watcher is None:
+                    watcher = CourseWatcher(path, steps, ignore, workers=self.workers)
+                    watcher.validate()
+                else:
+                    warm = True
+                    watcher.poll()
+                course, errorstore = watcher.course, ErrorStore(ignore)
+                errorstore.errors = watcher.errors
+                if course is not None:
+                    self.watchers[key] = watcher
+                    while len(self.watchers) > self.max_courses:
+                        self.watchers.popitem(last=False)
+
+        return {
+            "path": path,
+            "loaded": course is not None,
+            "warm": warm,
+            "errors": describe_errors(errorstore.errors),
+            "summary": {level: dict(counter) for level, counter in errorstore.summary().items()},
+            "seconds": round(time.perf_counter() - start, 4),
+        }
+
+    def status(self):
+        """Returns a JSON-serializable description of the courses held in memory"""
+        with self.lock:
+            return {"courses": [{"path": path, "steps": steps, "ignore": list(ignore)}
+                                for path, steps, ignore in self.watchers]}
+
+class HTTPHandler(BaseHTTPRequestHandler):
+    """Handles requests over HTTP: POST /validate with a JSON request, or GET /status"""
+
+    def do_GET(self):
+        if self.path == "/status":
+            self.respond(200, self.server.service.status())
+        else:
+            self.respond(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/validate":
+            self.respond(404, {"error": f"Unknown path: {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            self.respond(400, {"error": "Invalid JSON"})
+            return
+        result = self.server.service.validate(request)
+        self.respond(400 if "error" in result else 200, result)
+
+    def respond(self, code, result):
+        """Send a JSON response"""
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+class SocketHandler(socketserver.StreamRequestHandler):
+    """Handles requests over a Unix socket: each line is a JSON request, answered by a line of JSON"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError:
+                result = {"error": "Invalid JSON"}
+            else:
+                result = self.server.service.validate(request)
+            self.wfile.write(json.dumps(result).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """HTTP server that handles each connection in a thread (validations are run one at a time)"""
+    daemon_threads = True
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """Unix socket server that handles each connection in a thread (validations are run one at a time)"""
+        daemon_threads = True
+
+def make_server(service, port=None, socket_path=None, host="127.0.0.1", verbose=False):
+    """
+    Create a server for a validation service, listening on a Unix socket or a local HTTP port.
+    Call serve_forever() on the result to handle requests, and server_close() when done.
+
+    :param service: ValidationService object
+    :param port: Port to listen for HTTP requests on (0 = any free port)
+    :param socket_path: Path of a Unix socket to listen on (used instead of port)
+    :param host: Address to listen for HTTP requests on
+    :param verbose: Log each HTTP request
+    :return: Server object
+    """
+    if socket_path is not None:
+        if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            # Remove a socket left behind by a previous server
+            os.unlink(socket_path)
+        server = ThreadingUnixServer(socket_path, SocketHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), HTTPHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
@@ -7,15 +7,20 @@ Contains utility functions used in various parts of the library
 import os
 from os.path import isfile
 import re
+import heapq
+from lxml import etree
 
 def traverse(edxobj):
     """
-    Returns a generator that traverses a given object and all its children recursively
+    Returns a generator that traverses a given object and all its children in preorder
 
     This allows routines to traverse an entire course by using:
     for obj in traverse(course):
         (do something with every obj in the course)
 
+    Uses an explicit stack rather than nested generators, so the cost of
+    yielding an object does not depend on its depth.
+
     :param edxobj: EdxObject to traverse
     :return: Generator of EdxObjects
     """
@@ -26,10 +31,151 @@ def traverse(edxobj):
     # Generate this object
     yield edxobj
 
-    # Generate every object generated by the children of this object
-    for child in edxobj.children:
-        for entry in traverse(child):
-            yield entry
+    # Keep a stack of iterators over the children at each level
+    stack = [iter(edxobj.children)]
+    while stack:
+        for child in stack[-1]:
+            if child.broken:
+                continue
+            yield child
+            if child.children:
+                # Descend into this child's children before continuing with its siblings
+                stack.append(iter(child.children))
+                break
+        else:
+            # Finished with this level
+            stack.pop()
+
+class TreeCache(object):
+    """
+    Views of the objects in a tree, built in a single walk in preorder (the order of traverse, so that
+    broken objects and their children are omitted):
+
+      * objects: List of the objects
+      * by_type: Dictionary of {tag: list of positions in objects of the objects with that tag}
+      * by_filename: Dictionary of {filename: list of positions in objects of the objects read from that file}
+      * url_names: Dictionary of {url_name: first object with that url_name}
+
+    The views are not updated if the tree changes (see EdxCourse.tree_cache, which rebuilds them when it may have).
+    """
+
+    __slots__ = ('objects', 'by_type', 'by_filename', 'url_names', 'generation')
+
+    def __init__(self, root, generation=None):
+        """
+        :param root: EdxObject at the root of the tree (usually the course)
+        :param generation: Generation of the tree when the views were built
+        """
+        self.generation = generation
+        self.objects = list(traverse(root))
+        self.by_type = {}
+        self.by_filename = {}
+        self.url_names = {}
+        by_type, by_filename, url_names = self.by_type, self.by_filename, self.url_names
+        for position, edxobj in enumerate(self.objects):
+            bucket = by_type.get(edxobj.type)
+            if bucket is None:
+                bucket = by_type[edxobj.type] = []
+            bucket.append(position)
+            for filename in set(edxobj.filenames):
+                bucket = by_filename.get(filename)
+                if bucket is None:
+                    bucket = by_filename[filename] = []
+                bucket.append(position)
+            url_name = edxobj.attributes.get('url_name')
+            if url_name is not None and url_name not in url_names:
+                url_names[url_name] = edxobj
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __repr__(self):
+        return f"<TreeCache of {len(self)} objects>"
+
+    def of_types(self, tags):
+        """
+        Returns the objects with any of the given tags, in preorder
+
+        :param tags: Iterable of tags
+        :return: List of EdxObjects
+        """
+        buckets = [self.by_type[tag] for tag in set(tags) if tag in self.by_type]
+        if len(buckets) == 1:
+            positions = buckets[0]
+        else:
+            positions = heapq.merge(*buckets)
+        objects = self.objects
+        return [objects[position] for position in positions]
+
+class StaticIndex(object):
+    """
+    The static files of a course, for answering existence checks. The result of checking each
+    filename is remembered, so that files linked to from many places are only looked up once.
+
+      * source: CourseSource that the course was read from (None to use the course directory)
+      * directory: Course directory (used when there is no source)
+      * files: Set of the paths of the files in the static directory, relative to it, listed in a
+        single pass over the source (or the static directory) when first needed
+    """
+
+    __slots__ = ('source', 'directory', 'checked', '_files')
+
+    def __init__(self, source, directory=None):
+        """
+        :param source: CourseSource that the course was read from (None to use the course directory)
+        :param directory: Course directory
+        """
+        self.source = source
+        self.directory = directory
+        self.checked = {}
+        self._files = None
+
+    def __repr__(self):
+        return f"<StaticIndex of {len(self.files)} files>"
+
+    def exists(self, filename):
+        """Returns True if the given file (relative to the static directory) exists"""
+        result = self.checked.get(filename)
+        if result is None:
+            if self.source is not None:
+                result = self.source.exists("static/" + filename)
+            else:
+                result = isfile(os.path.join(self.directory, "static", filename))
+            self.checked[filename] = result
+        return result
+
+    @property
+    def files(self):
+        """Set of the paths of the static files, relative to the static directory"""
+        files = self._files
+        if files is None:
+            files = self._files = frozenset(self._list_files())
+        return files
+
+    def _list_files(self):
+        """Generates the paths of the static files"""
+        if self.source is None:
+            static = os.path.join(self.directory or ".", "static")
+            for path, dirnames, filenames in os.walk(static):
+                dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+                prefix = os.path.relpath(path, static).replace(os.sep, "/")
+                for name in filenames:
+                    yield name if prefix == "." else f"{prefix}/{name}"
+            return
+        files = getattr(self.source, 'files', None)
+        if files is not None:
+            # The source keeps an index of its files
+            yield from (name[len("static/"):] for name in files if name.startswith("static/"))
+            return
+        stack = ["static"]
+        while stack:
+            dirname = stack.pop()
+            for name in self.source.listdir(dirname):
+                path = f"{dirname}/{name}"
+                if self.source.isfile(path):
+                    yield path[len("static/"):]
+                else:
+                    stack.append(path)
 
 def check_static_file_exists(course, filename):
     """
@@ -39,8 +185,7 @@ def check_static_file_exists(course, filename):
     :param filename: Filename to look for
     :return: True/False
     """
-    fullpath = os.path.join(course.directory, "static", filename)
-    return isfile(fullpath)
+    return course.static_index().exists(filename)
 
 
 # Copied from the edx-platform xmodule.fields library
@@ -55,23 +200,67 @@ def validate_graceperiod(entry):
         return False
     return True
 
-def find_links(edxobj):
-    """Find all internal links in the given object"""
-    links = []
+# Attributes that we scan for internal links
+URL_ATTRIBUTES = frozenset(['link', 'src', 'href', 'img', 'icon', 'preprocessorSrc'])
+# Prefixes of the internal links that we look for
+INTERNAL_LINKS = ('/static/', '/course/', '/jump_to_id/')
 
-    # This is the list of all attributes we will scan for internal links
-    url_attributes = ['link', 'src', 'href', 'img', 'icon', 'preprocessorSrc']
-    # This is the list of special links we will look for
-    internal_links = ['/static/', '/course/', '/jump_to_id/']
-
-    # Search for all elements that have the desired attributes
-    if edxobj.content is not None:  # Empty objects are stored as None
-        for attrib in url_attributes:
-            for tag in edxobj.content.findall(f".//*[@{attrib}]"):
-                link = tag.get(attrib)
-                if link:
-                    for special in internal_links:
-                        if link.startswith(special):
-                            links.append(link)
+def find_links(edxobj, lines=False):
+    """
+    Find all internal links in the given object, in document order
+
+    :param edxobj: EdxObject to search
+    :param lines: Return (link, line) pairs, where line is the line of the element containing the link in the
+                  file that the content was read from (or None if not known)
+    :return: List of links, or of (link, line) pairs
+    """
+    if edxobj.features is not None:
+        # The links were found when the object was loaded
+        features = edxobj.features
+        if lines:
+            return list(zip(features.links, features.link_lines))
+        return list(features.links)
+    if edxobj.content is None:  # Empty objects are stored as None
+        return []
+    return scan_links(edxobj.content, lines)
 
+def scan_links(node, lines=False):
+    """
+    Find all internal links in the descendants of the given lxml element, in document order.
+    The element is scanned in a single pass, looking at the attributes of each element once.
+
+    :param node: The lxml element to search
+    :param lines: Return (link, line) pairs, as in find_links
+    :return: List of links, or of (link, line) pairs
+    """
+    links = []
+    for element in node.iterdescendants(etree.Element):
+        if element.attrib:
+            for name, link in element.items():
+                if name in URL_ATTRIBUTES and link.startswith(INTERNAL_LINKS):
+                    links.append((link, element.sourceline) if lines else link)
     return links
+
+def script_types(node):
+    """
+    Locate and identify the language of all scripts used in an lxml element
+
+    :param node: The lxml element to search
+    :return: List of script languages used
+    """
+    # This code is modified from the edx-platform repository
+    codetypes = set()
+    for script in node.findall('.//script'):
+        stype = script.get('type')
+        # Code is contained in script.text
+        if stype:
+            if 'javascript' in stype:
+                codetypes.add('javascript')
+                continue
+            elif 'perl' in stype:
+                codetypes.add('perl')
+                continue
+        # If not javascript or perl, we assume python (even if not present)
+        codetypes.add('python')
+
+    return list(codetypes)
@@ -5,14 +5,36 @@ validate.py
 Workhorse function that validates an OLX course
 """
 import os
-from olxcleaner.errorstore import ErrorStore
+import tarfile
+import zipfile
+from functools import partial
+from contextlib import contextmanager
+from olxcleaner.errorstore import ErrorStore, ValidationAborted
+from olxcleaner.profiling import ValidationProfile, Timing, measure
+from olxcleaner.objects import EdxObject
 from olxcleaner.loader import load_course, load_policy
+from olxcleaner.loader.cache import ParseCache
+from olxcleaner.resultcache import ResultCache
+from olxcleaner.loader.source import CourseSource
+from olxcleaner.loader.archive import ArchiveSource, is_archive
+from olxcleaner.loader.xml_exceptions import CourseXMLDoesNotExist
 from olxcleaner.parser.policy import find_url_names, merge_policy, validate_grading_policy
-from olxcleaner.parser.validators import GlobalValidator
-from olxcleaner.parser.slowvalidators import SlowValidator
-from olxcleaner.utils import traverse
+from olxcleaner.parser.schedule import plan
+from olxcleaner.parser.visitor import Visitor, walk
+from olxcleaner.parser.shards import run_sharded
 
-def validate(filename, steps=8, ignore=None):
+@contextmanager
+def nullcontext():
+    """A context manager that does nothing (contextlib.nullcontext requires Python 3.7)"""
+    yield
+
+# Names of the validation steps
+STEP_NAMES = ("Load course", "Load policy", "Find url_names", "Merge policy", "Validate grading policy",
+              "Validate objects", "Global validation", "Detailed global validation")
+
+def validate(filename, steps=8, ignore=None, workers=None, cache_dir=None, cache_strict=False,
+             cache_size=256 * 1024 * 1024, lazy=None, low_memory=False, processes=None, profile=False,
+             only=None, skip=None, fail_fast=None, result_cache=None):
     """
     Validate an OLX course by performing the given number of steps:
 
@@ -25,56 +47,337 @@ def validate(filename, steps=8, ignore=None):
       * 7: Parse the course for global errors
       * 8: Parse the course for global errors that may be time-consuming to detect
 
-    :param filename: Location of course xml file or directory
+    Alternatively, the steps and validators to run can be named (see olxcleaner.parser.schedule), in which
+    case only the steps and validators that they depend on are also run.
+
+    :param filename: Location of course xml file or directory, a .tar.gz/.zip course export, or a CourseSource
     :param steps: Number of validation steps to take (1 = first only, 8 = all)
     :param ignore: List of errors to ignore
-    :return: course object, errorstore object, url_names dictionary (or None if steps < 3)
+    :param workers: Number of threads to use when loading the course (None or 1 = serial)
+    :param cache_dir: Directory in which to cache the results of parsing course HTML files (None = no cache)
+    :param cache_strict: Identify unchanged files by their contents rather than their size and modification time
+    :param cache_size: Maximum size of the parse cache, in bytes
+    :param lazy: Whether to parse the content of components only when it is accessed, rather than keeping it in
+                 memory (None = only if steps 6-8 aren't run, as the content isn't needed before then)
+    :param low_memory: Summarize the content of components as it is loaded, rather than keeping it in memory
+                       (implies lazy loading)
+    :param processes: Number of processes to use for steps 6-8, which are split up by chapter (None or 1 = serial)
+    :param profile: Record the time taken by each step and validator, as a ValidationProfile in errorstore.profile
+    :param fail_fast: ErrorLevel at which to stop, as soon as an error at or above that level is found. The course
+                      loaded so far and the errors found so far are returned, with errorstore.truncated set.
+    :param only: List of names of steps and validators to run, instead of the given number of steps (e.g.,
+                 ["CheckLinks"]). Raises ValueError if a name is unknown.
+    :param skip: List of names of steps and validators not to run, unless other validators depend on them
+    :param result_cache: Directory in which to cache the results of validating the course (None = no cache). If
+                         the course files haven't changed since it was last validated with the same options, the
+                         stored errors and statistics (errorstore.statistics) are returned without loading the
+                         course, with errorstore.cached set and None for the course and url_names. Unchanged files
+                         are identified as for the parse cache (see cache_strict).
+    :return: course object, errorstore object, url_names dictionary (or None if url_names weren't found)
+    """
+    pipeline, errorstore = start_validation(filename, steps, ignore, workers, cache_dir, cache_strict, cache_size,
+                                            lazy, low_memory, processes, profile, only, skip, fail_fast,
+                                            result_cache=result_cache)
+    course, url_names = run_pipeline(pipeline)
+    return course, errorstore, url_names
+
+def start_validation(filename, steps, ignore, workers, cache_dir, cache_strict, cache_size, lazy, low_memory,
+                     processes, profile, only, skip, fail_fast, chunk=None, result_cache=None):
+    """
+    Sets up a validation run, with the arguments of validate.
+
+    :param chunk: Number of objects to visit at a time in steps 6-8, reporting progress after each chunk
+                  (None = visit them all at once)
+    :return: Validation pipeline (see validation_pipeline), ErrorStore object
     """
+    tasks = plan(steps, only, skip, low_memory)
+
     # Create an error store
     if ignore is None:
         ignore = []
-    errorstore = ErrorStore(ignore)
+    errorstore = ErrorStore(ignore, fail_fast)
+    if profile:
+        errorstore.profile = ValidationProfile()
+    pipeline = validation_pipeline(filename, tasks, errorstore, workers, cache_dir, cache_strict, cache_size, lazy,
+                                   low_memory, processes, chunk)
+    if result_cache and not isinstance(filename, CourseSource):
+        # Installing or removing plugins can change the results
+        options = {"tasks": sorted(task.name for task in tasks), "ignore": sorted(ignore),
+                   "fail_fast": errorstore.fail_fast, "low_memory": low_memory,
+                   "plugins": EdxObject.plugin_entry_points()}
+        pipeline = cached_pipeline(pipeline, ResultCache(result_cache, strict=cache_strict), filename, options,
+                                   errorstore)
+    return pipeline, errorstore
+
+def run_pipeline(pipeline):
+    """
+    Runs a validation pipeline to completion in this thread, calling the functions that it yields
+    and discarding its progress reports.
+
+    :param pipeline: Generator from validation_pipeline or validator_pipeline
+    :return: The value returned by the pipeline
+    """
+    send, value = pipeline.send, None
+    while True:
+        try:
+            item = send(value)
+        except StopIteration as stop:
+            return stop.value
+        send, value = pipeline.send, None
+        if callable(item):
+            try:
+                value = item()
+            except Exception as e:
+                # Raise the exception inside the pipeline
+                send, value = pipeline.throw, e
+
+class Progress(object):
+    """
+    Progress of a validation run:
+
+      * step, name: The number and name of the validation step that has finished (or, while steps 6-8
+        walk the course, the last of the steps that the walk covers)
+      * objects: Number of objects visited so far in the walk over the course (None outside the walk)
+      * total: Number of objects in the course (None until it has been loaded)
+      * errors: Number of errors found so far
+    """
+
+    __slots__ = ('step', 'name', 'objects', 'total', 'errors')
+
+    def __init__(self, step, objects, total, errors):
+        self.step = step
+        self.name = STEP_NAMES[step - 1]
+        self.objects = objects
+        self.total = total
+        self.errors = errors
+
+    def __repr__(self):
+        objects = "" if self.objects is None else f", {self.objects}/{self.total} objects"
+        return f"<Progress: step {self.step} ({self.name}){objects}, {self.errors} errors>"
+
+def validation_pipeline(filename, tasks, errorstore, workers, cache_dir, cache_strict, cache_size, lazy, low_memory,
+                        processes, chunk=None):
+    """
+    Performs the validation steps for validate, timing them if errorstore.profile is set.
+
+    The steps are performed by a generator, so that they can be run in this thread (run_pipeline) or
+    from an event loop (olxcleaner.avalidate). The generator yields:
+
+      * Progress objects, after each step and after each chunk of objects in steps 6-8
+      * Functions to call with no arguments, for work that blocks (reading and parsing files, and
+        validating in other processes). The result of the call (or its exception) must be sent back.
+
+    :param tasks: List of Tasks to perform (see plan)
+    :param chunk: Number of objects to visit at a time in steps 6-8 (None = visit them all at once)
+    :return: course object (or None if the course couldn't be loaded), url_names dictionary (or None)
+    """
+    profile = errorstore.profile
+
+    def step(number):
+        """Returns a context manager that times a validation step"""
+        return profile.step(number, STEP_NAMES[number - 1], errorstore) if profile else nullcontext()
+
+    course = url_names = total = None
+    with measure(profile) if profile else nullcontext():
+        try:
+            # Validation Step #1: Load the course
+            with step(1) as timing:
+                course, directory = yield partial(load_step, filename, tasks, errorstore, workers, cache_dir,
+                                                  cache_strict, cache_size, lazy, low_memory)
+                if (timing or chunk) and course:
+                    total = len(course.preorder())
+                    if timing:
+                        timing.objects = total
+            if not course or errorstore.truncated:
+                return course, url_names
+            yield Progress(1, None, total, len(errorstore.errors))
 
-    # Validation Step #1: Load the course
-    if os.path.isdir(filename):
+            names = {task.name for task in tasks}
+            if "LoadPolicy" in names:
+                # Validation Step #2: Load the policy files
+                with step(2):
+                    policy, grading_policy = yield partial(load_policy, directory, course, errorstore)
+                yield Progress(2, None, total, len(errorstore.errors))
+
+            if "FindURLNames" in names:
+                # Validation Step #3: Construct a dictionary of url_names
+                with step(3):
+                    url_names = find_url_names(course, errorstore)
+                yield Progress(3, None, total, len(errorstore.errors))
+
+            if "MergePolicy" in names:
+                # Validation Step #4: Merge policy data into object attributes
+                with step(4):
+                    merge_policy(policy, url_names, errorstore)
+                yield Progress(4, None, total, len(errorstore.errors))
+
+            if "ValidateGradingPolicy" in names:
+                # Validation Step #5: Validate grading policy
+                with step(5):
+                    validate_grading_policy(grading_policy, errorstore)
+                yield Progress(5, None, total, len(errorstore.errors))
+
+            # Validation Steps #6-8 share a single walk over the course:
+            #   6: Have every object validate itself
+            #   7: Parse the course for global errors
+            #   8: Parse the course for global errors that are time-consuming to detect
+            stages = [task.validator for task in tasks if task.validator is not None]
+            numbers = [task.step for task in tasks if task.validator is not None]
+            if not stages:
+                return course, url_names
+
+            timings = None
+            if profile:
+                timings = [Timing(type(validator).__name__, number) for validator, number in zip(stages, numbers)]
+            progress = Progress(max(numbers), 0, total, len(errorstore.errors))
+            try:
+                yield from validator_pipeline(course, stages, errorstore, url_names, processes=processes,
+                                              timings=timings, chunk=chunk, progress=progress)
+            finally:
+                if profile:
+                    profile.validators.extend(timings)
+                    for number in sorted(set(numbers)):
+                        # The time for each step is the time spent in its validators
+                        timing = Timing(STEP_NAMES[number - 1], number)
+                        for validator_timing, validator_number in zip(timings, numbers):
+                            if validator_number == number:
+                                timing.wall += validator_timing.wall
+                                timing.cpu += validator_timing.cpu
+                                timing.errors += validator_timing.errors
+                                if validator_timing.objects is not None:
+                                    timing.objects = max(timing.objects or 0, validator_timing.objects)
+                        profile.steps.append(timing)
+            yield Progress(max(numbers), None, total, len(errorstore.errors))
+
+        except ValidationAborted:
+            # Stop at the first error at the fail-fast level (errorstore.truncated is set)
+            pass
+
+    return course, url_names
+
+def cached_pipeline(pipeline, results, filename, options, errorstore):
+    """
+    Wraps a validation pipeline, so that it uses the results stored in a ResultCache if the course hasn't
+    changed, and otherwise stores the results once the course has been validated. Yields and returns as
+    for validation_pipeline. Results aren't looked up when the validation is profiled.
+
+    :param pipeline: Validation pipeline (see validation_pipeline)
+    :param results: ResultCache object
+    :param filename: Location of course xml file or directory, or a .tar.gz/.zip course export
+    :param options: Dictionary describing the validation options
+    :param errorstore: ErrorStore object that the pipeline reports errors to
+    :return: course object (or None), url_names dictionary (or None)
+    """
+    key, entry = yield partial(results.lookup, filename, options)
+    if entry is not None and not errorstore.profile:
+        pipeline.close()
+        results.restore(entry, errorstore)
+        return None, None
+    course, url_names = yield from pipeline
+    if key is not None and course is not None:
+        yield partial(results.store, key, errorstore, course)
+    return course, url_names
+
+def load_step(filename, tasks, errorstore, workers, cache_dir, cache_strict, cache_size, lazy, low_memory):
+    """
+    Validation step 1: Load the course.
+
+    :return: course object (or None if the course couldn't be loaded), directory of the course
+    """
+    source = None
+    if isinstance(filename, CourseSource):
+        # Read the course from the given source
+        source = filename
+        directory = None
+        file = "course.xml"
+    elif is_archive(filename) and os.path.isfile(filename):
+        # Read the course straight out of the archive
+        directory = filename
+        file = "course.xml"
+        try:
+            source = ArchiveSource(filename)
+        except (OSError, tarfile.TarError, zipfile.BadZipFile):
+            errorstore.add_error(CourseXMLDoesNotExist(filename))
+            return None, directory
+    elif os.path.isdir(filename):
         directory = os.path.join(filename)
         file = "course.xml"
     else:
         directory, file = os.path.split(filename)
-    course = load_course(directory, file, errorstore)
-    if not course:
-        return None, errorstore, None
-
-    if steps > 1:
-        # Validation Step #2: Load the policy files
-        policy, grading_policy = load_policy(directory, course, errorstore)
-
-    url_names = None
-    if steps > 2:
-        # Validation Step #3: Construct a dictionary of url_names
-        url_names = find_url_names(course, errorstore)
-
-    if steps > 3:
-        # Validation Step #4: Merge policy data into object attributes
-        merge_policy(policy, url_names, errorstore)
-
-    if steps > 4:
-        # Validation Step #5: Validate grading policy
-        validate_grading_policy(grading_policy, errorstore)
-
-    if steps > 5:
-        # Validation Step #6: Have every object validate itself
-        for edxobj in traverse(course):
-            edxobj.validate(course, errorstore)
-
-    if steps > 6:
-        # Validation Step #7: Parse the course for global errors
-        for validator in GlobalValidator.validators():
-            validator(course, errorstore, url_names)
-
-    if steps > 7:
-        # Validation Step #8: Parse the course for global errors that are time-consuming to detect
-        for validator in SlowValidator.validators():
-            validator(course, errorstore, url_names)
+    if low_memory:
+        lazy = True
+    elif lazy is None:
+        lazy = all(task.step < 6 for task in tasks)
+    cache = ParseCache(cache_dir, strict=cache_strict, max_size=cache_size) if cache_dir else None
+    course = load_course(directory, file, errorstore, workers=workers, cache=cache, source=source, lazy=lazy,
+                         features=low_memory)
+    if cache:
+        cache.evict()
+    return course, directory
 
-    return course, errorstore, url_names
+def run_validators(course, validators, errorstore, url_names, processes=None, timings=None):
+    """
+    Run validators over a course. Visitors share a single walk over the course, after which any
+    other validators are called in turn. Errors are reported in the order of the validators.
+
+    With more than one process, shardable visitors are first run over the shards of the course
+    in a pool of processes, and the remaining visitors then share a walk in this process.
+
+    If an error at the fail-fast level of the errorstore is found, the errors found so far are
+    reported, errorstore.truncated is set, and ValidationAborted is raised.
+
+    :param course: EdxCourse object with a loaded course
+    :param validators: List of validators (Visitors or callables)
+    :param errorstore: ErrorStore object where errors are reported
+    :param url_names: Dictionary of url_name to objects
+    :param processes: Number of processes to use (None or 1 = this process only)
+    :param timings: Timing for each validator, to which its time, the objects it visited and the errors it
+                    found are added (None = don't time the validators)
+    :return: None
+    """
+    run_pipeline(validator_pipeline(course, validators, errorstore, url_names, processes, timings))
+
+def validator_pipeline(course, validators, errorstore, url_names, processes=None, timings=None, chunk=None,
+                       progress=None):
+    """
+    Runs validators as in run_validators, as a generator that yields in the same way as validation_pipeline.
+
+    :param chunk: Number of objects to visit at a time (None = visit them all at once)
+    :param progress: Progress object for the walk, copies of which are yielded after each chunk of objects
+    :return: None
+    """
+    stores = [ErrorStore(errorstore.ignorelist, errorstore.fail_fast) for _ in validators]
+    timed = timings is not None
+    if not timed:
+        timings = [None] * len(validators)
+    visitors = [(validator, store, timing) for validator, store, timing in zip(validators, stores, timings)
+                if isinstance(validator, Visitor)]
+    try:
+        if processes and processes > 1:
+            sharded = [visitor for visitor in visitors if visitor[0].shardable]
+            if sharded:
+                yield partial(run_sharded, course, [validator for validator, _, _ in sharded],
+                              [store for _, store, _ in sharded], url_names, processes,
+                              timings=[timing for _, _, timing in sharded] if timed else None)
+                visitors = [visitor for visitor in visitors if not visitor[0].shardable]
+        for visited in walk(course, [(validator, store) for validator, store, _ in visitors], url_names,
+                            timings=[timing for _, _, timing in visitors] if timed else None, chunk=chunk):
+            if progress is not None:
+                yield Progress(progress.step, visited, progress.total,
+                               progress.errors + sum(len(store.errors) for store in stores))
+        for validator, store, timing in zip(validators, stores, timings):
+            if not isinstance(validator, Visitor):
+                yield partial(call_validator, validator, course, store, url_names, timing)
+    except ValidationAborted:
+        errorstore.truncated = True
+        raise
+    finally:
+        for store, timing in zip(stores, timings):
+            if timed:
+                timing.errors = len(store.errors)
+            errorstore.errors.extend(store.errors)
+
+def call_validator(validator, course, errorstore, url_names, timing=None):
+    """Calls a validator that isn't a visitor, timing it if a Timing is given"""
+    with measure(timing) if timing is not None else nullcontext():
+        validator(course, errorstore, url_names)
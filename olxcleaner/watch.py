@@ -0,0 +1,498 @@
+# -*- coding: utf-8 -*-
+"""
+watch.py
+
+Keeps a validated course in memory, and incrementally re-validates it as files change
+"""
+import os
+from collections import Counter
+from olxcleaner.errorstore import ErrorStore
+from olxcleaner.objects import EdxObject
+from olxcleaner.loader import load_course, load_policy
+from olxcleaner.loader.source import FileSystemSource
+from olxcleaner.loader.xml import read_course, parse_data, is_empty
+from olxcleaner.parser.policy import find_url_names, merge_policy, validate_grading_policy
+from olxcleaner.parser.validators import GlobalValidator
+from olxcleaner.parser.slowvalidators import SlowValidator
+
+class MemoryParseCache(object):
+    """
+    Keeps parsed files in memory, so that only files that have changed are parsed again.
+    Has the same interface as ParseCache.
+
+    When frozen, files are not checked for changes, and the stored results are returned,
+    so that the course can be read as it was when the files were last parsed.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.frozen = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def parse(self, source, filename, kind):
+        """
+        Parse a file, using the stored result if the file hasn't changed.
+
+        :param source: FileSystemSource to read the file from
+        :param filename: Name of the file to parse
+        :param kind: 'xml' or 'html'
+        :return: The root lxml element of the file
+        """
+        key = (filename, kind)
+        entry = self.entries.get(key)
+        if self.frozen and entry is not None:
+            signature = entry[0]
+        else:
+            signature = source.signature(filename)
+        if entry is not None and entry[0] == signature:
+            self.hits += 1
+            result = entry[1]
+        else:
+            self.misses += 1
+            try:
+                result = parse_data(source.read_bytes(filename), kind)
+            except Exception as e:
+                result = e
+            self.entries[key] = (signature, result)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+class CourseWatcher(object):
+    """
+    Validates a course, keeping the results of each step in memory. When poll() is called,
+    changed files are detected, and only the affected parts of the course are re-validated:
+
+      * Only files that have changed are parsed again
+      * Objects whose content comes from changed files are reloaded and spliced into the tree
+      * url_names are reconstructed
+      * Policy is merged into the new objects, which then validate themselves
+      * Global validators are re-run if the tree changed (or if static files were
+        added or removed, for those validators that check static files)
+
+    Changes to course.xml, the course file or the policy files, and the addition or removal
+    of files outside the static directory, cause the whole course to be re-validated
+    (although only the files that have changed are parsed again).
+    """
+
+    def __init__(self, filename, steps=8, ignore=None, workers=None):
+        """
+        :param filename: Location of course xml file or directory
+        :param steps: Number of validation steps to take (1 = first only, 8 = all)
+        :param ignore: List of errors to ignore
+        :param workers: Number of threads to use when loading the course (None or 1 = serial)
+        """
+        if os.path.isdir(filename):
+            self.directory, self.file = filename, "course.xml"
+        else:
+            self.directory, self.file = os.path.split(filename)
+        self.steps = steps
+        self.ignore = ignore if ignore else []
+        self.workers = workers
+        self.memo = MemoryParseCache()
+
+        self.course = None
+        self.url_names = None
+        self.policy = None
+        self.grading_policy = None
+        self.source = None
+        self.stats = {}
+
+        # Errors from each step of validation
+        self.load_errors = []
+        self.policy_errors = []
+        self.url_name_errors = []
+        self.merge_errors = {}       # {policy entry: (object merged into, errors)}
+        self.grading_errors = []
+        self.object_errors = {}      # {EdxObject: errors}
+        self.validator_errors = {}   # {validator class: errors}
+
+    @property
+    def errors(self):
+        """List of all current errors, in the order that validate() would report them"""
+        errors = self.load_errors + self.policy_errors + self.url_name_errors
+        for _, entry_errors in self.merge_errors.values():
+            errors.extend(entry_errors)
+        errors.extend(self.grading_errors)
+        if self.course is not None:
+            for edxobj in self.course.preorder():
+                errors.extend(self.object_errors.get(edxobj, []))
+        for validator_errors in self.validator_errors.values():
+            errors.extend(validator_errors)
+        return errors
+
+    @property
+    def errorstore(self):
+        """ErrorStore object containing all current errors"""
+        errorstore = ErrorStore(self.ignore)
+        errorstore.errors = self.errors
+        return errorstore
+
+    def validate(self):
+        """
+        Validate the whole course, parsing only files that have changed since they were last parsed.
+
+        :return: List of all errors
+        """
+        self.source, self.stats = snapshot(self.directory)
+
+        # Step 1: Load the course
+        errorstore = ErrorStore(self.ignore)
+        self.course = load_course(self.directory, self.file, errorstore, workers=self.workers,
+                                  cache=self.memo, source=self.source)
+        self.load_errors = errorstore.errors
+        self.policy_errors, self.url_name_errors, self.grading_errors = [], [], []
+        self.merge_errors, self.object_errors, self.validator_errors = {}, {}, {}
+        self.url_names = None
+        if not self.course:
+            return self.errors
+
+        if self.steps > 1:
+            # Step 2: Load the policy files
+            errorstore = ErrorStore(self.ignore)
+            self.policy, self.grading_policy = load_policy(self.directory, self.course, errorstore)
+            self.policy_errors = errorstore.errors
+
+        if self.steps > 4:
+            # Step 5: Validate grading policy
+            errorstore = ErrorStore(self.ignore)
+            validate_grading_policy(self.grading_policy, errorstore)
+            self.grading_errors = errorstore.errors
+
+        # Steps 3, 4, 6, 7 and 8
+        self._revalidate(set(self.course.preorder()), tree_changed=True, static_changed=True)
+
+        return self.errors
+
+    def poll(self):
+        """
+        Check for changed files, and re-validate the course if anything has changed.
+
+        :return: None if no files have changed, or (new errors, fixed errors, changed files)
+        """
+        old_errors = self.errors
+        source, stats = snapshot(self.directory)
+        changed = {name for name in stats if name in self.stats and stats[name] != self.stats[name]}
+        created = set(stats) - set(self.stats)
+        deleted = set(self.stats) - set(stats)
+        if not (changed or created or deleted):
+            return None
+
+        static = {name for name in created | deleted if name.startswith("static/")}
+        if (created | deleted) - static or not self._update(changed, bool(static), source):
+            self.validate()
+        else:
+            self.source, self.stats = source, stats
+            self.course.source = source
+
+        new_errors, fixed_errors = diff_errors(old_errors, self.errors)
+        return new_errors, fixed_errors, sorted(changed | created | deleted)
+
+    def _update(self, changed, static_changed, source):
+        """
+        Attempt to update the course incrementally.
+
+        :param changed: Set of files whose contents have changed
+        :param static_changed: Whether static files have been added or removed
+        :param source: FileSystemSource for the current state of the course directory
+        :return: False if the course needs to be validated from scratch
+        """
+        course = self.course
+        if course is None:
+            return False
+
+        # Changes to course.xml, the course file or the policy files need a full validation
+        if changed & (set(course.filenames) | object_targets(course)):
+            return False
+        if any(name.startswith("policies/") for name in changed):
+            return False
+        if static_changed and self.steps > 5 and course.attributes.get("course_image"):
+            # The course checks for the existence of its image
+            return False
+        # Check for static files in the current state of the course directory
+        course.source = source
+
+        # Find the objects that need to be reloaded
+        units = self._find_units(changed)
+        if units is None:
+            return False
+
+        # Replay loading the old versions of the objects to find the errors they produced
+        old_errors = []
+        self.memo.frozen = True
+        try:
+            for edxobj, element in units:
+                errorstore = ErrorStore(self.ignore)
+                read_course(EdxObject.get_object(edxobj.type), element, self.source, edxobj.filenames[0],
+                            errorstore, self._htmlfiles(edxobj), cache=self.memo)
+                old_errors.append(errorstore.errors)
+        finally:
+            self.memo.frozen = False
+
+        # Load the new versions of the objects
+        replacements = []
+        for (edxobj, element), unit_errors in zip(units, old_errors):
+            errorstore = ErrorStore(self.ignore)
+            newobj = EdxObject.get_object(edxobj.type)
+            read_course(newobj, element, source, edxobj.filenames[0],
+                        errorstore, self._htmlfiles(edxobj), cache=self.memo)
+
+            # If different HTML files are referenced, errors about duplicate
+            # HTML files may change elsewhere in the course
+            if html_references(edxobj) != html_references(newobj):
+                return False
+
+            replacements.append((edxobj, newobj, unit_errors, errorstore.errors))
+
+        # Splice the new objects into the tree
+        new_objects = set()
+        for edxobj, newobj, old_errors, new_errors in replacements:
+            edxobj.parent.replace_child(edxobj, newobj)
+            new_objects.update(all_objects(newobj))
+            self.load_errors = replace_errors(self.load_errors, old_errors, new_errors)
+
+        return self._revalidate(new_objects, tree_changed=bool(units), static_changed=static_changed)
+
+    def _find_units(self, changed):
+        """
+        Find the topmost objects whose content comes from the changed files, along with
+        the element that the loader read each of them from.
+
+        :param changed: Set of files whose contents have changed
+        :return: List of (EdxObject, lxml element), or None if an object can't be located
+        """
+        units = []
+        occurrences = Counter()
+        stack = list(reversed(self.course.children))
+        while stack:
+            edxobj = stack.pop()
+            source = object_source(edxobj)
+            key = (edxobj.filenames[0] if edxobj.filenames else None, edxobj.type, source)
+            occurrences[key] += 1
+            if changed.intersection(object_targets(edxobj)):
+                element = self._find_element(edxobj, source, occurrences[key])
+                if element is None:
+                    return None
+                units.append((edxobj, element))
+            else:
+                stack.extend(reversed(edxobj.children))
+        return units
+
+    def _find_element(self, edxobj, source, occurrence):
+        """
+        Find the element that an object was loaded from in the file containing its tag.
+        If several elements load the same file, the given occurrence is used.
+        """
+        if not edxobj.filenames or source is None:
+            return None
+        try:
+            root = self.memo.parse(self.source, edxobj.filenames[0], 'xml')
+        except Exception:  # pragma: no cover
+            return None
+        for element in root.iter(edxobj.type):
+            if element is not root and element_source(element) == source:
+                occurrence -= 1
+                if occurrence == 0:
+                    return element
+        return None
+
+    def _htmlfiles(self, unit):
+        """Reconstruct the dictionary of HTML files that are referenced before the given object is loaded"""
+        htmlfiles = {}
+        for edxobj in all_objects(self.course):
+            if edxobj is unit:
+                break
+            for name, filename in html_references(edxobj, recurse=False):
+                htmlfiles.setdefault(name, filename)
+        return htmlfiles
+
+    def _revalidate(self, new_objects, tree_changed, static_changed):
+        """
+        Run validation steps 3, 4, 6, 7 and 8 on a course whose tree may have changed.
+
+        :param new_objects: Set of objects that have not had policy merged into them or validated themselves
+        :param tree_changed: Whether the course tree has changed
+        :param static_changed: Whether static files have been added or removed
+        :return: False if the course needs to be validated from scratch
+        """
+        if self.steps > 2 and tree_changed:
+            # Step 3: Construct a dictionary of url_names
+            errorstore = ErrorStore(self.ignore)
+            self.url_names = find_url_names(self.course, errorstore)
+            self.url_name_errors = errorstore.errors
+
+        if self.steps > 3 and tree_changed:
+            # Step 4: Merge policy data into objects that it hasn't been merged into yet
+            if not self._merge_policy(new_objects):
+                return False
+
+        if self.steps > 5:
+            # Step 6: New objects validate themselves
+            object_errors = {}
+            for edxobj in self.course.preorder():
+                if edxobj in new_objects:
+                    errorstore = ErrorStore(self.ignore)
+                    edxobj.validate(self.course, errorstore)
+                    object_errors[edxobj] = errorstore.errors
+                elif edxobj in self.object_errors:
+                    object_errors[edxobj] = self.object_errors[edxobj]
+            self.object_errors = object_errors
+
+        validators = []
+        if self.steps > 6:
+            validators.extend(GlobalValidator.validators())
+        if self.steps > 7:
+            validators.extend(SlowValidator.validators())
+        for validator in validators:
+            # Steps 7 and 8: Re-run the global validators whose inputs have changed
+            if tree_changed or (static_changed and validator.static_files):
+                errorstore = ErrorStore(self.ignore)
+                validator(self.course, errorstore, self.url_names)
+                self.validator_errors[type(validator)] = errorstore.errors
+
+        return True
+
+    def _merge_policy(self, new_objects):
+        """
+        Merge policy entries into the objects they refer to, where this hasn't already been done.
+
+        :param new_objects: Set of objects that have not had policy merged into them
+        :return: False if policy has been merged into an object that it no longer refers to
+        """
+        if not isinstance(self.policy, dict):
+            if not self.merge_errors:
+                errorstore = ErrorStore(self.ignore)
+                merge_policy(self.policy, self.url_names, errorstore)
+                self.merge_errors[None] = (None, errorstore.errors)
+            return True
+
+        merge_errors = {}
+        for entry in self.policy:
+            target = self.url_names.get(entry.split("/", 1)[-1])
+            if entry in self.merge_errors:
+                old_target, entry_errors = self.merge_errors[entry]
+                if old_target is target:
+                    merge_errors[entry] = (target, entry_errors)
+                    continue
+                if old_target is not None and in_tree(old_target):
+                    # The entry was merged into an object that is still in the course
+                    return False
+            errorstore = ErrorStore(self.ignore)
+            merge_policy({entry: self.policy[entry]}, self.url_names, errorstore)
+            merge_errors[entry] = (target, errorstore.errors)
+        self.merge_errors = merge_errors
+        return True
+
+def snapshot(directory):
+    """
+    Records the size and modification time of every file in a course directory.
+
+    :param directory: Course directory
+    :return: FileSystemSource object, dictionary of {filename: (size, mtime)}
+    """
+    source = FileSystemSource(directory)
+    stats = {}
+    for filename in source.files:
+        try:
+            stat = os.stat(os.path.join(directory, filename))
+        except OSError:  # pragma: no cover
+            continue
+        stats[filename] = (stat.st_size, stat.st_mtime_ns)
+    return source, stats
+
+def error_key(error):
+    """Returns a key that identifies an error when comparing the results of validation runs"""
+    return error.name, error.filename, error.description
+
+def diff_errors(old_errors, new_errors):
+    """
+    Compares two lists of errors.
+
+    :param old_errors: Errors before a change
+    :param new_errors: Errors after a change
+    :return: List of errors that have appeared, list of errors that have gone away
+    """
+    old = Counter(error_key(error) for error in old_errors)
+    new = Counter(error_key(error) for error in new_errors)
+    return take_errors(new_errors, new - old), take_errors(old_errors, old - new)
+
+def take_errors(errors, counts):
+    """Returns the errors in a list whose keys appear in counts, up to the number of times that they appear"""
+    result = []
+    for error in errors:
+        key = error_key(error)
+        if counts[key] > 0:
+            counts[key] -= 1
+            result.append(error)
+    return result
+
+def replace_errors(errors, old_errors, new_errors):
+    """Removes old_errors from a list of errors, inserting new_errors where the first of them was"""
+    remove = Counter(error_key(error) for error in old_errors)
+    result = []
+    position = None
+    for error in errors:
+        key = error_key(error)
+        if remove[key] > 0:
+            remove[key] -= 1
+            if position is None:
+                position = len(result)
+            continue
+        result.append(error)
+    if position is None:
+        position = len(result)
+    return result[:position] + new_errors + result[position:]
+
+def all_objects(edxobj):
+    """Generates all objects in a tree in preorder, including broken objects"""
+    stack = [edxobj]
+    while stack:
+        edxobj = stack.pop()
+        yield edxobj
+        stack.extend(reversed(edxobj.children))
+
+def in_tree(edxobj):
+    """Returns True if the object is still attached to the tree of its course"""
+    while edxobj.parent is not None:
+        if not any(child is edxobj for child in edxobj.parent.children):
+            return False
+        edxobj = edxobj.parent
+    return True
+
+def html_references(edxobj, recurse=True):
+    """Returns a list of (HTML filename, referencing file) pairs for the HTML objects that were loaded in a tree"""
+    objects = all_objects(edxobj) if recurse else [edxobj]
+    return [(obj.attributes['filename'].replace(":", "/"), obj.filenames[-1])
+            for obj in objects if getattr(obj, 'html_content', False)]
+
+def object_source(edxobj):
+    """
+    Returns the file that the loader read (or tried to read) to obtain the content
+    of an object after reading its tag, or None if its content was in its tag.
+    """
+    if len(edxobj.filenames) > 1:
+        return edxobj.filenames[1]
+    if edxobj.broken and edxobj.is_pointer(edxobj.attributes):
+        # A pointer whose target couldn't be loaded
+        return edxobj.type + "/" + edxobj.attributes['url_name'].replace(":", "/") + ".xml"
+    if edxobj.type == "html" and 'filename' in edxobj.attributes:
+        return "html/" + edxobj.attributes['filename'].replace(":", "/") + ".html"
+    return None
+
+def object_targets(edxobj):
+    """Returns the files (other than the file containing its tag) that an object's content depends upon"""
+    targets = {object_source(edxobj)}
+    if edxobj.type == "html" and 'filename' in edxobj.attributes:
+        targets.add("html/" + edxobj.attributes['filename'].replace(":", "/") + ".html")
+    return targets
+
+def element_source(element):
+    """Returns the file that the loader will read after reading an element (see object_source)"""
+    edxobj = EdxObject.get_object(element.tag)
+    if is_empty(element) and edxobj.is_pointer(element.attrib):
+        return element.tag + "/" + element.attrib['url_name'].replace(":", "/") + ".xml"
+    if element.tag == "html" and 'filename' in element.attrib:
+        return "html/" + element.attrib['filename'].replace(":", "/") + ".html"
+    return None
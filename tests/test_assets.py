@@ -0,0 +1,159 @@
+"""
+test_assets.py
+
+Tests the static file reports
+"""
+import os
+import shutil
+import tarfile
+import zipfile
+from olxcleaner import validate
+from olxcleaner.utils import StaticIndex
+from olxcleaner.loader.source import MemorySource
+from olxcleaner.loader.archive import ArchiveSource
+from olxcleaner.assets import static_references, audit_static_assets, find_duplicate_assets, DigestCache
+from olxcleaner.reporting import report_static_assets, report_duplicate_assets
+
+def test_static_index(tmp_path):
+    directory = tmp_path / "course"
+    (directory / "static" / "images").mkdir(parents=True)
+    (directory / "static" / "a.png").write_bytes(b"a")
+    (directory / "static" / "images" / "b.png").write_bytes(b"b")
+    (directory / "static" / ".hidden").mkdir()
+    (directory / "static" / ".hidden" / "c.png").write_bytes(b"c")
+
+    index = StaticIndex(None, str(directory))
+    assert index.files == {"a.png", "images/b.png"}
+    assert index.exists("images/b.png")
+    assert not index.exists("b.png")
+    assert index.checked == {"images/b.png": True, "b.png": False}
+
+    # Results are remembered
+    (directory / "static" / "b.png").write_bytes(b"b")
+    assert not index.exists("b.png")
+
+def test_static_references():
+    course, _, _ = validate("testcourses/testcourse10")
+    references = static_references(course)
+    # The course image, links in content and drag and drop images are all references
+    assert "image.png" in references
+    assert {"testing.png", "testing2.css", "ex34_dnd.png", "ex34_dnd_label2.png"} <= references
+    assert not any(name.startswith("/") for name in references)
+
+def test_audit_static_assets(tmp_path):
+    directory = tmp_path / "course"
+    shutil.copytree("testcourses/testcourse10", str(directory))
+    (directory / "static" / "unused.pdf").write_bytes(b"pdf")
+    (directory / "static" / "Testing.png").write_bytes(b"png")
+
+    course, _, _ = validate(str(directory), steps=2)
+    unused, collisions = audit_static_assets(course)
+    assert unused == ["Testing.png", "unused.pdf"]
+    assert collisions == [["Testing.png", "testing.png"]]
+
+    assert report_static_assets(unused, collisions) == [
+        "Unused static files: 2",
+        "  - Testing.png",
+        "  - unused.pdf",
+        "Static file names that differ only in case: 1",
+        "  - Testing.png, testing.png",
+    ]
+
+    # A clean course has nothing to report
+    course, _, _ = validate("testcourses/testcourse10", steps=2)
+    assert audit_static_assets(course) == ([], [])
+
+def make_duplicates(directory):
+    """Adds static files to a copy of testcourse10: two pairs of identical files, and files of the same size"""
+    shutil.copytree("testcourses/testcourse10", str(directory))
+    static = directory / "static"
+    (static / "videos").mkdir()
+    (static / "lecture.mp4").write_bytes(b"v" * 5000)
+    (static / "videos" / "lecture copy.mp4").write_bytes(b"v" * 5000)
+    (static / "notes.pdf").write_bytes(b"p" * 300)
+    (static / "notes2.pdf").write_bytes(b"p" * 300)
+    (static / "other.pdf").write_bytes(b"q" * 300)
+    (static / "empty1.txt").write_bytes(b"")
+    (static / "empty2.txt").write_bytes(b"")
+
+def test_find_duplicate_assets(tmp_path):
+    directory = tmp_path / "course"
+    make_duplicates(directory)
+    course, _, _ = validate(str(directory), steps=2)
+    expected = [(5000, ["lecture.mp4", "videos/lecture copy.mp4"]), (300, ["notes.pdf", "notes2.pdf"])]
+    assert find_duplicate_assets(course, chunk_size=1024) == expected
+    assert find_duplicate_assets(course, workers=1) == expected
+
+    assert report_duplicate_assets(expected) == [
+        "Identical static files: 2 groups, 5,300 bytes could be saved",
+        "  - 5,000 bytes each: lecture.mp4, videos/lecture copy.mp4",
+        "  - 300 bytes each: notes.pdf, notes2.pdf",
+    ]
+
+    # Courses in memory are read through their source
+    files = {"course.xml": '<course url_name="run" org="org" course="course"/>',
+             "static/a.png": b"image", "static/b.png": b"image", "static/c.png": b"other"}
+    course, _, _ = validate(MemorySource(files), steps=1)
+    assert find_duplicate_assets(course) == [(5, ["a.png", "b.png"])]
+
+def test_digest_cache(tmp_path):
+    directory = tmp_path / "course"
+    make_duplicates(directory)
+    course, _, _ = validate(str(directory), steps=2)
+    cache_dir = str(tmp_path / "cache")
+
+    # Only files that share their size with another are hashed
+    cache = DigestCache(cache_dir)
+    first = find_duplicate_assets(course, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 5)
+
+    # Unchanged files are not hashed again
+    cache = DigestCache(cache_dir)
+    assert find_duplicate_assets(course, cache=cache) == first
+    assert (cache.hits, cache.misses) == (5, 0)
+
+    # Changed files are
+    (directory / "static" / "other.pdf").write_bytes(b"p" * 300)
+    os.utime(str(directory / "static" / "other.pdf"), ns=(0, 0))
+    cache = DigestCache(cache_dir)
+    assert find_duplicate_assets(course, cache=cache)[1] == (300, ["notes.pdf", "notes2.pdf", "other.pdf"])
+    assert (cache.hits, cache.misses) == (4, 1)
+
+    # A corrupt record is ignored
+    with open(os.path.join(cache_dir, DigestCache.filename), "wb") as f:
+        f.write(b"not a pickle")
+    assert DigestCache(cache_dir).digests == {}
+
+def test_find_duplicate_assets_in_archives(tmp_path, monkeypatch):
+    directory = tmp_path / "course"
+    make_duplicates(directory)
+    tarball, zipped = str(tmp_path / "course.tar.gz"), str(tmp_path / "course.zip")
+    with tarfile.open(tarball, "w:gz") as archive:
+        archive.add(str(directory), arcname="course")
+    shutil.make_archive(zipped[:-4], "zip", str(directory))
+    expected = [(5000, ["lecture.mp4", "videos/lecture copy.mp4"]), (300, ["notes.pdf", "notes2.pdf"])]
+
+    for path in (tarball, zipped):
+        course, _, _ = validate(path, steps=2)
+
+        # Sizes come from the index, and the files to hash are read in a single pass
+        opened = []
+        open_files = course.source.open_files
+        monkeypatch.setattr(course.source, "open_files", lambda names: opened.extend(names) or open_files(names))
+        monkeypatch.setattr(ArchiveSource, "read_bytes", None)
+        archive_opens = []
+        monkeypatch.setattr(tarfile, "open", counted(tarfile.open, archive_opens))
+        monkeypatch.setattr(zipfile, "ZipFile", counted(zipfile.ZipFile, archive_opens))
+
+        assert find_duplicate_assets(course) == expected
+        assert len(archive_opens) == 1
+        assert sorted(opened) == ["static/lecture.mp4", "static/notes.pdf", "static/notes2.pdf",
+                                  "static/other.pdf", "static/videos/lecture copy.mp4"]
+        monkeypatch.undo()
+
+def counted(function, calls):
+    """Wraps a function to record each call"""
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        return function(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,64 @@
+"""
+test_avalidate.py
+
+Tests validating courses from an asyncio event loop
+"""
+import asyncio
+from olxcleaner import validate, avalidate
+from olxcleaner.validate import Progress
+
+def run_loop(coroutine):
+    """Run a coroutine in a new event loop (asyncio.run requires Python 3.7)"""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+def test_avalidate():
+    async def run():
+        validation = avalidate("testcourses/testcourse10", chunk=4)
+        updates = [progress async for progress in validation]
+        return updates, await validation
+
+    updates, (course, errorstore, url_names) = run_loop(run())
+    expected, expected_errors, expected_url_names = validate("testcourses/testcourse10")
+    assert [error.description for error in errorstore.errors] == \
+           [error.description for error in expected_errors.errors]
+    assert set(url_names) == set(expected_url_names)
+    assert course.attributes == expected.attributes
+
+    assert all(isinstance(progress, Progress) for progress in updates)
+    assert [progress.step for progress in updates if progress.objects is None] == [1, 2, 3, 4, 5, 8]
+    walk = [progress.objects for progress in updates if progress.objects is not None]
+    assert walk == [4, 8, 12, 15]
+    assert updates[-1].total == 15
+    assert updates[-1].errors == len(errorstore.errors)
+
+def test_avalidate_concurrent():
+    async def run():
+        return await asyncio.gather(*(avalidate(f"testcourses/testcourse{number}", chunk=2)
+                                      for number in (1, 7, 9, 10)))
+
+    for number, (_, errorstore, _) in zip((1, 7, 9, 10), run_loop(run())):
+        _, expected, _ = validate(f"testcourses/testcourse{number}")
+        assert [error.description for error in errorstore.errors] == \
+               [error.description for error in expected.errors]
+
+def test_avalidate_cancel():
+    async def run():
+        validation = avalidate("testcourses/testcourse10", chunk=1)
+        async for progress in validation:
+            if progress.objects == 3:
+                validation.cancel()
+        try:
+            await validation
+        except asyncio.CancelledError:
+            return validation
+        raise AssertionError("Validation was not cancelled")  # pragma: no cover
+
+    validation = run_loop(run())
+    assert validation.done()
+    _, expected, _ = validate("testcourses/testcourse10")
+    # The walk stopped part way through
+    assert len(validation.errorstore.errors) < len(expected.errors)
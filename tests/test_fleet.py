@@ -0,0 +1,61 @@
+"""
+test_fleet.py
+
+Tests validating many courses at once
+"""
+import os
+from olxcleaner import fleet
+from olxcleaner.fleet import find_courses, validate_many, summarize_fleet, course_size
+
+COURSES = ["testcourses/testcourse1", "testcourses/testcourse7", "testcourses/testcourse10", "testcourses/nocourse"]
+
+def test_find_courses(tmp_path):
+    manifest = tmp_path / "courses.txt"
+    manifest.write_text("# Courses to validate\ncourse1\n\n/abs/course2.tar.gz\n")
+    assert find_courses(str(manifest)) == [os.path.join(str(tmp_path), "course1"), "/abs/course2.tar.gz"]
+    assert find_courses("testcourses/testcourse1*") == ["testcourses/testcourse1", "testcourses/testcourse10",
+                                                         "testcourses/testcourse11"]
+
+def test_validate_many():
+    serial = list(validate_many(COURSES, jobs=1, steps=8))
+    # Largest course first
+    assert [result["course"] for result in serial] == sorted(COURSES, key=course_size, reverse=True)
+
+    pooled = list(validate_many(COURSES, jobs=2, max_tasks=1, steps=8))
+    assert len({result["pid"] for result in pooled}) == len(COURSES)
+    by_course = {result["course"]: result for result in pooled}
+    for result in serial:
+        assert by_course[result["course"]]["errors"] == result["errors"]
+        assert by_course[result["course"]]["summary"] == result["summary"]
+
+    summary = summarize_fleet(serial)
+    assert summary["courses"] == 4
+    assert summary["loaded"] == 3
+    assert summary["failed"] == sorted(COURSES)
+    assert summary["error_names"]["CourseXMLDoesNotExist"] == 1
+    assert summary["errors"]["ERROR"] == sum(sum(result["summary"].get("ERROR", {}).values()) for result in serial)
+    assert summarize_fleet(serial, 4)["failed"] == ["testcourses/nocourse"]
+
+def test_validate_many_processes():
+    """Each worker can validate its courses in a pool of processes of its own"""
+    courses = ["testcourses/testcourse10", "testcourses/testcourse11"]
+    serial = {result["course"]: result for result in validate_many(courses, jobs=1, steps=8)}
+    results = list(validate_many(courses, jobs=2, steps=8, processes=2))
+    assert [result["exception"] for result in results] == [None, None]
+    for result in results:
+        assert result["errors"] == serial[result["course"]]["errors"]
+
+def test_validate_many_worker_dies(monkeypatch):
+    validate = fleet.validate
+
+    def crash(filename, **kwargs):
+        if filename == "testcourses/testcourse7":
+            os._exit(3)
+        return validate(filename, **kwargs)
+
+    # Workers are forked, and inherit the patched function
+    monkeypatch.setattr(fleet, "validate", crash)
+    results = {result["course"]: result for result in validate_many(COURSES, jobs=2, steps=2)}
+    assert set(results) == set(COURSES)
+    assert results["testcourses/testcourse7"]["exception"] == "Worker process exited with code 3"
+    assert results["testcourses/testcourse10"]["loaded"]
@@ -0,0 +1,37 @@
+"""
+test_index.py
+
+Tests for the columnar course index
+"""
+from collections import Counter
+from olxcleaner import validate
+from olxcleaner.utils import traverse
+
+def test_index_matches_tree():
+    """The index describes the same objects as traversing the tree"""
+    for course_name in ["testcourse1", "testcourse8", "testcourse9", "testcourse10"]:
+        course, _, _ = validate(f"testcourses/{course_name}", steps=4)
+        index = course.build_index()
+        objects = list(traverse(course))
+        assert list(index.objects) == objects
+        positions = {id(obj): i for i, obj in enumerate(objects)}
+
+        for i, obj in enumerate(objects):
+            assert index.types[index.type_codes[i]] == obj.type
+            assert index.parents[i] == (-1 if i == 0 else positions[id(obj.parent)])
+            assert index.depths[i] == (0 if i == 0 else index.depths[index.parents[i]] + 1)
+            assert [index.objects[j] for j in index.subtree(i)] == list(traverse(obj))
+            assert [index.objects[j] for j in index.children(i)] == [child for child in obj.children
+                                                                     if not child.broken]
+            assert index.url_name(i) == obj.attributes.get('url_name')
+            assert index.display_name(i) == obj.attributes.get('display_name')
+            assert index.count_types(i) == Counter(child.type for child in traverse(obj))
+            assert [index.objects[j] for j in index.find('problem', i)] == [child for child in traverse(obj)
+                                                                           if child.type == 'problem']
+            if 'url_name' in obj.attributes:
+                assert index.objects[index.lookup(obj.attributes['url_name'])].attributes['url_name'] == \
+                    obj.attributes['url_name']
+
+        assert index.lookup("nosuchurlname") == -1
+        assert index.find("nosuchtag") == []
+        assert index.type_codes.readonly
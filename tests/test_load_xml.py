@@ -3,11 +3,20 @@ test_load_xml.py
 
 Tests for XML course loading
 """
+import os
+import sys
+import shutil
+import pytest
 from lxml import etree
 from tests.helpers import assert_error, assert_caught_all_errors
 
 from olxcleaner.loader.xml import load_course
+from olxcleaner.objects import EdxObject
+from olxcleaner.loader.cache import ParseCache
+from olxcleaner.loader.source import MemorySource
 from olxcleaner.errorstore import ErrorStore
+from olxcleaner.reporting import construct_tree
+from olxcleaner.utils import traverse
 from olxcleaner.loader.xml_exceptions import (
     CourseXMLDoesNotExist,
     InvalidXML,
@@ -97,3 +106,195 @@ def test_course3():
     course = load_course("testcourses/testcourse3", "course.xml", errorstore)
     assert_error(errorstore, InvalidXML, 'course.xml', 'attributes construct error, line 1, column 61')
     assert_caught_all_errors(errorstore)
+
+def test_parallel_loading():
+    """Make sure that loading with a thread pool gives identical results to loading serially"""
+    for directory, filename in [("testcourses/testcourse2", "coursefile.xml"),
+                                ("testcourses/testcourse9", "course.xml"),
+                                ("testcourses/testcourse10", "course.xml")]:
+        serial_errors = ErrorStore()
+        serial = load_course(directory, filename, serial_errors)
+        parallel_errors = ErrorStore()
+        parallel = load_course(directory, filename, parallel_errors, workers=4)
+
+        assert construct_tree(parallel) == construct_tree(serial)
+        assert ([(type(e), e.filename, e.description) for e in parallel_errors.errors] ==
+                [(type(e), e.filename, e.description) for e in serial_errors.errors])
+
+def test_lazy_content():
+    """Make sure that lazily-loaded content is identical to content that is loaded up front"""
+    for directory, filename in [("testcourses/testcourse2", "coursefile.xml"),
+                                ("testcourses/testcourse9", "course.xml"),
+                                ("testcourses/testcourse10", "course.xml")]:
+        eager_errors = ErrorStore()
+        eager = load_course(directory, filename, eager_errors)
+        lazy_errors = ErrorStore()
+        lazy = load_course(directory, filename, lazy_errors, lazy=True)
+
+        assert construct_tree(lazy) == construct_tree(eager)
+        assert ([(type(e), e.filename, e.description) for e in lazy_errors.errors] ==
+                [(type(e), e.filename, e.description) for e in eager_errors.errors])
+
+        eager_objects, lazy_objects = list(traverse(eager)), list(traverse(lazy))
+        assert len(eager_objects) == len(lazy_objects)
+        for eager_obj, lazy_obj in zip(eager_objects, lazy_objects):
+            if not eager_obj.content_store:
+                continue
+            assert lazy_obj._content is None
+            expected = None if eager_obj.content is None else etree.tostring(eager_obj.content)
+            actual = None if lazy_obj.content is None else etree.tostring(lazy_obj.content)
+            assert actual == expected
+            if lazy_obj.content_ref is not None:
+                assert lazy_obj._content is not None
+                lazy_obj.release_content()
+                assert lazy_obj._content is None
+                assert etree.tostring(lazy_obj.content) == expected
+
+def test_source():
+    """Make sure that the course source records the files in the course directory"""
+    errorstore = ErrorStore()
+    course = load_course("testcourses/testcourse10", "course.xml", errorstore)
+    source = course.source
+    assert source.exists("course.xml")
+    assert source.exists("html/linktest.html")
+    assert source.exists("static/image.png")
+    assert source.exists("static/../static/./image.png")
+    assert not source.exists("static")
+    assert not source.exists("static/nothere.png")
+    assert "static" in source.directories
+    assert "policies/mycourseurl" in source.directories
+    assert source.listdir("static") == ["ex34_dnd_label2.png", "ex34_dnd_label3.png", "image.png"]
+    assert source.listdir("policies") == ["mycourseurl"]
+    assert source.listdir("nothere") == []
+    assert source.read_bytes("course.xml").startswith(b"<course")
+    # Paths outside the course directory fall back to the filesystem
+    assert source.exists("../testcourse1/course.xml")
+
+def test_memory_source():
+    """Make sure that a course held in memory loads the same as the same course on disk"""
+    files = {}
+    for path, _, filenames in os.walk("testcourses/testcourse9"):
+        for name in filenames:
+            fullpath = os.path.join(path, name)
+            with open(fullpath, 'rb') as f:
+                files[os.path.relpath(fullpath, "testcourses/testcourse9")] = f.read()
+    source = MemorySource(files)
+    assert source.listdir() == ["chapter", "course", "course.xml", "discussion", "html", "lti", "policies",
+                                "problem", "sequential", "vertical", "video"]
+    assert source.exists("./problem/problem.xml")
+
+    disk_errors = ErrorStore()
+    disk = load_course("testcourses/testcourse9", "course.xml", disk_errors)
+    memory_errors = ErrorStore()
+    memory = load_course(None, "course.xml", memory_errors, source=source)
+    assert construct_tree(memory) == construct_tree(disk)
+    assert ([(type(e), e.filename, e.description) for e in memory_errors.errors] ==
+            [(type(e), e.filename, e.description) for e in disk_errors.errors])
+
+def test_parse_cache(tmp_path):
+    """Make sure that loading through the parse cache gives identical results"""
+    expected_errors = ErrorStore()
+    expected = load_course("testcourses/testcourse2", "coursefile.xml", expected_errors)
+
+    for strict in [False, True]:
+        cache = ParseCache(str(tmp_path / f"cache{strict}"), strict=strict, min_size=0)
+        for run in range(2):
+            errorstore = ErrorStore()
+            course = load_course("testcourses/testcourse2", "coursefile.xml", errorstore, cache=cache)
+            assert construct_tree(course) == construct_tree(expected)
+            assert ([(type(e), e.filename, e.description) for e in errorstore.errors] ==
+                    [(type(e), e.filename, e.description) for e in expected_errors.errors])
+            if run == 0:
+                misses = cache.misses
+        # Everything read on the second run came from the cache
+        assert cache.misses == misses > 0
+
+        # Evict everything
+        cache.max_size = 0
+        cache.evict()
+        assert cache.evictions == cache.misses
+        assert os.listdir(cache.directory) == []
+
+def test_parse_cache_html_only(tmp_path, monkeypatch):
+    """Only large HTML files are cached, and restoring them doesn't use the HTML parser"""
+    directory = tmp_path / "course"
+    shutil.copytree("testcourses/testcourse10", str(directory))
+    large = "<div>" + "<p>Some <b>text</b></p>" * 500 + "</div>"
+    namespaced = '<div xmlns:m="http://www.w3.org/1998/Math/MathML">' + "<p>x</p>" * 1000 + "</div>"
+    for name, text in (("large", large), ("namespaced", namespaced)):
+        (directory / "html" / f"{name}.xml").write_text(f'<html filename="{name}" display_name="Text"/>')
+        (directory / "html" / f"{name}.html").write_text(text)
+    vertical = directory / "vertical" / "dnd2vert.xml"
+    vertical.write_text(vertical.read_text().replace("</vertical>", '<html url_name="large"/><html url_name="namespaced"/></vertical>'))
+    parsed = []
+    html_parser = etree.HTMLParser
+    monkeypatch.setattr(etree, "HTMLParser", lambda **kwargs: parsed.append(kwargs) or html_parser(**kwargs))
+    expected = construct_tree(load_course(str(directory), "course.xml", ErrorStore()))
+    uncached = len(parsed)
+
+    cache = ParseCache(str(tmp_path / "cache"))
+    assert construct_tree(load_course(str(directory), "course.xml", ErrorStore(), cache=cache)) == expected
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert len(os.listdir(cache.directory)) == 2
+
+    # The large file is restored with the XML parser; the namespaced file must be parsed again
+    del parsed[:]
+    cache = ParseCache(str(tmp_path / "cache"))
+    course = load_course(str(directory), "course.xml", ErrorStore(), cache=cache)
+    assert construct_tree(course) == expected
+    assert (cache.hits, cache.misses) == (2, 0)
+    assert len(parsed) == uncached - 1
+
+def test_plugin_objects(tmp_path, monkeypatch):
+    """Object types can be provided by plugins, which are imported when their tag is first seen"""
+    (tmp_path / "olxcleaner_testplugin.py").write_text(
+        "from olxcleaner.objects.common import EdxContent\n"
+        "class EdxTestBlock(EdxContent):\n"
+        "    type = 'testblock'\n"
+        "    display_name = True\n"
+        "    def validate(self, course, errorstore):\n"
+        "        pass\n"
+        "class EdxFakeHTML(EdxContent):\n"
+        "    type = 'html'\n"
+        "    def validate(self, course, errorstore):\n"
+        "        pass\n")
+    distinfo = tmp_path / "olxcleaner_testplugin-1.0.dist-info"
+    distinfo.mkdir()
+    (distinfo / "METADATA").write_text("Metadata-Version: 2.1\nName: olxcleaner-testplugin\nVersion: 1.0\n")
+    (distinfo / "entry_points.txt").write_text(
+        "[olxcleaner.objects]\ntestblock = olxcleaner_testplugin:EdxTestBlock\n"
+        "fakehtml = olxcleaner_testplugin:EdxFakeHTML\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(EdxObject, "_registry", dict(EdxObject._registry))
+    monkeypatch.setattr(EdxObject, "_plugins", None)
+
+    assert "testblock" in EdxObject.plugin_tags()
+    assert "olxcleaner_testplugin" not in sys.modules
+    monkeypatch.delitem(sys.modules, "olxcleaner_testplugin", raising=False)
+
+    source = MemorySource({
+        "course.xml": '<course url_name="run" org="org" course="course"/>',
+        "course/run.xml": '<course><chapter display_name="C"><sequential display_name="S">'
+                          '<vertical display_name="V"><testblock display_name="T"><p>Hi</p></testblock>'
+                          '</vertical></sequential></chapter></course>'})
+    errorstore = ErrorStore()
+    course = load_course(None, "course.xml", errorstore, source=source)
+    assert_caught_all_errors(errorstore)
+    block = course.children[0].children[0].children[0].children[0]
+    assert block.type == "testblock"
+    assert type(block).__name__ == "EdxTestBlock"
+    assert block.content.find("p").text == "Hi"
+
+    with pytest.raises(ValueError):
+        EdxObject.get_object("nosuchblock")
+
+    # Importing a plugin doesn't replace built-in tags, and a rejected plugin isn't registered
+    html = EdxObject._registry["html"]
+    assert html.__module__ == "olxcleaner.objects.html"
+    with pytest.raises(ValueError):
+        EdxObject.get_object("fakehtml")
+    assert "fakehtml" not in EdxObject._registry
+    assert EdxObject._registry["html"] is html
+    with pytest.raises(ValueError):
+        EdxObject.register(sys.modules["olxcleaner_testplugin"].EdxFakeHTML)
+    assert type(EdxObject.get_object("html")) is html
@@ -7,7 +7,8 @@ from olxcleaner.validate import validate
 from olxcleaner.reporting import (construct_tree,
                                   report_statistics,
                                   report_error_summary,
-                                  report_errors)
+                                  report_errors,
+                                  report_profile)
 
 def test_construct_tree():
     course, _, _ = validate("testcourses/testcourse1")
@@ -227,3 +228,12 @@ def test_error_level_reporting():
     assert errorstore.return_error(2)
     assert errorstore.return_error(3)
     assert not errorstore.return_error(4)
+
+def test_report_profile():
+    _, errorstore, _ = validate("testcourses/testcourse10", 3, profile=True)
+    report = report_profile(errorstore.profile)
+    assert len(report) == 5
+    assert report[0].split() == ["Step", "Wall", "(s)", "CPU", "(s)", "Objects", "Errors"]
+    assert report[1].split()[:3] == ["1:", "Load", "course"]
+    assert report[1].split()[-2:] == ["15", "1"]
+    assert report[4].split()[0] == "Total"
@@ -0,0 +1,121 @@
+"""
+test_server.py
+
+Tests the validation server
+"""
+import os
+import json
+import socket
+import shutil
+import threading
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from olxcleaner import validate
+from olxcleaner.server import ValidationService, make_server
+from olxcleaner.reporting import describe_errors
+from tests.test_watch import edit
+
+@contextmanager
+def running(server):
+    """Runs a server in a thread"""
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+def post(address, request):
+    """Makes a validation request over HTTP, returning the response code and result"""
+    data = json.dumps(request).encode("utf-8") if not isinstance(request, bytes) else request
+    try:
+        with urllib.request.urlopen(f"http://{address[0]}:{address[1]}/validate", data) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+def test_service(tmp_path):
+    directory = str(tmp_path / "course")
+    shutil.copytree("testcourses/testcourse9", directory)
+    service = ValidationService(max_courses=1)
+
+    first = service.validate({"path": directory})
+    assert first["loaded"] and not first["warm"]
+    _, errorstore, _ = validate(directory)
+    assert first["errors"] == describe_errors(errorstore.errors)
+
+    second = service.validate({"path": directory})
+    assert second["warm"]
+    assert second["errors"] == first["errors"]
+
+    # Changed files are picked up
+    edit(os.path.join(directory, "problem/problem.xml"), "</problem>", "</problm>")
+    third = service.validate({"path": directory})
+    assert third["warm"]
+    assert "InvalidXML" in third["summary"]["ERROR"]
+
+    # Different options are validated separately, and only max_courses are kept
+    fourth = service.validate({"path": directory, "ignore": ["InvalidXML"]})
+    assert not fourth["warm"]
+    assert "InvalidXML" not in fourth["summary"].get("ERROR", {})
+    assert service.status() == {"courses": [{"path": os.path.realpath(directory), "steps": 8,
+                                             "ignore": ["InvalidXML"]}]}
+
+    # Missing courses are reported, but not kept
+    missing = service.validate({"path": "testcourses/nocourse"})
+    assert not missing["loaded"]
+    assert missing["summary"] == {"ERROR": {"CourseXMLDoesNotExist": 1}}
+    assert len(service.status()["courses"]) == 1
+
+    # Invalid requests are rejected
+    for request in ({"steps": 8}, {"path": 1}, [directory]):
+        assert service.validate(request) == {"error": "A request must be an object with the path of a course"}
+    for steps in (0, 9, True, 1.0, "8", None):
+        assert service.validate({"path": directory, "steps": steps}) == {
+            "error": "steps must be an integer between 1 and 8"}
+    for ignore in ("InvalidXML", ["InvalidXML", 1], [1, 2], [None], [["InvalidXML"]], {"InvalidXML": 1}, ""):
+        assert service.validate({"path": directory, "ignore": ignore}) == {
+            "error": "ignore must be a list of error names"}
+    assert len(service.status()["courses"]) == 1
+
+def test_http_server():
+    with running(make_server(ValidationService(), port=0)) as server:
+        address = server.server_address
+        code, first = post(address, {"path": "testcourses/testcourse10", "steps": 4})
+        assert code == 200 and not first["warm"]
+        code, second = post(address, {"path": "testcourses/testcourse10", "steps": 4})
+        assert code == 200 and second["warm"]
+        assert second["errors"] == first["errors"]
+
+        assert post(address, b"not json") == (400, {"error": "Invalid JSON"})
+        for request in ({"steps": 0}, {"steps": True}, {"steps": 4.0}, {"ignore": ["X", 1]}, {"ignore": [{}]}):
+            request["path"] = "testcourses/testcourse10"
+            code, result = post(address, request)
+            assert code == 400 and "error" in result
+
+        with urllib.request.urlopen(f"http://{address[0]}:{address[1]}/status") as response:
+            assert json.load(response)["courses"][0]["steps"] == 4
+
+def test_socket_server(tmp_path):
+    path = str(tmp_path / "olxcleaner.sock")
+    with running(make_server(ValidationService(), socket_path=path)):
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(path)
+            stream = client.makefile("rwb")
+            for request in (b'{"path": "testcourses/testcourse1"}\n', b'{"path": "testcourses/testcourse1"}\n',
+                            b'nonsense\n', b'{"path": "testcourses/testcourse1", "ignore": ["X", 1]}\n',
+                            b'{"path": "testcourses/testcourse1", "steps": true}\n',
+                            b'{"path": "testcourses/testcourse1"}\n'):
+                stream.write(request)
+                stream.flush()
+            results = [json.loads(stream.readline()) for _ in range(6)]
+    assert [result.get("warm") for result in results[:2]] == [False, True]
+    assert results[0]["errors"] == results[1]["errors"]
+    assert results[2] == {"error": "Invalid JSON"}
+    assert results[3] == {"error": "ignore must be a list of error names"}
+    assert results[4] == {"error": "steps must be an integer between 1 and 8"}
+    # The connection is still answered after invalid requests
+    assert results[5]["warm"]
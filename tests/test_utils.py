@@ -0,0 +1,124 @@
+"""
+test_utils.py
+
+Tests for utility routines
+"""
+from olxcleaner import validate
+from olxcleaner.objects import EdxObject
+from lxml import etree
+from olxcleaner.utils import traverse, scan_links
+
+def test_traverse_order():
+    """Objects are generated in preorder, skipping broken objects and their children"""
+    course = EdxObject.get_object('course')
+    chapter1 = EdxObject.get_object('chapter')
+    chapter2 = EdxObject.get_object('chapter')
+    sequential1 = EdxObject.get_object('sequential')
+    sequential2 = EdxObject.get_object('sequential')
+    sequential3 = EdxObject.get_object('sequential')
+    vertical = EdxObject.get_object('vertical')
+    course.add_child(chapter1)
+    course.add_child(chapter2)
+    chapter1.add_child(sequential1)
+    chapter1.add_child(sequential2)
+    chapter2.add_child(sequential3)
+    sequential1.add_child(vertical)
+    assert list(traverse(course)) == [course, chapter1, sequential1, vertical, sequential2, chapter2, sequential3]
+
+    sequential1.broken = True
+    assert list(traverse(course)) == [course, chapter1, sequential2, chapter2, sequential3]
+
+    course.broken = True
+    assert list(traverse(course)) == []
+
+def test_traverse_deep():
+    """Traversal does not depend on recursion"""
+    root = EdxObject.get_object('vertical')
+    current = root
+    for _ in range(10000):
+        child = EdxObject.get_object('vertical')
+        current.add_child(child)
+        current = child
+    assert sum(1 for _ in traverse(root)) == 10001
+
+def test_tree_cache():
+    """The cached views of a course are rebuilt when the tree changes"""
+    course, errorstore, url_names = validate("testcourses/testcourse10")
+    cache = course.tree_cache()
+    assert course.tree_cache() is cache
+    assert course.preorder() == list(traverse(course))
+    assert course.objects_of_type('problem') == [obj for obj in traverse(course) if obj.type == 'problem']
+    assert course.objects_of_type('nothing') == []
+    assert cache.of_types(['vertical', 'problem']) == [obj for obj in traverse(course)
+                                                       if obj.type in ('vertical', 'problem')]
+    assert all(url_names[name] is course.find_url_name(name) for name in url_names)
+    assert course.find_url_name('nothing') is None
+    assert course.objects_in_file('course.xml')[0] is course
+    for edxobj in course.preorder():
+        assert all(edxobj in course.objects_in_file(filename) for filename in edxobj.filenames)
+
+    # Adding or replacing objects invalidates the views
+    chapter = course.children[0]
+    problem = EdxObject.get_object('problem')
+    chapter.children[0].children[0].add_child(problem)
+    assert course.tree_cache() is not cache
+    assert problem in course.objects_of_type('problem')
+    replacement = EdxObject.get_object('problem')
+    problem.parent.replace_child(problem, replacement)
+    assert replacement.parent is not None
+    assert problem not in course.preorder()
+    assert replacement in course.preorder()
+
+    # As does marking objects as broken, or removing them
+    replacement.broken = True
+    assert replacement not in course.preorder()
+    vertical = chapter.children[0].children[0]
+    count = len(course.preorder())
+    removed = vertical.children[0]
+    vertical.remove_child(removed)
+    assert removed.parent is None
+    assert len(course.preorder()) == count - len(list(traverse(removed)))
+
+    # Changes to other courses don't
+    cache = course.tree_cache()
+    other, _, _ = validate("testcourses/testcourse10")
+    other.children[0].add_child(EdxObject.get_object('sequential'))
+    other.children[0].broken = True
+    assert course.tree_cache() is cache
+
+def test_scan_links():
+    """Internal links are found in document order, with their line numbers"""
+    node = etree.fromstring(b"""<html>
+<p><a href="/static/a.png"><img src="/course/courseware/x" alt="/static/no"/></a></p>
+<!-- <a href="/static/comment.png"/> -->
+<a href="https://example.com/static/"/><a link="/jump_to_id/y" href="/static/b.png"/>
+<x preprocessorSrc="/static/c.js" icon="" img="/static/d.png"/>
+</html>""")
+    assert scan_links(node) == ["/static/a.png", "/course/courseware/x", "/jump_to_id/y", "/static/b.png",
+                                "/static/c.js", "/static/d.png"]
+    assert [line for _, line in scan_links(node, lines=True)] == [2, 2, 4, 4, 5, 5]
+
+def test_compact_objects():
+    """Objects have no instance dictionary, and share copies of attribute names and values"""
+    for tag in ['course', 'chapter', 'sequential', 'vertical', 'html', 'problem', 'video', 'discussion',
+                'lti', 'lti_consumer', 'drag-and-drop-v2', 'openassessment']:
+        edxobj = EdxObject.get_object(tag)
+        assert not hasattr(edxobj, '__dict__')
+        assert edxobj.broken is False
+        assert edxobj.parent is None
+
+    first = EdxObject.get_object('problem')
+    second = EdxObject.get_object('problem')
+    first.add_attribs({''.join(['max_', 'attempts']): ''.join(['fini', 'shed'])})
+    second.add_attribs({''.join(['max_', 'attempts']): ''.join(['fini', 'shed'])})
+    first.add_filename(''.join(['problem/', 'p.xml']))
+    second.add_filename(''.join(['problem/', 'p.xml']))
+    assert list(first.attributes)[0] is list(second.attributes)[0]
+    assert first.attributes['max_attempts'] is second.attributes['max_attempts']
+    assert first.filenames[0] is second.filenames[0]
+
+    # Long and unique values aren't shared
+    first.add_attribs({'display_name': ''.join(['Pro', 'blem']), 'hint': ''.join(['x' * 60, 'y' * 5])})
+    second.add_attribs({'display_name': ''.join(['Pro', 'blem']), 'hint': ''.join(['x' * 60, 'y' * 5])})
+    assert first.attributes['display_name'] is not second.attributes['display_name']
+    assert first.attributes['hint'] is not second.attributes['hint']
@@ -3,13 +3,30 @@ test_validate.py
 
 Tests the full validation pipeline
 """
+import os
+import pickle
+import shutil
+import builtins
+import tarfile
+import zipfile
+import multiprocessing
+from types import SimpleNamespace
+from lxml import etree
 from olxcleaner import validate
+from olxcleaner.loader.source import MemorySource
+from olxcleaner.objects import EdxObject
+from olxcleaner.parser import shards
+from olxcleaner.parser.schedule import plan
+from olxcleaner.exceptions import ErrorLevel
+from olxcleaner.reporting import compute_statistics
+from olxcleaner.utils import traverse
 from tests.helpers import assert_caught_all_errors, assert_error
 from tests.test_load_xml import handle_course2_errors, handle_nocourse_errors
 from tests.test_load_policy import handle_course1_errors
 from tests.test_parser import handle_course7_errors
 from tests.test_validators import (handle_discussion_id_errors_in_10, handle_display_name_errors_in_10,
                                    handle_general_errors_in_10, handle_link_errors_in_10)
+from olxcleaner.loader.xml_exceptions import CourseXMLDoesNotExist
 from olxcleaner.parser.parser_exceptions import (InvalidSetting, DateOrdering, MissingURLName,
                                                  Obsolete, LTIError, MissingFile)
 
@@ -87,8 +104,265 @@ def test_validate_course9():
 def test_validate_course10():
     """This test includes all validation steps. The course is designed to test the validators and slow validators."""
     course, errorstore, url_names = validate("testcourses/testcourse10")
+    # Links are checked in document order, and errors in the file with the link record its line
+    assert [(error.filename, error.line) for error in errorstore.errors if error.line is not None] == \
+           [('vertical/dndvert.xml', 5), ('vertical/dndvert.xml', 6), ('vertical/dndvert.xml', 18)]
     handle_general_errors_in_10(errorstore)
     handle_display_name_errors_in_10(errorstore)
     handle_discussion_id_errors_in_10(errorstore)
     handle_link_errors_in_10(errorstore)
     assert_caught_all_errors(errorstore)
+
+def test_validate_course11():
+    """Objects in several chapters compare their dates against the course dates"""
+    course, errorstore, url_names = validate("testcourses/testcourse11")
+    file = 'course/mycourseurl.xml'
+    assert_error(errorstore, DateOrdering, file, "The tag <sequential url_name='sequential1' display_name='Early sequential'> has a date out of order: start date cannot be before course start date")
+    assert_error(errorstore, DateOrdering, file, "The tag <chapter url_name='chapter2' display_name='Second chapter'> has a date out of order: start date cannot be before course start date")
+    assert_error(errorstore, DateOrdering, file, "The tag <sequential url_name='sequential2' display_name='Late sequential'> has a date out of order: due date must be before course end date")
+    assert_error(errorstore, DateOrdering, file, "The tag <vertical url_name='vertical2' display_name='Late vertical'> has a date out of order: start date must be before course end date")
+    assert_error(errorstore, DateOrdering, file, "The tag <problem url_name='problem2' display_name='Late problem'> has a date out of order: due date must be before course end date")
+    assert_caught_all_errors(errorstore)
+
+def test_validate_archive(tmp_path):
+    """Courses can be validated straight out of a .tar.gz or .zip export"""
+    tarball = str(tmp_path / "course.tar.gz")
+    with tarfile.open(tarball, "w:gz") as archive:
+        # Studio exports put the course in a top-level directory
+        archive.add("testcourses/testcourse10", arcname="course")
+    zipped = str(tmp_path / "course.zip")
+    with zipfile.ZipFile(zipped, "w") as archive:
+        for path, _, files in os.walk("testcourses/testcourse10"):
+            for name in files:
+                fullpath = os.path.join(path, name)
+                archive.write(fullpath, os.path.relpath(fullpath, "testcourses/testcourse10"))
+
+    for filename in [tarball, zipped]:
+        course, errorstore, url_names = validate(filename)
+        assert course.source.exists("static/image.png")
+        handle_general_errors_in_10(errorstore)
+        handle_display_name_errors_in_10(errorstore)
+        handle_discussion_id_errors_in_10(errorstore)
+        handle_link_errors_in_10(errorstore)
+        assert_caught_all_errors(errorstore)
+
+    # Broken archives are reported as missing courses
+    broken = str(tmp_path / "broken.zip")
+    with open(broken, "w") as f:
+        f.write("not a zip file")
+    course, errorstore, url_names = validate(broken)
+    assert course is None
+    assert_error(errorstore, CourseXMLDoesNotExist, broken, f"The file '{broken}' does not exist.")
+    assert_caught_all_errors(errorstore)
+
+def test_validate_memory(monkeypatch):
+    """Courses held in memory are validated without touching the filesystem"""
+    files = {}
+    for path, _, filenames in os.walk("testcourses/testcourse10"):
+        for name in filenames:
+            fullpath = os.path.join(path, name)
+            with open(fullpath, 'rb') as f:
+                files[os.path.relpath(fullpath, "testcourses/testcourse10")] = f.read()
+    source = MemorySource(files)
+
+    def no_filesystem(*args, **kwargs):
+        raise AssertionError("The filesystem was accessed")
+    for name in ["open", "stat", "lstat", "scandir", "listdir"]:
+        monkeypatch.setattr(os, name, no_filesystem)
+    for name in ["isfile", "isdir", "exists"]:
+        monkeypatch.setattr(os.path, name, no_filesystem)
+    monkeypatch.setattr(builtins, "open", no_filesystem)
+
+    course, errorstore, url_names = validate(source)
+    monkeypatch.undo()
+
+    handle_general_errors_in_10(errorstore)
+    handle_display_name_errors_in_10(errorstore)
+    handle_discussion_id_errors_in_10(errorstore)
+    handle_link_errors_in_10(errorstore)
+    assert_caught_all_errors(errorstore)
+
+def test_validate_low_memory():
+    """Low memory mode finds the same errors and statistics, without keeping content in memory"""
+    for course in ["testcourse1", "testcourse7", "testcourse8", "testcourse9", "testcourse10"]:
+        directory = os.path.join("testcourses", course)
+        normal, normal_errors, _ = validate(directory)
+        low, low_errors, _ = validate(directory, low_memory=True)
+
+        assert ([(type(e), e.filename, e.description) for e in low_errors.errors] ==
+                [(type(e), e.filename, e.description) for e in normal_errors.errors])
+        assert compute_statistics(low) == compute_statistics(normal)
+        for edxobj in traverse(low):
+            if edxobj.content_store:
+                assert edxobj._content is None
+                if edxobj.content_ref is not None:
+                    assert edxobj.features is not None
+
+def test_validate_processes():
+    """Validating in several processes gives the same errors and statistics as validating in one"""
+    for course, processes in [("testcourse1", 2), ("testcourse7", 2), ("testcourse9", 2), ("testcourse10", 2),
+                              ("testcourse11", 2), ("testcourse11", 4)]:
+        # testcourse11 has course dates, which objects in every shard compare their dates against
+        # (its three chapters are split into shards by sequential with four processes)
+        directory = os.path.join("testcourses", course)
+        serial, serial_errors, _ = validate(directory)
+        parallel, parallel_errors, _ = validate(directory, processes=processes)
+
+        assert ([(type(e), e.filename, e.description) for e in parallel_errors.errors] ==
+                [(type(e), e.filename, e.description) for e in serial_errors.errors])
+        assert compute_statistics(parallel) == compute_statistics(serial)
+        assert ([edxobj.attributes for edxobj in traverse(parallel)] ==
+                [edxobj.attributes for edxobj in traverse(serial)])
+
+def test_validate_processes_spawn(monkeypatch):
+    """Workers started from scratch (rather than forked) report errors at the same lines"""
+    monkeypatch.setattr(shards, "multiprocessing", multiprocessing.get_context("spawn"))
+    _, serial, _ = validate("testcourses/testcourse10")
+    _, parallel, _ = validate("testcourses/testcourse10", processes=2)
+    assert ([(type(e), e.filename, e.description, e.line) for e in parallel.errors] ==
+            [(type(e), e.filename, e.description, e.line) for e in serial.errors])
+    assert [e.line for e in parallel.errors if isinstance(e, MissingFile) and e.line] == [5, 6, 18]
+
+def test_pickle_course():
+    """Courses can be pickled, including their content"""
+    for course in ["testcourse9", "testcourse10"]:
+        original, _, url_names = validate(os.path.join("testcourses", course))
+        copy, copy_url_names = pickle.loads(pickle.dumps((original, url_names)))
+        assert set(copy_url_names) == set(url_names)
+        for edxobj in traverse(copy):
+            assert copy_url_names.get(edxobj.attributes.get('url_name'), edxobj) is edxobj
+        for first, second in zip(traverse(original), traverse(copy)):
+            assert type(first) is type(second)
+            assert first.attributes == second.attributes
+            assert first.filenames == second.filenames
+            if first.content_store and first.content is not None:
+                assert etree.tostring(first.content, with_tail=False) == etree.tostring(second.content)
+
+def test_validate_profile():
+    course, errorstore, url_names = validate("testcourses/testcourse10", profile=True)
+    profile = errorstore.profile
+    assert [timing.name for timing in profile.steps] == ["Load course", "Load policy", "Find url_names",
+                                                         "Merge policy", "Validate grading policy",
+                                                         "Validate objects", "Global validation",
+                                                         "Detailed global validation"]
+    assert [timing.name for timing in profile.validators] == ["ObjectValidator", "CheckDisplayNames",
+                                                              "CheckDiscussionIDs", "CheckLinks"]
+    objects = len(list(traverse(course)))
+    assert profile.steps[0].objects == objects
+    assert profile.validators[0].objects == objects
+    assert sum(timing.errors for timing in profile.steps) == len(errorstore.errors)
+    assert sum(timing.errors for timing in profile.validators) == sum(timing.errors for timing in profile.steps[5:])
+    assert all(timing.wall >= 0 and timing.cpu >= 0 for timing in profile.steps + profile.validators)
+    assert profile.wall >= sum(timing.wall for timing in profile.steps)
+    assert profile.as_dict()["validators"][3]["errors"] == profile.validators[3].errors
+
+    # Workers report their timings back
+    _, sharded, _ = validate("testcourses/testcourse10", profile=True, processes=2)
+    assert [(timing.name, timing.objects, timing.errors) for timing in sharded.profile.validators] == \
+           [(timing.name, timing.objects, timing.errors) for timing in profile.validators]
+
+    # Not profiled by default
+    _, errorstore, _ = validate("testcourses/testcourse10", 2)
+    assert errorstore.profile is None
+
+def test_plan():
+    assert [task.name for task in plan(5)] == ["LoadCourse", "LoadPolicy", "FindURLNames", "MergePolicy",
+                                               "ValidateGradingPolicy"]
+    assert [task.name for task in plan(only=["FindURLNames"])] == ["LoadCourse", "FindURLNames"]
+    # Drag and drop data is parsed for CheckLinks, unless objects are validating themselves anyway
+    assert [task.name for task in plan(only=["CheckLinks"])] == ["LoadCourse", "LoadPolicy", "FindURLNames",
+                                                                 "MergePolicy", "ParseDragAndDrop", "CheckLinks"]
+    assert "ParseDragAndDrop" not in [task.name for task in plan(only=["ObjectValidator", "CheckLinks"])]
+    assert [task.name for task in plan(skip=["ObjectValidator", "CheckLinks", "ValidateGradingPolicy"])] == \
+           ["LoadCourse", "LoadPolicy", "FindURLNames", "MergePolicy", "CheckDisplayNames", "CheckDiscussionIDs"]
+    # Skipped steps are still run if they are needed
+    assert [task.name for task in plan(skip=["MergePolicy"], only=["CheckDisplayNames"])] == \
+           ["LoadCourse", "LoadPolicy", "FindURLNames", "MergePolicy", "CheckDisplayNames"]
+    try:
+        plan(only=["CheckEverything"])
+    except ValueError as e:
+        assert str(e) == "Unknown validation step or validator: CheckEverything"
+    else:  # pragma: no cover
+        raise AssertionError("Unknown validator accepted")
+
+def test_validate_only():
+    _, full, _ = validate("testcourses/testcourse10")
+    _, links, _ = validate("testcourses/testcourse10", only=["CheckLinks"])
+    link_errors = [error for error in full.errors if error.name in ("BadCourseLink", "BadJumpToLink", "MissingFile")]
+    assert [error.description for error in links.errors if error.name != "TagMismatch"] == \
+           [error.description for error in link_errors]
+    assert any(error.filename == "vertical/dnd2vert.xml" for error in links.errors)
+
+    _, skipped, _ = validate("testcourses/testcourse10", skip=["CheckLinks"])
+    assert [error.description for error in skipped.errors] == \
+           [error.description for error in full.errors if error not in link_errors]
+
+def test_validate_fail_fast():
+    # Loading stops at the first error, and the partial course is returned
+    course, errorstore, url_names = validate("testcourses/testcourse10", fail_fast=ErrorLevel.ERROR)
+    assert errorstore.truncated
+    assert [error.name for error in errorstore.errors] == ["TagMismatch"]
+    assert course is not None
+    assert url_names is None
+
+    # Validation stops at the first error, keeping the errors found so far by each validator
+    _, full, _ = validate("testcourses/testcourse10", ignore=["TagMismatch"])
+    _, errorstore, url_names = validate("testcourses/testcourse10", ignore=["TagMismatch"], fail_fast=ErrorLevel.ERROR)
+    assert errorstore.truncated
+    assert url_names is not None
+    assert [error.name for error in errorstore.errors if error.level == "ERROR"] == ["DuplicateID"]
+    assert len(errorstore.errors) < len(full.errors)
+    _, errorstore, _ = validate("testcourses/testcourse10", ignore=["TagMismatch"], fail_fast=ErrorLevel.WARNING,
+                                processes=2)
+    assert errorstore.truncated
+    assert [error.name for error in errorstore.errors] == ["MissingDisplayName"]
+
+    # Nothing is truncated below the fail-fast level
+    _, errorstore, _ = validate("testcourses/testcourse8", 8, ["InvalidSetting"], fail_fast=ErrorLevel.ERROR)
+    assert not errorstore.truncated
+    assert errorstore.errors
+
+def test_validate_result_cache(tmp_path, monkeypatch):
+    directory = str(tmp_path / "course")
+    cache = str(tmp_path / "results")
+    shutil.copytree("testcourses/testcourse10", directory)
+    for strict in (False, True):
+        course, errorstore, _ = validate(directory, result_cache=cache, cache_strict=strict)
+        assert course is not None and not errorstore.cached
+        assert errorstore.statistics == compute_statistics(course)
+        expected = [error.description for error in errorstore.errors]
+
+        # Unchanged courses aren't loaded
+        course, errorstore, url_names = validate(directory, result_cache=cache, cache_strict=strict)
+        assert course is None and url_names is None
+        assert errorstore.cached
+        assert [error.description for error in errorstore.errors] == expected
+        handle_general_errors_in_10(errorstore)
+        handle_link_errors_in_10(errorstore)
+        assert errorstore.statistics[0]["problem"] > 0
+
+    # Different options are cached separately
+    _, errorstore, _ = validate(directory, steps=4, result_cache=cache)
+    assert not errorstore.cached
+    _, errorstore, _ = validate(directory, ignore=["MissingFile"], result_cache=cache)
+    assert not errorstore.cached
+
+    # Changing, adding or removing a file invalidates the results
+    with open(os.path.join(directory, "static/image.png"), "ab") as f:
+        f.write(b"changed")
+    _, errorstore, _ = validate(directory, result_cache=cache)
+    assert not errorstore.cached
+    os.remove(os.path.join(directory, "static/image.png"))
+    _, errorstore, _ = validate(directory, result_cache=cache)
+    assert not errorstore.cached
+    assert len(errorstore.errors) > len(expected)
+    _, errorstore, _ = validate(directory, result_cache=cache)
+    assert errorstore.cached
+
+    # Installing a plugin invalidates the results
+    plugin = SimpleNamespace(name="myblock", value="my_package.olx:EdxMyBlock")
+    monkeypatch.setattr(EdxObject, "_plugins", {"myblock": plugin})
+    _, errorstore, _ = validate(directory, result_cache=cache)
+    assert not errorstore.cached
+    _, errorstore, _ = validate(directory, result_cache=cache)
+    assert errorstore.cached
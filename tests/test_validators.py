@@ -10,7 +10,10 @@ from olxcleaner.parser.slowvalidators import CheckLinks
 from tests.helpers import assert_caught_all_errors, assert_error
 from olxcleaner.parser.parser_exceptions import (MissingDisplayName, ExtraDisplayName, Obsolete,
                                                  DuplicateID, BadJumpToLink, MissingFile, BadCourseLink)
-from olxcleaner.utils import find_links
+from olxcleaner.utils import find_links, traverse
+from olxcleaner.errorstore import ErrorStore
+from olxcleaner.parser.visitor import Visitor
+from olxcleaner.validate import run_validators
 
 def test_display_names():
     # Perform all steps on course 10 up to validation steps
@@ -103,3 +106,43 @@ def handle_link_errors_in_10(errorstore):
     assert_error(errorstore, MissingFile, 'vertical/dndvert.xml', "The <problem url_name='dndtest' display_name='Mwa'> tag contains a reference to a missing static file: /static/ex34_dnd_label1.png")
     assert_error(errorstore, MissingFile, 'vertical/dnd2vert.xml', "The <drag-and-drop-v2 url_name='studio_mess' display_name='This is my title'> tag contains a reference to a missing static file: /static/ex34_dnd.png")
     assert_error(errorstore, MissingFile, 'vertical/dnd2vert.xml', "The <drag-and-drop-v2 url_name='studio_mess' display_name='This is my title'> tag contains a reference to a missing static file: /static/ex34_dnd_label1.png")
+
+def test_visitors():
+    """Visitors share a single walk, and report errors in the same order as separate validators"""
+    course, errorstore, url_names = validate("testcourses/testcourse10", 6)
+
+    class Recorder(Visitor):
+        def start(self, course, errorstore, url_names):
+            super().start(course, errorstore, url_names)
+            self.calls = []
+
+        def on_any(self, edxobj, errorstore):
+            self.calls.append(("any", edxobj.type))
+
+        def on_problem(self, edxobj, errorstore):
+            self.calls.append(("problem", edxobj.type))
+
+        def on_drag_and_drop_v2(self, edxobj, errorstore):
+            self.calls.append(("dnd", edxobj.type))
+
+    recorder = Recorder()
+    recorder(course, ErrorStore(), url_names)
+    expected = []
+    for edxobj in traverse(course):
+        expected.append(("any", edxobj.type))
+        if edxobj.type == "problem":
+            expected.append(("problem", "problem"))
+        elif edxobj.type == "drag-and-drop-v2":
+            expected.append(("dnd", "drag-and-drop-v2"))
+    assert recorder.calls == expected
+
+    def old_style(course, errorstore, url_names):
+        errorstore.add_error(MissingFile("course.xml", edxobj=course, missing_file="/static/old-style"))
+
+    separate = ErrorStore()
+    for validator in [CheckLinks(), old_style, CheckDisplayNames(), CheckDiscussionIDs()]:
+        validator(course, separate, url_names)
+    fused = ErrorStore()
+    run_validators(course, [CheckLinks(), old_style, CheckDisplayNames(), CheckDiscussionIDs()], fused, url_names)
+    assert [str(error) for error in fused.errors] == [str(error) for error in separate.errors]
+    assert len(fused.errors) > 3
@@ -0,0 +1,89 @@
+"""
+test_watch.py
+
+Tests incremental re-validation of courses as files change
+"""
+import os
+import shutil
+from olxcleaner import validate
+from olxcleaner.watch import CourseWatcher, error_key
+
+def error_keys(errors):
+    return sorted(error_key(error) for error in errors)
+
+def edit(path, old, new):
+    """Edits a file, making sure that its modification time changes"""
+    with open(path) as f:
+        text = f.read()
+    assert old in text
+    with open(path, 'w') as f:
+        f.write(text.replace(old, new))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+def check_watcher(watcher, directory):
+    """Makes sure that the watcher agrees with a fresh validation of the course"""
+    course, errorstore, url_names = validate(directory)
+    assert error_keys(watcher.errors) == error_keys(errorstore.errors)
+    assert repr(list(watcher.url_names.items())) == repr(list(url_names.items()))
+
+def test_watch_course9(tmp_path):
+    directory = str(tmp_path / "course")
+    shutil.copytree("testcourses/testcourse9", directory)
+    watcher = CourseWatcher(directory)
+    watcher.validate()
+    check_watcher(watcher, directory)
+    assert watcher.poll() is None
+
+    # Break a problem file
+    edit(os.path.join(directory, "problem/problem.xml"), "</problem>", "</problm>")
+    new_errors, fixed_errors, changed = watcher.poll()
+    assert changed == ["problem/problem.xml"]
+    assert [error.name for error in new_errors] == ["InvalidXML"]
+    check_watcher(watcher, directory)
+
+    # Fix it again
+    edit(os.path.join(directory, "problem/problem.xml"), "</problm>", "</problem>")
+    new_errors, fixed_errors, changed = watcher.poll()
+    assert [error.name for error in fixed_errors] == ["InvalidXML"]
+    check_watcher(watcher, directory)
+
+    # Change the structure inside a sequential
+    edit(os.path.join(directory, "sequential/sequential.xml"), '<vertical url_name="oravert"/>', '')
+    watcher.poll()
+    check_watcher(watcher, directory)
+
+    # Editing the course file revalidates from scratch
+    edit(os.path.join(directory, "course/mycourseurl.xml"), "<course", "<course display_name='Renamed'")
+    watcher.poll()
+    check_watcher(watcher, directory)
+
+    # As does adding a file
+    with open(os.path.join(directory, "problem/unused.xml"), 'w') as f:
+        f.write("<problem/>")
+    new_errors, fixed_errors, changed = watcher.poll()
+    assert changed == ["problem/unused.xml"]
+    check_watcher(watcher, directory)
+
+def test_watch_static(tmp_path):
+    directory = str(tmp_path / "course")
+    shutil.copytree("testcourses/testcourse10", directory)
+    watcher = CourseWatcher(directory)
+    watcher.validate()
+    check_watcher(watcher, directory)
+
+    # Remove a static file that is linked to
+    os.remove(os.path.join(directory, "static/image.png"))
+    new_errors, fixed_errors, changed = watcher.poll()
+    assert changed == ["static/image.png"]
+    assert new_errors
+    check_watcher(watcher, directory)
+
+    # Edit an HTML file
+    edit(os.path.join(directory, "html/linktest.html"), '<img src="/static/image.png"/>',
+         '<img src="/static/missing.png"/>')
+    new_errors, fixed_errors, changed = watcher.poll()
+    assert changed == ["html/linktest.html"]
+    assert [error.name for error in new_errors] == ["MissingFile"]
+    assert [error.name for error in fixed_errors] == ["MissingFile"]
+    check_watcher(watcher, directory)